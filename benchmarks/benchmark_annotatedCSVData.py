@@ -0,0 +1,111 @@
+"""
+Benchmarks for reading AnnotatedCSVData files.
+
+Writes a commit-log-like file and compares the row-by-row csv.reader loop that
+readFromFile() used to run against the current readers. Raw records are still parsed by
+csv.reader, so loading them takes about as long as before; building a DataFrame from a
+file whose records haven't been loaded skips the records and uses pandas' bulk CSV parser.
+
+Usage:
+    PYTHONPATH=src python benchmarks/benchmark_annotatedCSVData.py --rows 1000000
+"""
+import argparse
+import csv
+import datetime
+import os
+import random
+import tempfile
+import time
+
+import pandas as pd
+
+from reposcanner.data import AnnotatedCSVData, DataFrameCache
+
+
+def writeSyntheticCommitLog(path, numberOfRows, seed=0):
+    generator = random.Random(seed)
+    emails = ["contributor{i}@example.com".format(i=i) for i in range(200)]
+    output = AnnotatedCSVData(path)
+    output.setReposcannerExecutionID("benchmark")
+    output.setCreator("CommitInfoMiningRoutine")
+    output.setDateCreated(datetime.date.today())
+    output.setURL("https://github.com/owner/repo")
+    output.setColumnNames(["commitHash", "commitTime", "authorEmail", "insertions",
+                           "deletions", "namesOfFilesChanged", "commitMessage"])
+    output.setColumnDatatypes(["str", "str", "str", "int", "int", "list", "str"])
+    output.beginStreamingWrite(chunkSize=10000)
+    for i in range(numberOfRows):
+        output.addRecord(["{h:040x}".format(h=generator.getrandbits(160)),
+                          1600000000 + i,
+                          generator.choice(emails),
+                          generator.randrange(500),
+                          generator.randrange(500),
+                          ";".join("src/file{f}.py".format(f=generator.randrange(1000))
+                                   for _ in range(generator.randrange(1, 4))),
+                          "Fix issue {i} in the frobnicator".format(i=i)])
+    output.writeToFile()
+
+
+def readRecordsRowByRow(path):
+    """The loop readFromFile() used before the bulk reader, kept here for comparison."""
+    records = []
+    with open(path, 'r', newline='\n') as f:
+        currentlyReadingMetadata = True
+        for row in csv.reader(f, delimiter=',', quotechar='|'):
+            if currentlyReadingMetadata:
+                if len(row) > 0 and row[0][0] == '#':
+                    continue
+                currentlyReadingMetadata = False
+                if len(row) > 0:
+                    records.append(row)
+            else:
+                records.append(row)
+    return records
+
+
+def timeIt(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000,
+                        help="Number of records in the synthetic file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "owner_repo_CommitInfoMining.csv")
+        writeSyntheticCommitLog(path, args.rows)
+        print("{n} rows, {m:.0f} MB".format(n=args.rows, m=os.path.getsize(path) / 1e6))
+
+        legacyTime, legacyRecords = timeIt(lambda: readRecordsRowByRow(path))
+
+        def readRecords():
+            entity = AnnotatedCSVData(path)
+            entity.readFromFile()
+            return entity.getRawRecords()
+        recordsTime, records = timeIt(readRecords)
+        assert(legacyRecords == records)
+        print("raw records:  row by row {a:.2f}s, getRawRecords {b:.2f}s ({s:.1f}x)".format(
+            a=legacyTime, b=recordsTime, s=legacyTime / recordsTime))
+
+        entity = AnnotatedCSVData(path)
+        entity.readFromFile()
+        legacyFrameTime, _ = timeIt(lambda: pd.DataFrame.from_records(
+            readRecordsRowByRow(path), columns=entity.getColumnNames()))
+        # Measure building the DataFrames, not fetching them from the cache.
+        DataFrameCache().setBudget(0)
+        bulkFrameTime, _ = timeIt(lambda: entity.getDataFrame(applyDatatypes=False))
+        typedFrameTime, _ = timeIt(lambda: entity.getDataFrame(applyDatatypes=True))
+        columnsFrameTime, _ = timeIt(lambda: entity.getDataFrame(columns=["authorEmail"]))
+        print("DataFrame:    row by row {a:.2f}s, bulk {b:.2f}s ({s:.1f}x), "
+              "bulk with datatypes {c:.2f}s, authorEmail only {d:.2f}s".format(
+                  a=legacyFrameTime, b=bulkFrameTime, s=legacyFrameTime / bulkFrameTime,
+                  c=typedFrameTime, d=columnsFrameTime))
+
+
+if __name__ == "__main__":
+    main()
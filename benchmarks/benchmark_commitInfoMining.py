@@ -0,0 +1,170 @@
+"""
+Benchmarks for CommitInfoMiningRoutine on a synthetic repository.
+
+Compares the per-commit change extraction used by CommitInfoMiningVisitor, which computes
+one diff per parent, against the previous approach, which diffed every parent twice (once
+for the insertion/deletion stats and once for the names of the files touched). It then
+reports the throughput of each combination of the routine's mergeDiffs and detectRenames
+configuration parameters, and how mining whole records scales with the number of processes.
+
+Usage:
+    PYTHONPATH=src python benchmarks/benchmark_commitInfoMining.py --commits 2000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import pygit2
+
+from reposcanner.data import AnnotatedCSVData
+from reposcanner.routines import SharedCommitWalk
+from reposcanner.contrib import CommitInfoMiningRoutine, CommitInfoMiningVisitor
+
+
+def createSyntheticRepository(path, numberOfCommits, numberOfFiles=200, filesPerCommit=5,
+                              mergeEvery=4, seed=0):
+    """
+    Creates a bare repository in which each commit edits a few files (and occasionally
+    renames one). Every mergeEvery-th commit is a merge of a short-lived side branch.
+    """
+    generator = random.Random(seed)
+    repository = pygit2.init_repository(path, bare=True)
+    signature = pygit2.Signature("Benchmark", "benchmark@example.com")
+
+    def edit(files, i, names):
+        for name in names:
+            lines = list(files[name])
+            lines[generator.randrange(len(lines))] = "edit {i}".format(i=i)
+            lines.append("added {i}".format(i=i))
+            files[name] = lines
+
+    def commit(files, parents, message):
+        index = pygit2.Index()
+        for name, lines in files.items():
+            blob = repository.create_blob("\n".join(lines).encode())
+            index.add(pygit2.IndexEntry(name, blob, pygit2.GIT_FILEMODE_BLOB))
+        return repository.create_commit(None, signature, signature, message,
+                                        index.write_tree(repository), parents)
+
+    files = {"src/file{i}.txt".format(i=i): ["line {j}".format(j=j) for j in range(50)]
+             for i in range(numberOfFiles)}
+    parents = []
+    for i in range(numberOfCommits):
+        if len(parents) > 0 and i % mergeEvery == mergeEvery - 1:
+            names = generator.sample(sorted(files), 2 * filesPerCommit)
+            sideFiles = dict(files)
+            edit(sideFiles, i, names[:filesPerCommit])
+            side = commit(sideFiles, parents, "Side {i}".format(i=i))
+            edit(files, i, names[filesPerCommit:])
+            main = commit(files, parents, "Main {i}".format(i=i))
+            for name in names[:filesPerCommit]:
+                files[name] = sideFiles[name]
+            parents = [commit(files, [main, side], "Merge {i}".format(i=i))]
+            continue
+
+        edit(files, i, generator.sample(sorted(files), filesPerCommit))
+        if i % 10 == 9:
+            oldName = generator.choice(sorted(files))
+            files["src/renamed{i}.txt".format(i=i)] = files.pop(oldName)
+        parents = [commit(files, parents, "Commit {i}".format(i=i))]
+    repository.set_head(parents[0])
+    return repository
+
+
+def getChangesWithTwoDiffsPerParent(commit):
+    """The change extraction used before diffs were shared, kept here for comparison."""
+    def getDiffs():
+        if len(commit.parents) == 0:
+            return [commit.tree.diff_to_tree()]
+        return [parent.tree.diff_to_tree(commit.tree) for parent in commit.parents]
+
+    changes = {'ins': 0, 'del': 0, 'files': 0, 'paths': []}
+    for diff in getDiffs():
+        diff.find_similar()
+        changes['ins'] += diff.stats.insertions
+        changes['del'] += diff.stats.deletions
+        changes['files'] += diff.stats.files_changed
+    for diff in getDiffs():
+        for delta in diff.deltas:
+            if delta.old_file.path not in changes['paths'] and delta.old_file.path is not None:
+                changes['paths'].append(delta.old_file.path)
+            if delta.new_file.path not in changes['paths'] and delta.new_file.path is not None:
+                changes['paths'].append(delta.new_file.path)
+    return changes
+
+
+def timeChangeExtraction(commits, getChanges):
+    start = time.perf_counter()
+    results = [getChanges(commit) for commit in commits]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commits", type=int, default=1000,
+                        help="Number of commits in the synthetic repository.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="Largest number of processes to measure mining with.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of times to repeat each measurement (the best is reported).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        repository = createSyntheticRepository(path, args.commits)
+        commits = list(repository.walk(repository.head.target,
+                                       pygit2.GIT_SORT_TIME | pygit2.GIT_SORT_TOPOLOGICAL))
+        visitor = CommitInfoMiningVisitor(output=None)
+
+        legacyTimes, sharedTimes = [], []
+        for _ in range(args.repeat):
+            legacyTime, legacyResults = timeChangeExtraction(
+                commits, getChangesWithTwoDiffsPerParent)
+            sharedTime, sharedResults = timeChangeExtraction(commits, visitor._getChanges)
+            assert(legacyResults == sharedResults)
+            legacyTimes.append(legacyTime)
+            sharedTimes.append(sharedTime)
+
+        print("{n} commits".format(n=len(commits)))
+        print("two diffs per parent: {t:.3f}s ({r:.0f} commits/s)".format(
+            t=min(legacyTimes), r=len(commits) / min(legacyTimes)))
+        print("one diff per parent:  {t:.3f}s ({r:.0f} commits/s)".format(
+            t=min(sharedTimes), r=len(commits) / min(sharedTimes)))
+        print("speedup: {s:.2f}x".format(s=min(legacyTimes) / min(sharedTimes)))
+        print()
+
+        print("{m} of them merges, by mergeDiffs/detectRenames:".format(
+            m=sum(1 for commit in commits if len(commit.parents) > 1)))
+        for mergeDiffs in CommitInfoMiningRoutine.mergeDiffModes:
+            for detectRenames in [True, False]:
+                visitor = CommitInfoMiningVisitor(
+                    output=None, mergeDiffs=mergeDiffs, detectRenames=detectRenames)
+                modeTime = min(timeChangeExtraction(commits, visitor._getChanges)[0]
+                               for _ in range(args.repeat))
+                print("  {m:<12} {d:<6} {t:.3f}s ({r:.0f} commits/s)".format(
+                    m=mergeDiffs, d=str(detectRenames).lower(), t=modeTime,
+                    r=len(commits) / modeTime))
+        print()
+
+        print("mining records by number of processes:")
+        numberOfProcesses = 1
+        while numberOfProcesses <= args.processes:
+            start = time.perf_counter()
+            visitor = CommitInfoMiningVisitor(
+                AnnotatedCSVData(os.path.join(path, "records.csv")),
+                processes=numberOfProcesses, repositoryPath=repository.path)
+            visitor._parallelMiningThreshold = 0
+            walk = SharedCommitWalk(repository)
+            walk.addVisitor(visitor)
+            walk.run()
+            visitor.getResponse()
+            processesTime = time.perf_counter() - start
+            print("  {p:<4} {t:.3f}s ({r:.0f} commits/s)".format(
+                p=numberOfProcesses, t=processesTime, r=len(commits) / processesTime))
+            numberOfProcesses *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
 from reposcanner.routines import OfflineRepositoryRoutine, OnlineRepositoryRoutine
+from reposcanner.routines import CommitVisitor, CompletedCommitVisitor
 from reposcanner.analyses import DataAnalysis
 from reposcanner.requests import OfflineRoutineRequest, OnlineRoutineRequest, AnalysisRequestModel
 from reposcanner.response import ResponseFactory
 from reposcanner.provenance import ReposcannerRunInformant
-from reposcanner.data import DataEntityFactory
+from reposcanner.data import DataEntityFactory, DataCriteria
+from reposcanner.git import GitlabEmailIndex
 import pygit2
 
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import math
 import time
 import datetime
 import re
@@ -29,33 +34,143 @@ class CommitInfoMiningRoutine(OfflineRepositoryRoutine):
     """
     This routine clones a repository and extracts information about each commit, including
     authorship information, the commit message, and which files were interacted with.
+
+    By default, the routine skips repositories whose output file already exists. If the
+    routine is given the configuration parameter "incremental: true", it instead reads the
+    existing file and appends records for any commits made since the last run. The HEAD
+    commit the file was last mined up to is recorded in its "headcommit" metadata field.
+
+    How the insertions, deletions, filesChanged and namesOfFilesChanged columns are computed
+    can be tuned with the following configuration parameters:
+
+    mergeDiffs: Controls how merge commits (commits with more than one parent) are diffed.
+        "all" (default): diff against every parent. Counts are summed over the parents and
+            the paths are the union of the paths touched relative to each parent.
+        "firstParent": diff only against the first parent, i.e. record the changes the merge
+            brought into the branch it was merged into.
+        "none": don't diff merge commits at all. Their counts are 0 and their list of
+            paths is empty. This is the cheapest option when downstream analyses only care
+            about the authors of changes, since the changes of a merged branch are already
+            recorded on the commits that made them.
+        Commits with one parent (or none) are always diffed the same way.
+    detectRenames: If true (default), rename detection is run on each diff, so a renamed file
+        counts as one changed file and only its edited lines are counted. If false, a rename
+        counts as the deletion of one file and the addition of another. The paths recorded
+        are the same either way. Turning this off is considerably cheaper on large diffs.
+
+    The options used are recorded in the "mergediffs" and "detectrenames" metadata fields.
+    In incremental mode, a file mined with different options is mined again from scratch.
+
+    processes: The number of processes to mine commits with (default 1). Diffing each commit
+        is independent work, so for large repositories the commits can be split across
+        several processes, each with its own handle on the clone. The records written are
+        identical to those of a single process, in the same order.
+    outputFormat: "csv" (default) writes an AnnotatedCSVData file. "parquet" writes an
+        AnnotatedParquetData file instead (this requires pyarrow), which analyses can read
+        single columns from.
     """
 
+    mergeDiffModes = ["all", "firstParent", "none"]
+    outputFormats = ["csv", "parquet"]
+
     def getRequestType(self):
         return CommitInfoMiningRoutineRequest
 
-    def offlineImplementation(self, request, session):
+    @classmethod
+    def supportsSharedCommitWalk(cls):
+        return True
+
+    def isIncremental(self):
+        return self.getConfigurationParameter("incremental", False) is True
+
+    def getMergeDiffMode(self):
+        return self.getConfigurationParameter("mergeDiffs", "all")
 
+    def isDetectingRenames(self):
+        return self.getConfigurationParameter("detectRenames", True) is not False
+
+    def getNumberOfProcesses(self):
+        return self.getConfigurationParameter("processes", 1)
+
+    def getOutputFormat(self):
+        return self.getConfigurationParameter("outputFormat", "csv")
+
+    def _createOutput(self, request):
         factory = DataEntityFactory()
         fout = Path(request.getOutputDirectory()) \
-            / "{repoOwner}_{repoName}_CommitInfoMining.csv".format(
+            / "{repoOwner}_{repoName}_CommitInfoMining.{extension}".format(
             repoOwner=request.getRepositoryLocation().getOwner(),
-            repoName=request.getRepositoryLocation().getRepositoryName())
+            repoName=request.getRepositoryLocation().getRepositoryName(),
+            extension=self.getOutputFormat())
+        if self.getOutputFormat() == "parquet":
+            return factory.createAnnotatedParquetData(fout)
+        else:
+            return factory.createAnnotatedCSVData(fout)
 
-        output = factory.createAnnotatedCSVData(fout)
+    def createCommitVisitor(self, request, session):
 
         responseFactory = ResponseFactory()
+        if self.getOutputFormat() not in self.outputFormats:
+            return CompletedCommitVisitor(responseFactory.createFailureResponse(
+                message="[CommitInfoMiningRoutine] Unknown outputFormat ({outputFormat}), expected one of {outputFormats}.".format(
+                    outputFormat=self.getOutputFormat(), outputFormats=self.outputFormats)))
+        if not isinstance(self.getNumberOfProcesses(), int) or self.getNumberOfProcesses() < 1:
+            return CompletedCommitVisitor(responseFactory.createFailureResponse(
+                message="[CommitInfoMiningRoutine] The number of processes must be a positive integer, not {processes}.".format(
+                    processes=self.getNumberOfProcesses())))
+        if self.getMergeDiffMode() not in self.mergeDiffModes:
+            return CompletedCommitVisitor(responseFactory.createFailureResponse(
+                message="[CommitInfoMiningRoutine] Unknown mergeDiffs mode ({mode}), expected one of {modes}.".format(
+                    mode=self.getMergeDiffMode(), modes=self.mergeDiffModes)))
+
+        output = self._createOutput(request)
+        headCommit = str(session.head.target)
+        diffPolicy = (self.getMergeDiffMode(), str(self.isDetectingRenames()).lower())
+
         if output.fileExists():
             output.readFromFile()
-            return responseFactory.createSuccessResponse(
-                message="[CommitInfoMiningRoutine] File already exists, \
-                skipping...", attachments=output)
+            if not self.isIncremental():
+                return CompletedCommitVisitor(responseFactory.createSuccessResponse(
+                    message="[CommitInfoMiningRoutine] File already exists, \
+                    skipping...", attachments=output))
+
+            previousHeadCommit = self._getPreviousHeadCommit(output)
+            if previousHeadCommit == headCommit:
+                return CompletedCommitVisitor(responseFactory.createSuccessResponse(
+                    message="[CommitInfoMiningRoutine] File is already up to date, \
+                    skipping...", attachments=output))
+
+            if previousHeadCommit is not None and previousHeadCommit in session \
+                    and session.descendant_of(headCommit, previousHeadCommit) \
+                    and self._getPreviousDiffPolicy(output) == diffPolicy:
+                output.setReposcannerExecutionID(
+                    ReposcannerRunInformant().getReposcannerExecutionID())
+                output.setDateCreated(datetime.date.today())
+                output.setMetadataAttribute("headcommit", headCommit)
+                knownCommits = set(record[0] for record in output.getRawRecords())
+                # Records are written out as they are mined rather than held until the end.
+                output.beginStreamingWrite()
+                return CommitInfoMiningVisitor(output,
+                                               knownCommits=knownCommits,
+                                               hiddenCommits=[previousHeadCommit],
+                                               mergeDiffs=self.getMergeDiffMode(),
+                                               detectRenames=self.isDetectingRenames(),
+                                               processes=self.getNumberOfProcesses(),
+                                               repositoryPath=session.path)
+
+            # The history we mined before has been rewritten (e.g. by a force push), or
+            # was mined with different options, so the records we have can't be reused.
+            # Start over from scratch.
+            output = self._createOutput(request)
 
         output.setReposcannerExecutionID(
             ReposcannerRunInformant().getReposcannerExecutionID())
         output.setCreator(self.__class__.__name__)
         output.setDateCreated(datetime.date.today())
         output.setURL(request.getRepositoryLocation().getURL())
+        output.setMetadataAttribute("headcommit", headCommit)
+        output.setMetadataAttribute("mergediffs", diffPolicy[0])
+        output.setMetadataAttribute("detectrenames", diffPolicy[1])
 
         output.setColumnNames(["commitHash",
                                "commitTime",
@@ -80,123 +195,251 @@ class CommitInfoMiningRoutine(OfflineRepositoryRoutine):
             ["list"] +
             ["str"])
 
-        def _getFilesTouched(commit):
-            # TODO: Go back and check this method. Are we correctly interpreting the semantics of
-            # the deltas we receive from pygit2?
-            changes = []
-            if len(commit.parents) == 0:
-                diff = commit.tree.diff_to_tree()
-                # consider using "for fname in list(diff): (fname.delta.new_file.path,
-                # fname.line_stats)"
-                for delta in diff.deltas:
-                    if delta.old_file.path not in changes and delta.old_file.path is not None:
-                        changes.append(delta.old_file.path)
-                    if delta.new_file.path not in changes and delta.new_file.path is not None:
-                        changes.append(delta.new_file.path)
-            else:
-                for parent in commit.parents:
-                    diff = parent.tree.diff_to_tree(commit.tree)
-                    for delta in diff.deltas:
-                        if delta.old_file.path not in changes and delta.old_file.path is not None:
-                            changes.append(delta.old_file.path)
-                        if delta.new_file.path not in changes and delta.new_file.path is not None:
-                            changes.append(delta.new_file.path)
-            return changes
-
-        def _cleanCommitMessage(s):
-            # This replaces all sequences of whitespace characters
-            # with a single space, eliminating tabs, newlines, etc.
-            # Also get rid of commas, as commas are our default delimiter.
-            return re.sub('\\s+', ' ', s).replace(',', ' ')
-
-        def _getStats(commit):
-            changes = {'ins': 0, 'del': 0, 'files': 0}
-            if len(commit.parents) == 0:
-                diff = commit.tree.diff_to_tree()
-                diff.find_similar()  # handle renamed files
-                changes['ins'] += diff.stats.insertions
-                changes['del'] += diff.stats.deletions
-                changes['files'] += diff.stats.files_changed
-            else:
-                for parent in commit.parents:
-                    diff = parent.tree.diff_to_tree(commit.tree)
-                    diff.find_similar()
-                    changes['ins'] += diff.stats.insertions
-                    changes['del'] += diff.stats.deletions
-                    changes['files'] += diff.stats.files_changed
-            return changes
+        # Records are written out as they are mined rather than held until the end.
+        output.beginStreamingWrite()
+        return CommitInfoMiningVisitor(output,
+                                       mergeDiffs=self.getMergeDiffMode(),
+                                       detectRenames=self.isDetectingRenames(),
+                                       processes=self.getNumberOfProcesses(),
+                                       repositoryPath=session.path)
 
-        def _replaceNoneWithEmptyString(value):
-            if value is None:
-                return ""
-            else:
-                return value
+    def _getPreviousHeadCommit(self, output):
+        """
+        Returns the HEAD commit that an existing output file was mined up to. Files written
+        before this was recorded in the metadata were mined in a single pass starting from
+        HEAD, so their first record is the HEAD commit at the time.
+        """
+        if "headcommit" in output.getAttributeKeys():
+            return output.getMetadataAttribute("headcommit")
+        elif len(output.getRawRecords()) > 0:
+            return output.getRawRecords()[0][0]
+        else:
+            return None
 
-        for commit in session.walk(session.head.target,
-                                   pygit2.GIT_SORT_TIME | pygit2.GIT_SORT_TOPOLOGICAL):
-            extractedCommitData = {}
-
-            # The person who originally made the change and when they made it, a
-            # pygit2.Signature.
-            author = commit.author
-            authorEmail = author.email
-            authorName = author.name
-            # Unix timestamp, as in the number of seconds since midnight, 1 January
-            # 1970.
-            authorTime = author.time
-
-            # The person who submitted the commit and when they did so, a
-            # pygit2.Signature (can be different than author!).
-            committer = commit.committer
-            committerEmail = committer.email
-            committerName = committer.name
-            # Unix timestamp, as in the number of seconds since midnight, 1 January
-            # 1970.
-            committerTime = committer.time
-
-            # The SHA hash of the commit, a string. This is guaranteed to be unique for any commit in a given repo.
-            # It is not guaranteed to be unique across commits from different repos, but in practice
-            # hash collisions are *extremely* rare.
-            commitHash = commit.hex
-
-            # The time when the commit was applied to the repo, which should be the
-            # same as the committer's timestamp (?).
-            commitTime = commit.commit_time
-
-            # A message describing what changes were made to the repo by the commit, a string.
-            # parse lines like:
-            # Co-authored-by: Mystery Committer <mystery@predictivestatmech.org>
-            commitMessage = commit.message
-
-            coAuthors = []
-            for line in commit.message.split('\n'):
-                m = re.match("\\s*Co-authored-by: (.*)", line)
-                if m is not None:
-                    coAuthors.append(m[1].strip())
-
-            # All the files interacted with according to the tree associated with the commit.
-            #filesTouched = _getFilesTouched(commit)
-            changes = _getStats(commit)
-
-            filesTouched = _getFilesTouched(commit)
+    def _getPreviousDiffPolicy(self, output):
+        """
+        Returns the (mergeDiffs, detectRenames) options an existing output file was mined
+        with. Files written before these were recorded used the defaults.
+        """
+        keys = output.getAttributeKeys()
+        mergeDiffs = output.getMetadataAttribute("mergediffs") if "mergediffs" in keys else "all"
+        detectRenames = output.getMetadataAttribute(
+            "detectrenames") if "detectrenames" in keys else "true"
+        return (mergeDiffs, detectRenames)
 
-            output.addRecord([_replaceNoneWithEmptyString(commitHash),
-                              _replaceNoneWithEmptyString(commitTime),
-                              _replaceNoneWithEmptyString(authorEmail),
-                              _replaceNoneWithEmptyString(authorName),
-                              _replaceNoneWithEmptyString(authorTime),
-                              _replaceNoneWithEmptyString(committerEmail),
-                              _replaceNoneWithEmptyString(committerName),
-                              _replaceNoneWithEmptyString(committerTime),
-                              ";".join(coAuthors),
-                              changes['ins'], changes['del'], changes['files'],
-                              ';'.join(filesTouched),
-                              _cleanCommitMessage(_replaceNoneWithEmptyString(commitMessage))
-                              ])
 
-        output.writeToFile()
+class CommitInfoMiningVisitor(CommitVisitor):
+    """
+    Collects the records written by CommitInfoMiningRoutine, one commit at a time.
+    """
+
+    def __init__(self, output, knownCommits=None, hiddenCommits=None,
+                 mergeDiffs="all", detectRenames=True, processes=1, repositoryPath=None):
+        """
+        output: The AnnotatedCSVData object that records are added to.
+        knownCommits: A set of hashes of commits that already have records in the output
+            and should be skipped.
+        hiddenCommits: A list of hashes of commits whose history is already in the output
+            and does not need to be walked.
+        mergeDiffs: How merge commits are diffed ("all", "firstParent" or "none"). See
+            CommitInfoMiningRoutine for details.
+        detectRenames: Whether to run rename detection on each diff.
+        processes: The number of processes to mine commits with. If greater than 1, the
+            walk only collects the hashes of the commits to mine, and they are mined in
+            parallel once the walk is over.
+        repositoryPath: The path of the clone, which each process opens for itself.
+            Required if processes is greater than 1.
+        """
+        self._output = output
+        self._knownCommits = knownCommits if knownCommits is not None else set()
+        self._hiddenCommits = hiddenCommits
+        self._mergeDiffs = mergeDiffs
+        self._detectRenames = detectRenames
+        self._processes = processes
+        self._repositoryPath = repositoryPath
+        self._commitsToMine = []
+        # Below this many commits, the cost of starting processes outweighs the benefit.
+        self._parallelMiningThreshold = 5000
+
+    def getHiddenCommits(self):
+        return self._hiddenCommits
+
+    def _getDiffs(self, commit):
+        """
+        Returns one pygit2 Diff per parent of the commit (or a single diff against the
+        empty tree for a root commit), subject to the visitor's policy for merge commits. Tree diffs are the most expensive part of mining,
+        so each one is computed exactly once and shared by everything we record.
+        """
+        parents = commit.parents
+        if len(parents) == 0:
+            return [commit.tree.diff_to_tree()]
+        elif len(parents) > 1 and self._mergeDiffs == "none":
+            return []
+        elif len(parents) > 1 and self._mergeDiffs == "firstParent":
+            parents = parents[:1]
+        return [parent.tree.diff_to_tree(commit.tree) for parent in parents]
+
+    def _getChanges(self, commit):
+        """
+        Returns a dictionary with the number of insertions ('ins'), deletions ('del') and
+        files changed ('files') summed over the commit's diffs, along with the list of
+        paths touched by the commit ('paths'), in the order they were first seen.
+        """
+        # TODO: Go back and check this method. Are we correctly interpreting the semantics of
+        # the deltas we receive from pygit2?
+        changes = {'ins': 0, 'del': 0, 'files': 0, 'paths': {}}
+        for diff in self._getDiffs(commit):
+            # Paths are collected before rename detection, which merges the deltas of a
+            # removed file and an added file into one, so that both paths are reported.
+            for delta in diff.deltas:
+                if delta.old_file.path is not None:
+                    changes['paths'][delta.old_file.path] = True
+                if delta.new_file.path is not None:
+                    changes['paths'][delta.new_file.path] = True
+            if self._detectRenames:
+                diff.find_similar()  # handle renamed files
+            stats = diff.stats
+            changes['ins'] += stats.insertions
+            changes['del'] += stats.deletions
+            changes['files'] += stats.files_changed
+        changes['paths'] = list(changes['paths'])
+        return changes
+
+    def _cleanCommitMessage(self, s):
+        # This replaces all sequences of whitespace characters
+        # with a single space, eliminating tabs, newlines, etc.
+        # Also get rid of commas, as commas are our default delimiter.
+        return re.sub('\\s+', ' ', s).replace(',', ' ')
+
+    def _replaceNoneWithEmptyString(self, value):
+        if value is None:
+            return ""
+        else:
+            return value
+
+    def visitCommit(self, commit):
+        if str(commit.id) in self._knownCommits:
+            return
+        if self._processes > 1:
+            # Commits are mined in getResponse(), once we know how to split them up.
+            self._commitsToMine.append(str(commit.id))
+        else:
+            self._output.addRecord(self._getRecord(commit))
+
+    def _getRecord(self, commit):
+        """
+        Returns the record for a single commit as a list of column values.
+        """
+        # The person who originally made the change and when they made it, a
+        # pygit2.Signature.
+        author = commit.author
+        authorEmail = author.email
+        authorName = author.name
+        # Unix timestamp, as in the number of seconds since midnight, 1 January
+        # 1970.
+        authorTime = author.time
+
+        # The person who submitted the commit and when they did so, a
+        # pygit2.Signature (can be different than author!).
+        committer = commit.committer
+        committerEmail = committer.email
+        committerName = committer.name
+        # Unix timestamp, as in the number of seconds since midnight, 1 January
+        # 1970.
+        committerTime = committer.time
+
+        # The SHA hash of the commit, a string. This is guaranteed to be unique for any commit in a given repo.
+        # It is not guaranteed to be unique across commits from different repos, but in practice
+        # hash collisions are *extremely* rare.
+        commitHash = str(commit.id)
+
+        # The time when the commit was applied to the repo, which should be the
+        # same as the committer's timestamp (?).
+        commitTime = commit.commit_time
+
+        # A message describing what changes were made to the repo by the commit, a string.
+        # parse lines like:
+        # Co-authored-by: Mystery Committer <mystery@predictivestatmech.org>
+        commitMessage = commit.message
+
+        coAuthors = []
+        for line in commit.message.split('\n'):
+            m = re.match("\\s*Co-authored-by: (.*)", line)
+            if m is not None:
+                coAuthors.append(m[1].strip())
+
+        # All the files interacted with according to the tree associated with the commit.
+        changes = self._getChanges(commit)
+        filesTouched = changes['paths']
+
+        return [self._replaceNoneWithEmptyString(commitHash),
+                self._replaceNoneWithEmptyString(commitTime),
+                self._replaceNoneWithEmptyString(authorEmail),
+                self._replaceNoneWithEmptyString(authorName),
+                self._replaceNoneWithEmptyString(authorTime),
+                self._replaceNoneWithEmptyString(committerEmail),
+                self._replaceNoneWithEmptyString(committerName),
+                self._replaceNoneWithEmptyString(committerTime),
+                ";".join(coAuthors),
+                changes['ins'], changes['del'], changes['files'],
+                ';'.join(filesTouched),
+                self._cleanCommitMessage(
+                    self._replaceNoneWithEmptyString(commitMessage))
+                ]
+
+    def _mineCommitsInParallel(self):
+        """
+        Splits the commits collected during the walk into contiguous chunks and mines them
+        on a pool of processes, each with its own handle on the clone. The records are added
+        to the output in the same order the commits were walked.
+        """
+        commitsToMine = self._commitsToMine
+        self._commitsToMine = []
+        if len(commitsToMine) < self._parallelMiningThreshold:
+            session = pygit2.Repository(self._repositoryPath)
+            for commitHash in commitsToMine:
+                self._output.addRecord(self._getRecord(session[commitHash]))
+            return
+
+        # Use a few chunks per process so that one slow chunk (e.g. one with a huge
+        # vendoring commit) doesn't leave the other processes idle.
+        chunkSize = math.ceil(len(commitsToMine) / (self._processes * 4))
+        chunks = [commitsToMine[i:i + chunkSize]
+                  for i in range(0, len(commitsToMine), chunkSize)]
+        # Child processes are spawned rather than forked because the manager may be
+        # running other routines on threads, which isn't safe to fork.
+        with ProcessPoolExecutor(max_workers=self._processes,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            for records in executor.map(_mineCommitRecords,
+                                        [self._repositoryPath] * len(chunks),
+                                        chunks,
+                                        [self._mergeDiffs] * len(chunks),
+                                        [self._detectRenames] * len(chunks)):
+                for record in records:
+                    self._output.addRecord(record)
+
+    def getResponse(self):
+        if self._processes > 1:
+            self._mineCommitsInParallel()
+        self._output.writeToFile()
+        responseFactory = ResponseFactory()
         return responseFactory.createSuccessResponse(
-            message="CommitInfoMiningRoutine completed!", attachments=output)
+            message="CommitInfoMiningRoutine completed!", attachments=self._output)
+
+    def abort(self):
+        if self._output is not None:
+            self._output.abortStreamingWrite()
+
+
+def _mineCommitRecords(repositoryPath, commitHashes, mergeDiffs, detectRenames):
+    """
+    Mines the records for a chunk of commits. This runs in a child process of a
+    CommitInfoMiningVisitor, so it opens its own handle on the clone.
+    """
+    session = pygit2.Repository(repositoryPath)
+    visitor = CommitInfoMiningVisitor(output=None, mergeDiffs=mergeDiffs,
+                                      detectRenames=detectRenames)
+    return [visitor._getRecord(session[commitHash]) for commitHash in commitHashes]
 
 
 class OnlineCommitAuthorshipRoutineRequest(OnlineRoutineRequest):
@@ -221,18 +464,72 @@ class OnlineCommitAuthorshipRoutine(OnlineRepositoryRoutine):
     """
     This routine traverses the commits for a given repository and associates each commit
     with GitHub/Gitlab/Bitbucket account information.
+
+    The routine accepts the following configuration parameters:
+
+    githubAPI: "graphql" (default) fetches the commits of GitHub repositories through the
+        GraphQL API, with the logins of their authors and committers, 100 commits per
+        request. "rest" lists them through the REST API instead. Both write the same records.
+    useOfflineCommitLog: If true, the commits of GitHub repositories are taken from the
+        output of CommitInfoMiningRoutine for the same repository, which then runs first,
+        instead of being listed through the API. Each distinct author or committer (email and
+        name) is looked up once, through one of their commits, and their login is applied to
+        all of their commits, so the number of requests grows with the number of
+        contributors rather than the number of commits. If the run produced no commit log
+        for the repository, the commits are listed through the API as usual.
+    emailIndexDirectory: GitLab commits are matched to accounts by the email addresses of
+        their authors and committers, using a GitlabEmailIndex of the users of the instance.
+        The index is built once per host, token and run, and if this directory is given, it
+        is kept there and reused by later runs.
+    emailIndexTTL: The number of hours after which a kept GitLab email index is built again
+        (default 24).
+    listSecondaryEmails: If true, the GitLab email index also includes the secondary email
+        addresses of each user (default false). This costs one more request per user of the
+        instance each time the index is built, and needs an administrator's token.
     """
 
+    githubAPIs = ["graphql", "rest"]
+
+    # The number of commits looked up by each GraphQL query in useOfflineCommitLog mode.
+    COMMITLOOKUPBATCHSIZE = 100
+
+    # Walks the history of the default branch (the commits the REST API lists), newest first.
+    COMMITHISTORYQUERY = """
+        query($owner: String!, $name: String!, $cursor: String) {
+          repository(owner: $owner, name: $name) {
+            defaultBranchRef {
+              target {
+                ... on Commit {
+                  history(first: 100, after: $cursor) {
+                    pageInfo { hasNextPage endCursor }
+                    nodes {
+                      oid
+                      author { user { login } }
+                      committer { user { login } }
+                    }
+                  }
+                }
+              }
+            }
+          }
+        }
+        """
+
     def getRequestType(self):
         return OnlineCommitAuthorshipRoutineRequest
 
-    def githubImplementation(self, request, session):
-        def _replaceNoneWithEmptyString(value):
-            if value is None:
-                return ""
-            else:
-                return value
+    def getGitHubAPI(self):
+        return self.getConfigurationParameter("githubAPI", "graphql")
 
+    def isUsingOfflineCommitLog(self):
+        return self.getConfigurationParameter("useOfflineCommitLog", False) is True
+
+    def getDataDependencies(self):
+        if self.isUsingOfflineCommitLog():
+            return ["CommitInfoMiningRoutine"]
+        return []
+
+    def _createOutput(self, request):
         factory = DataEntityFactory()
         output = factory.createAnnotatedCSVData(
             "{outputDirectory}/{repoName}_OnlineCommitAuthorship.csv".format(
@@ -246,10 +543,14 @@ class OnlineCommitAuthorshipRoutine(OnlineRepositoryRoutine):
         output.setURL(request.getRepositoryLocation().getURL())
         output.setColumnNames(["commitHash", "authorLogin", "committerLogin"])
         output.setColumnDatatypes(["str", "str", "str"])
+        return output
 
-        commits = session.get_commits()
-        for commit in commits:
-            commitHash = commit.sha
+    def _getCommitLoginsFromREST(self, session):
+        """
+        Yields the hash, author login and committer login of each commit, as listed by the
+        REST API.
+        """
+        for commit in session.get_commits():
             if commit.author is not None:
                 authorLogin = commit.author.login
             else:
@@ -259,13 +560,149 @@ class OnlineCommitAuthorshipRoutine(OnlineRepositoryRoutine):
                 committerLogin = commit.committer.login
             else:
                 committerLogin = None
+            yield commit.sha, authorLogin, committerLogin
 
+    def _getCommitLoginsFromGraphQL(self, session):
+        """
+        Yields the hash, author login and committer login of each commit, fetched through
+        the GraphQL API a page at a time.
+        """
+        def _getLogin(actor):
+            if actor is None or actor["user"] is None:
+                return None
+            return actor["user"]["login"]
+
+        variables = {"owner": session.owner.login, "name": session.name, "cursor": None}
+        while True:
+            _, data = session.requester.graphql_query(self.COMMITHISTORYQUERY, variables)
+            branch = data["data"]["repository"]["defaultBranchRef"]
+            if branch is None:
+                # The repository is empty.
+                return
+            history = branch["target"]["history"]
+            for node in history["nodes"]:
+                yield node["oid"], _getLogin(node["author"]), _getLogin(node["committer"])
+            if not history["pageInfo"]["hasNextPage"]:
+                return
+            variables["cursor"] = history["pageInfo"]["endCursor"]
+
+    def _getOfflineCommitLog(self, request):
+        """
+        Returns a DataFrame of the hashes, authors and committers of the commits mined by
+        CommitInfoMiningRoutine for the repository (which the manager passes to the routine
+        through the request), or None if there is no such commit log.
+        """
+        commitLogs = [entity for entity in request.getData()
+                      if entity.getCreator() == "CommitInfoMiningRoutine"]
+        if len(commitLogs) == 0:
+            return None
+        return commitLogs[-1].getDataFrame(
+            columns=["commitHash", "authorEmail", "authorName", "committerEmail", "committerName"],
+            applyDatatypes=False)
+
+    def _lookUpCommitLoginsWithREST(self, session, commitHashes):
+        """
+        Returns a dictionary mapping each commit hash to the author and committer logins of
+        the commit, fetched one commit at a time through the REST API.
+        """
+        commitLogins = {}
+        for commitHash in commitHashes:
+            commit = session.get_commit(commitHash)
+            commitLogins[commitHash] = (
+                commit.author.login if commit.author is not None else None,
+                commit.committer.login if commit.committer is not None else None)
+        return commitLogins
+
+    def _lookUpCommitLoginsWithGraphQL(self, session, commitHashes):
+        """
+        Returns a dictionary mapping each commit hash to the author and committer logins of
+        the commit, fetched through the GraphQL API in batches of COMMITLOOKUPBATCHSIZE.
+        """
+        def _getLogin(actor):
+            if actor is None or actor["user"] is None:
+                return None
+            return actor["user"]["login"]
+
+        commitLogins = {}
+        variables = {"owner": session.owner.login, "name": session.name}
+        for start in range(0, len(commitHashes), self.COMMITLOOKUPBATCHSIZE):
+            batch = commitHashes[start:start + self.COMMITLOOKUPBATCHSIZE]
+            lookups = "\n".join(
+                'c{i}: object(oid: "{oid}") {{ ... on Commit {{ author {{ user {{ login }} }} '
+                'committer {{ user {{ login }} }} }} }}'.format(i=i, oid=commitHash)
+                for i, commitHash in enumerate(batch))
+            query = "query($owner: String!, $name: String!) {{ repository(owner: $owner, " \
+                "name: $name) {{ {lookups} }} }}".format(lookups=lookups)
+            _, data = session.requester.graphql_query(query, variables)
+            repository = data["data"]["repository"]
+            for i, commitHash in enumerate(batch):
+                commit = repository["c{i}".format(i=i)]
+                if commit is None:
+                    commitLogins[commitHash] = (None, None)
+                else:
+                    commitLogins[commitHash] = (_getLogin(commit["author"]),
+                                                _getLogin(commit["committer"]))
+        return commitLogins
+
+    def _getCommitLoginsFromOfflineCommitLog(self, session, commitLog):
+        """
+        Yields the hash, author login and committer login of each commit in the commit log.
+        Only one commit per distinct author or committer identity is looked up online.
+        """
+        authors = list(zip(commitLog["authorEmail"], commitLog["authorName"]))
+        committers = list(zip(commitLog["committerEmail"], commitLog["committerName"]))
+
+        # Pick the first commit each identity appears in to look it up with. A single
+        # commit resolves both its author and its committer.
+        representatives = {}
+        for commitHash, author, committer in zip(commitLog["commitHash"], authors, committers):
+            for identity in [author, committer]:
+                if identity not in representatives:
+                    representatives[identity] = commitHash
+        commitHashes = list(dict.fromkeys(representatives.values()))
+
+        if self.getGitHubAPI() == "graphql":
+            commitLogins = self._lookUpCommitLoginsWithGraphQL(session, commitHashes)
+        else:
+            commitLogins = self._lookUpCommitLoginsWithREST(session, commitHashes)
+
+        logins = {}
+        for commitHash, author, committer in zip(commitLog["commitHash"], authors, committers):
+            if commitHash in commitLogins:
+                authorLogin, committerLogin = commitLogins[commitHash]
+                logins.setdefault(author, authorLogin)
+                logins.setdefault(committer, committerLogin)
+
+        for commitHash, author, committer in zip(commitLog["commitHash"], authors, committers):
+            yield commitHash, logins[author], logins[committer]
+
+    def githubImplementation(self, request, session):
+        def _replaceNoneWithEmptyString(value):
+            if value is None:
+                return ""
+            else:
+                return value
+
+        responseFactory = ResponseFactory()
+        if self.getGitHubAPI() not in self.githubAPIs:
+            return responseFactory.createFailureResponse(
+                message="[OnlineCommitAuthorshipRoutine] Unknown githubAPI ({api}), expected one of {apis}.".format(
+                    api=self.getGitHubAPI(), apis=self.githubAPIs))
+
+        output = self._createOutput(request)
+        commitLog = self._getOfflineCommitLog(request) if self.isUsingOfflineCommitLog() else None
+        if commitLog is not None:
+            commitLogins = self._getCommitLoginsFromOfflineCommitLog(session, commitLog)
+        elif self.getGitHubAPI() == "graphql":
+            commitLogins = self._getCommitLoginsFromGraphQL(session)
+        else:
+            commitLogins = self._getCommitLoginsFromREST(session)
+        for commitHash, authorLogin, committerLogin in commitLogins:
             output.addRecord([_replaceNoneWithEmptyString(commitHash),
                               _replaceNoneWithEmptyString(authorLogin),
                               _replaceNoneWithEmptyString(committerLogin)])
 
         output.writeToFile()
-        responseFactory = ResponseFactory()
         return responseFactory.createSuccessResponse(
             message="OnlineCommitAuthorshipRoutine completed!", attachments=output)
 
@@ -276,42 +713,29 @@ class OnlineCommitAuthorshipRoutine(OnlineRepositoryRoutine):
             else:
                 return value
 
-        factory = DataEntityFactory()
-        output = factory.createAnnotatedCSVData(
-            "{outputDirectory}/{repoName}_OnlineCommitAuthorship.csv".format(
-                outputDirectory=request.getOutputDirectory(),
-                repoName=request.getRepositoryLocation().getRepositoryName()))
-
-        output.setReposcannerExecutionID(
-            ReposcannerRunInformant().getReposcannerExecutionID())
-        output.setCreator(self.__class__.__name__)
-        output.setDateCreated(datetime.date.today())
-        output.setURL(request.getRepositoryLocation().getURL())
-        output.setColumnNames(["commitHash", "authorLogin", "committerLogin"])
-        output.setColumnDatatypes(["str", "str", "str"])
+        output = self._createOutput(request)
 
         # Note from Reed: As of July 2021 looks like there's no way to directly the username associated with a commit
         # via the Gitlab API, though this feature may be added in the future (see https://gitlab.com/gitlab-org/gitlab/-/issues/20924)
         # Instead, we can get the list of users and their associated emails, and
-        # map author/committer identities to Gitlab user accounts.
-        users = [users for users in session.users.list()]
-        mapOfEmailsToGitlabLogins = {}
-        for user in users:
-            # Gitlab users can have multiple email addresses, but no two users
-            # can have the exact same email addresses.
-            for email in user.emails.list():
-                mapOfEmailsToGitlabLogins[email] = user.username
-
-        commits = session.commits.list()
+        # map author/committer identities to Gitlab user accounts. Gitlab users can have
+        # multiple email addresses, but no two users can have the exact same email addresses.
+        emailIndex = GitlabEmailIndex(
+            indexDirectory=self.getConfigurationParameter("emailIndexDirectory"),
+            ttl=self.getConfigurationParameter("emailIndexTTL", 24) * 60 * 60,
+            listSecondaryEmails=self.getConfigurationParameter("listSecondaryEmails", False))
+        mapOfEmailsToGitlabLogins = emailIndex.getIndex(session.manager.gitlab)
+
+        commits = session.commits.list(iterator=True, per_page=100)
         for commit in commits:
             commitHash = commit.id
-            if commit.author_name is not None and commit.author_name in mapOfEmailsToGitlabLogins:
-                authorLogin = mapOfEmailsToGitlabLogins[commit.author_name]
+            if commit.author_email is not None:
+                authorLogin = mapOfEmailsToGitlabLogins.get(commit.author_email.lower())
             else:
                 authorLogin = None
 
-            if commit.committer_name is not None and commit.committer_name in mapOfEmailsToGitlabLogins:
-                committerLogin = mapOfEmailsToGitlabLogins[commit.committer_name]
+            if commit.committer_email is not None:
+                committerLogin = mapOfEmailsToGitlabLogins.get(commit.committer_email.lower())
             else:
                 committerLogin = None
 
@@ -331,16 +755,14 @@ class OnlineCommitAuthorshipRoutine(OnlineRepositoryRoutine):
 
 
 class GambitCommitAuthorshipInferenceAnalysisRequest(AnalysisRequestModel):
-    def criteriaFunction(self, entity):
-        try:
-            creator = entity.getCreator()
-            if creator == "CommitInfoMiningRoutine":
-                return True
-            else:
-                return False
+    def getDataDependencies(self):
+        return ["CommitInfoMiningRoutine"]
+
+    def getDataCriteria(self):
+        return DataCriteria(creator=["CommitInfoMiningRoutine"])
 
-        except AttributeError as e:
-            return False
+    def criteriaFunction(self, entity):
+        return self.getDataCriteria()(entity)
 
 
 class GambitCommitAuthorshipInferenceAnalysis(DataAnalysis):
@@ -416,16 +838,18 @@ class GambitCommitAuthorshipInferenceAnalysis(DataAnalysis):
         contributorNamesAndEmails = set()
 
         for commitLogEntity in commitLogEntities:
-            commitLogFrame = commitLogEntity.getDataFrame()
+            # We only need the names and emails, which (unlike the commit messages and lists
+            # of files) are mostly repeated values, so they are held as categoricals.
+            commitLogFrame = commitLogEntity.getDataFrame(
+                columns=["authorName", "authorEmail", "committerName", "committerEmail"],
+                applyDatatypes=True)
             # TODO: Add support for co-authors listed in commit messages. We now collect this data
             # when running CommitInfoMiningRoutine, but we aren't yet checking it here.
-            for index, row in commitLogFrame.iterrows():
-                author = (row["authorName"], row["authorEmail"])
-                committer = (row["committerName"], row["committerEmail"])
-                if author not in contributorNamesAndEmails:
-                    contributorNamesAndEmails.add(author)
-                if committer not in contributorNamesAndEmails:
-                    contributorNamesAndEmails.add(committer)
+            for nameColumn, emailColumn in [("authorName", "authorEmail"),
+                                            ("committerName", "committerEmail")]:
+                contributorNamesAndEmails.update(
+                    zip(commitLogFrame[nameColumn].astype(object),
+                        commitLogFrame[emailColumn].astype(object)))
 
         # Create the pandas DataFrame to pass to gambit.
         contributorFrame = pd.DataFrame(
@@ -452,16 +876,14 @@ class GambitCommitAuthorshipInferenceAnalysis(DataAnalysis):
 
 
 class VerifiedCommitAuthorshipAnalysisRequest(AnalysisRequestModel):
-    def criteriaFunction(self, entity):
-        try:
-            creator = entity.getCreator()
-            if creator == "OnlineCommitAuthorshipRoutine" or creator == "CommitInfoMiningRoutine":
-                return True
-            else:
-                return False
+    def getDataDependencies(self):
+        return ["OnlineCommitAuthorshipRoutine", "CommitInfoMiningRoutine"]
+
+    def getDataCriteria(self):
+        return DataCriteria(creator=["OnlineCommitAuthorshipRoutine", "CommitInfoMiningRoutine"])
 
-        except AttributeError as e:
-            return False
+    def criteriaFunction(self, entity):
+        return self.getDataCriteria()(entity)
 
 
 class VerifiedCommitAuthorshipAnalysis(DataAnalysis):
@@ -492,14 +914,37 @@ class OfflineCommitCountsRoutine(OfflineRepositoryRoutine):
     def getRequestType(self):
         return OfflineCommitCountsRoutineRequest
 
-    def offlineImplementation(self, request, session):
-        numberOfCommitsByContributor = {}
+    @classmethod
+    def supportsSharedCommitWalk(cls):
+        return True
 
-        for commit in session.walk(session.head.target, pygit2.GIT_SORT_TOPOLOGICAL):
-            if commit.author.email not in numberOfCommitsByContributor:
-                numberOfCommitsByContributor[commit.author.email] = 1
-            else:
-                numberOfCommitsByContributor[commit.author.email] += 1
+    def createCommitVisitor(self, request, session):
+        return OfflineCommitCountsVisitor(self, request)
+
+
+class OfflineCommitCountsVisitor(CommitVisitor):
+    """
+    Tallies the commits of each author email for OfflineCommitCountsRoutine.
+    """
+
+    def __init__(self, routine, request):
+        """
+        routine: The OfflineCommitCountsRoutine that created this visitor.
+        request: The OfflineCommitCountsRoutineRequest being processed.
+        """
+        self._routine = routine
+        self._request = request
+        self._numberOfCommitsByContributor = {}
+
+    def visitCommit(self, commit):
+        if commit.author.email not in self._numberOfCommitsByContributor:
+            self._numberOfCommitsByContributor[commit.author.email] = 1
+        else:
+            self._numberOfCommitsByContributor[commit.author.email] += 1
+
+    def getResponse(self):
+        request = self._request
+        numberOfCommitsByContributor = self._numberOfCommitsByContributor
 
         factory = DataEntityFactory()
         output = factory.createAnnotatedCSVData(
@@ -509,7 +954,7 @@ class OfflineCommitCountsRoutine(OfflineRepositoryRoutine):
 
         output.setReposcannerExecutionID(
             ReposcannerRunInformant().getReposcannerExecutionID())
-        output.setCreator(self.__class__.__name__)
+        output.setCreator(self._routine.__class__.__name__)
         output.setDateCreated(datetime.date.today())
         output.setURL(request.getRepositoryLocation().getURL())
         output.setColumnNames(["email", "commitCount"])
@@ -634,24 +1079,14 @@ class FileInteractionRoutine(OfflineRepositoryRoutine):
 
 
 class ContributorFileInteractionAnalysisRequest(AnalysisRequestModel):
-    def criteriaFunction(self, entity):
-        """
-        Here we assume that the entity is, in fact, a
-        ReposcannerDataEntity. Because we haven't yet
-        decided to enforce a restriction such that only
-        ReposcannerDataEntity objects can be stored by
-        a DataEntityStore, we'll wrap it in a try block.
-        We may revisit this decision later.
-        """
-        try:
-            creator = entity.getCreator()
-            if creator == "CommitAuthorIdentificationRoutine" or creator == "FileInteractionRoutine":
-                return True
-            else:
-                return False
+    def getDataDependencies(self):
+        return ["CommitAuthorIdentificationRoutine", "FileInteractionRoutine"]
 
-        except AttributeError as e:
-            return False
+    def getDataCriteria(self):
+        return DataCriteria(creator=["CommitAuthorIdentificationRoutine", "FileInteractionRoutine"])
+
+    def criteriaFunction(self, entity):
+        return self.getDataCriteria()(entity)
 
 
 class ContributorFileInteractionAnalysis(DataAnalysis):
@@ -667,24 +1102,15 @@ class ContributorFileInteractionAnalysis(DataAnalysis):
 
 
 class TeamSizeAndDistributionAnalysisRequest(AnalysisRequestModel):
-    def criteriaFunction(self, entity):
-        """
-        Here we assume that the entity is, in fact, a
-        ReposcannerDataEntity. Because we haven't yet
-        decided to enforce a restriction such that only
-        ReposcannerDataEntity objects can be stored by
-        a DataEntityStore, we'll wrap it in a try block.
-        We may revisit this decision later.
-        """
-        try:
-            creator = entity.getCreator()
-            if creator == "ContributorAccountListRoutine" or creator == "external":
-                return True
-            else:
-                return False
+    def getDataDependencies(self):
+        # Data from reposcanner-data ("external") is loaded before any tasks run.
+        return ["ContributorAccountListRoutine"]
 
-        except AttributeError as e:
-            return False
+    def getDataCriteria(self):
+        return DataCriteria(creator=["ContributorAccountListRoutine", "external"])
+
+    def criteriaFunction(self, entity):
+        return self.getDataCriteria()(entity)
 
 
 class TeamSizeAndDistributionAnalysis(DataAnalysis):
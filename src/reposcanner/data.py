@@ -3,9 +3,68 @@ import csv
 import re
 import os
 import hashlib
+import sys
 import yaml
 import pandas as pd
 import datetime
+import itertools
+import threading
+import weakref
+from collections import OrderedDict
+
+
+class DataCriteria:
+    """
+    A declarative description of the data entities an analysis needs, which a
+    DataEntityStore can answer using its indexes instead of testing every entity it holds.
+    Each field is either None (any value is accepted), a single value, or a list of
+    accepted values. For example...
+            DataCriteria(creator=["OnlineCommitAuthorshipRoutine", "CommitInfoMiningRoutine"])
+
+    will match the entities created by either of those routines. DataCriteria objects are
+    also callable like criteria functions, so they can be used wherever one is expected.
+    """
+
+    def __init__(self, creator=None, url=None, projectID=None, entityClass=None, predicate=None):
+        """
+        creator: The name(s) of the routine or analysis that created the entity.
+        url: The URL(s) of the repository the data was mined from.
+        projectID: The project ID(s) associated with the repository.
+        entityClass: The class(es) of the entity. Subclasses also match.
+        predicate: An optional function f(entity) that is applied to the entities
+        matching the other fields, for anything the indexes can't express.
+        """
+        self._fields = {}
+        for key, value in [("creator", creator), ("url", url), ("projectid", projectID),
+                           ("class", entityClass)]:
+            if value is None:
+                continue
+            if not isinstance(value, (list, tuple, set, frozenset)):
+                value = [value]
+            self._fields[key] = frozenset(value)
+        self._predicate = predicate
+
+    def getFields(self):
+        """
+        Returns a dictionary mapping each index key (creator, url, projectid or class)
+        constrained by these criteria to the set of accepted values.
+        """
+        return self._fields
+
+    def getPredicate(self):
+        return self._predicate
+
+    def __call__(self, entity):
+        keys = DataEntityStore.getIndexKeys(entity)
+        for key, acceptedValues in self._fields.items():
+            if key == "class":
+                if not isinstance(entity, tuple(acceptedValues)):
+                    return False
+            elif keys[key] not in acceptedValues:
+                return False
+        if self._predicate is not None:
+            return bool(self._predicate(entity))
+        return True
 
 
 class DataEntityStore:
@@ -18,10 +77,40 @@ class DataEntityStore:
     Data loaded in from reposcanner-data and data generated by repository routines
     gets placed into a DataEntityStore, where it can later be accessed by analyses. This
     class is used by the ReposcannerManager, who intercepts data following the completion of tasks.
+
+    The store indexes entities by creator, URL, project ID and class as they are inserted,
+    so that lookups with a DataCriteria object only touch the matching entities. The
+    indexes reflect the metadata of an entity at the time it was inserted; call reindex()
+    after changing the metadata of an entity that is already in the store.
+
+    When spilling to disk, the store frees the records of entities that have been written
+    to their files as they are inserted, keeping only their metadata in memory. The records
+    are read back lazily when an analysis uses the entities it fetched. Each time an
+    entity reads its records back, the store unloads the least recently used of the other
+    fetched entities until the records in memory are under its memory ceiling again.
+    Entities that can't be reloaded from disk (e.g. YAMLData, or files with unsaved
+    records) are always kept in memory.
     """
 
-    def __init__(self):
-        self._storage = []
+    # The default memory ceiling for records held in memory when spilling to disk (1 GiB).
+    DEFAULTMEMORYCEILING = 1024 * 1024 * 1024
+
+    def __init__(self, spillToDisk=False, memoryCeiling=DEFAULTMEMORYCEILING):
+        # Entities keyed by id(), in insertion order. The store holds a reference to each
+        # entity, so ids can't be reused while the entity is stored.
+        self._storage = {}
+        self._sequence = {}
+        self._insertions = itertools.count()
+        self._indexKeys = {}
+        self._indexes = {"creator": {}, "url": {}, "projectid": {}, "class": {}}
+        # Entities handed out by the store, which may load their records at any time after,
+        # from least to most recently fetched.
+        self._fetchedEntities = OrderedDict()
+        # Entities read their records back on the threads of the analyses using them.
+        self._fetchedEntitiesLock = threading.RLock()
+        self._memoryCeiling = memoryCeiling
+        self._spillToDisk = False
+        self.setSpillToDisk(spillToDisk)
 
     def __len__(self):
         """
@@ -37,7 +126,23 @@ class DataEntityStore:
 
         entity in store == entity in self._storage
         """
-        return entity in self._storage
+        return id(entity) in self._storage
+
+    @staticmethod
+    def getIndexKeys(entity):
+        """
+        Returns the values an entity is indexed by: its creator, URL, project ID (None for
+        any that the entity doesn't provide) and class.
+        """
+        keys = {}
+        for key, getter in [("creator", "getCreator"), ("url", "getURL"),
+                            ("projectid", "getProjectID")]:
+            try:
+                keys[key] = getattr(entity, getter)()
+            except (AttributeError, KeyError):
+                keys[key] = None
+        keys["class"] = type(entity)
+        return keys
 
     def read(self):
         """
@@ -45,7 +150,8 @@ class DataEntityStore:
         data held in the store. Usually callers will
         use getByCriteria() instead of read().
         """
-        for entity in self._storage:
+        for entity in list(self._storage.values()):
+            self._onFetch([entity])
             yield entity
 
     def insert(self, entity):
@@ -54,7 +160,13 @@ class DataEntityStore:
 
         entity: A ReposcannerDataEntity object.
         """
-        self._storage.append(entity)
+        if id(entity) in self._storage:
+            return
+        self._storage[id(entity)] = entity
+        self._sequence[id(entity)] = next(self._insertions)
+        self._addToIndexes(entity)
+        if self._spillToDisk:
+            self._spill(entity)
 
     def remove(self, entity):
         """
@@ -63,7 +175,54 @@ class DataEntityStore:
 
         entity: A ReposcannerDataEntity object.
         """
-        self._storage.remove(entity)
+        if id(entity) not in self._storage:
+            raise ValueError("DataEntityStore.remove(entity): entity not in store")
+        self._removeFromIndexes(entity)
+        del self._storage[id(entity)]
+        del self._sequence[id(entity)]
+        with self._fetchedEntitiesLock:
+            if self._fetchedEntities.pop(id(entity), None) is not None:
+                entity.setRecordsLoadedListener(None)
+
+    def reindex(self, entity):
+        """
+        Update the indexes after the metadata of a stored entity has changed.
+
+        entity: A ReposcannerDataEntity object held by the store.
+        """
+        if id(entity) not in self._storage:
+            raise ValueError("DataEntityStore.reindex(entity): entity not in store")
+        self._removeFromIndexes(entity)
+        self._addToIndexes(entity)
+
+    def _addToIndexes(self, entity):
+        keys = DataEntityStore.getIndexKeys(entity)
+        for key, value in keys.items():
+            try:
+                self._indexes[key].setdefault(value, {})[id(entity)] = entity
+            except TypeError:
+                # Unhashable metadata can't be indexed; DataCriteria will never match it.
+                keys[key] = None
+                self._indexes[key].setdefault(None, {})[id(entity)] = entity
+        self._indexKeys[id(entity)] = keys
+
+    def _removeFromIndexes(self, entity):
+        keys = self._indexKeys.pop(id(entity))
+        for key, value in keys.items():
+            bucket = self._indexes[key][value]
+            del bucket[id(entity)]
+            if len(bucket) == 0:
+                del self._indexes[key][value]
+
+    def _getIndexMatches(self, key, acceptedValues):
+        index = self._indexes[key]
+        if key == "class":
+            acceptedValues = [clazz for clazz in index
+                              if issubclass(clazz, tuple(acceptedValues))]
+        matches = {}
+        for value in acceptedValues:
+            matches.update(index.get(value, {}))
+        return matches
 
     def getByCriteria(self, criteria):
         """
@@ -76,14 +235,229 @@ class DataEntityStore:
                         return entity.getCreator() == 'NameOfRepositoryRoutine'
 
         will return only the entities that were generated by that repository.
+
+        criteria may also be a DataCriteria object, in which case the
+        store's indexes are used and only matching entities are examined.
+        """
+        if not isinstance(criteria, DataCriteria):
+            return self._onFetch(list(filter(criteria, list(self._storage.values()))))
+
+        matches = None
+        for key, acceptedValues in criteria.getFields().items():
+            keyMatches = self._getIndexMatches(key, acceptedValues)
+            if matches is None:
+                matches = keyMatches
+            else:
+                if len(keyMatches) < len(matches):
+                    matches, keyMatches = keyMatches, matches
+                matches = {entityID: entity for entityID, entity in matches.items()
+                           if entityID in keyMatches}
+        if matches is None:
+            entities = list(self._storage.values())
+        else:
+            # Return the matches in the order they were inserted, like the full scan does.
+            entities = [matches[entityID] for entityID in
+                        sorted(matches, key=lambda entityID: self._sequence[entityID])]
+
+        predicate = criteria.getPredicate()
+        if predicate is not None:
+            entities = [entity for entity in entities if predicate(entity)]
+        return self._onFetch(entities)
+
+    def setSpillToDisk(self, spillToDisk):
+        """
+        Turns spilling records to disk on or off. Turning it on frees the records of the
+        entities already in the store that can be reloaded from disk.
+
+        spillToDisk: True or False.
+        """
+        self._spillToDisk = spillToDisk
+        if spillToDisk:
+            for entity in list(self._storage.values()):
+                self._spill(entity)
+
+    def isSpillingToDisk(self):
+        return self._spillToDisk
+
+    def setMemoryCeiling(self, memoryCeiling):
+        """
+        memoryCeiling: The number of bytes of records that entities fetched from the store
+        may hold in memory when spilling to disk.
+        """
+        self._memoryCeiling = memoryCeiling
+        self._enforceMemoryCeiling()
+
+    def getMemoryCeiling(self):
+        return self._memoryCeiling
+
+    def getRecordsMemoryUsage(self):
         """
-        return list(filter(criteria, self._storage))
+        Returns the approximate number of bytes used by the records that entities fetched
+        from the store have loaded back into memory.
+        """
+        with self._fetchedEntitiesLock:
+            return sum(entity.getRecordsMemoryUsage()
+                       for entity in self._fetchedEntities.values())
+
+    def _spill(self, entity):
+        try:
+            if entity.canUnloadRecords():
+                entity.unloadRecords()
+        except AttributeError:
+            # Not an entity whose records can be reloaded from disk.
+            pass
+
+    def _onFetch(self, entities):
+        if self._spillToDisk:
+            with self._fetchedEntitiesLock:
+                for entity in entities:
+                    if hasattr(entity, "getRecordsMemoryUsage"):
+                        self._fetchedEntities[id(entity)] = entity
+                        self._fetchedEntities.move_to_end(id(entity))
+                        # The records of a fetched entity are only read back once it is
+                        # used, which is when the ceiling needs to be enforced.
+                        entity.setRecordsLoadedListener(self._onRecordsLoaded)
+                self._enforceMemoryCeiling()
+        return entities
+
+    def _onRecordsLoaded(self, entity):
+        with self._fetchedEntitiesLock:
+            if id(entity) in self._fetchedEntities:
+                self._fetchedEntities.move_to_end(id(entity))
+            self._enforceMemoryCeiling(keep=entity)
+
+    def _enforceMemoryCeiling(self, keep=None):
+        """
+        Unload the records of the least recently used fetched entities until the records
+        in memory fit under the ceiling.
+
+        keep: An entity that is not unloaded, e.g. because it just read its records back
+        to use them.
+        """
+        if not self._spillToDisk:
+            return
+        with self._fetchedEntitiesLock:
+            usage = [(entity, entity.getRecordsMemoryUsage())
+                     for entity in self._fetchedEntities.values()]
+            total = sum(size for entity, size in usage)
+            for entity, size in usage:
+                if total <= self._memoryCeiling:
+                    break
+                if entity is not keep and size > 0 and entity.canUnloadRecords():
+                    entity.unloadRecords()
+                    total -= size
+
+
+class DataFrameCache:
+    """
+    A least-recently-used cache of the DataFrames built by AnnotatedCSVData objects. The
+    cache is shared by all data entities (and all instances of this class), so that the
+    memory held by cached DataFrames is bounded across the whole run. When adding a
+    DataFrame would exceed the budget, the least recently used DataFrames are evicted.
+    """
+
+    # Class variables shared by every instance of the cache.
+    DEFAULTBUDGET = 1024 * 1024 * 1024
+    _budget = DEFAULTBUDGET
+    _entries = OrderedDict()
+    _size = 0
+    _lock = threading.Lock()
+
+    def getBudget(self):
+        """Returns the number of bytes cached DataFrames may use."""
+        return DataFrameCache._budget
+
+    def setBudget(self, budget):
+        """
+        budget: The number of bytes cached DataFrames may use. A budget of 0 disables
+        caching.
+        """
+        with DataFrameCache._lock:
+            DataFrameCache._budget = budget
+            self._evict()
+
+    def getSize(self):
+        """Returns the (approximate) number of bytes used by cached DataFrames."""
+        return DataFrameCache._size
+
+    def __len__(self):
+        return len(DataFrameCache._entries)
+
+    def get(self, owner, key):
+        """
+        Returns the DataFrame cached for the given owner and key, or None.
+
+        owner: An identifier unique to the data entity the DataFrame was built from.
+        key: A hashable value identifying how the DataFrame was built.
+        """
+        with DataFrameCache._lock:
+            entry = DataFrameCache._entries.get((owner, key))
+            if entry is None:
+                return None
+            DataFrameCache._entries.move_to_end((owner, key))
+            return entry[0]
+
+    # Measuring the memory used by strings means visiting each of them, so the size of
+    # large DataFrames is extrapolated from this many rows.
+    SAMPLESIZE = 1000
+
+    def estimateSize(self, frame):
+        """
+        Returns the approximate number of bytes used by a DataFrame, including the
+        Python objects (e.g. strings) held by its columns.
+        """
+        if len(frame) <= DataFrameCache.SAMPLESIZE:
+            return int(frame.memory_usage(index=True, deep=True).sum())
+        sample = frame.iloc[:DataFrameCache.SAMPLESIZE]
+        return int(sample.memory_usage(index=True, deep=True).sum()
+                   * len(frame) / DataFrameCache.SAMPLESIZE)
+
+    def put(self, owner, key, frame):
+        """
+        Caches a DataFrame, evicting the least recently used ones as needed. DataFrames
+        larger than the whole budget are not cached.
+        """
+        if DataFrameCache._budget <= 0:
+            return
+        size = self.estimateSize(frame)
+        with DataFrameCache._lock:
+            self._remove((owner, key))
+            if size > DataFrameCache._budget:
+                return
+            DataFrameCache._entries[(owner, key)] = (frame, size)
+            DataFrameCache._size += size
+            self._evict()
+
+    def invalidate(self, owner):
+        """Removes all the DataFrames cached for an owner."""
+        with DataFrameCache._lock:
+            for entryKey in [entryKey for entryKey in DataFrameCache._entries
+                             if entryKey[0] == owner]:
+                self._remove(entryKey)
+
+    def clear(self):
+        with DataFrameCache._lock:
+            DataFrameCache._entries.clear()
+            DataFrameCache._size = 0
+
+    def _remove(self, entryKey):
+        entry = DataFrameCache._entries.pop(entryKey, None)
+        if entry is not None:
+            DataFrameCache._size -= entry[1]
+
+    def _evict(self):
+        while DataFrameCache._size > DataFrameCache._budget and len(DataFrameCache._entries) > 0:
+            entryKey, (frame, size) = DataFrameCache._entries.popitem(last=False)
+            DataFrameCache._size -= size
 
 
 class DataEntityFactory:
     def createAnnotatedCSVData(self, filePath):
         return AnnotatedCSVData(filePath=filePath)
 
+    def createAnnotatedParquetData(self, filePath):
+        return AnnotatedParquetData(filePath=filePath)
+
     def createYAMLData(self, filePath):
         return YAMLData(filePath=filePath)
 
@@ -243,9 +617,24 @@ class AnnotatedCSVData(ReposcannerDataEntity):
     (Model for Tabular Data and Metadata on the Web, section 5.4).
     """
 
+    # Used to give each object a unique key in the DataFrameCache (ids can be reused).
+    _dataFrameCacheIDs = itertools.count()
+
     def __init__(self, filePath):
         super().__init__(filePath)
         self._records = []
+        self._recordsAreOnDisk = False
+        self._recordsAreModified = False
+        # Guards loading and unloading records, which a DataEntityStore may do while an
+        # analysis running on another thread reads them.
+        self._recordsLock = threading.RLock()
+        self._streamFile = None
+        self._streamWriter = None
+        self._streamChunkSize = None
+        self._dataFrameCacheID = next(AnnotatedCSVData._dataFrameCacheIDs)
+        self._dataFrameCacheFinalizer = None
+        self._hasCachedDataFrames = False
+        self._recordsLoadedListener = None
         self.setColumnNames([])
         self.setColumnDatatypes([])
         self.setProjectID(None)
@@ -308,29 +697,289 @@ class AnnotatedCSVData(ReposcannerDataEntity):
         to write out a record. Records are guaranteed to be
         written out in the order that they were received.
         """
+        self._loadRecordsFromDisk()
         self._records.append(record)
+        self._recordsAreModified = True
+        self._invalidateDataFrames()
+        if self.isStreaming() and len(self._records) >= self._streamChunkSize:
+            self._flushRecordsToStream()
 
     def getRawRecords(self):
         """
         Get a list of lists, each containing the data associated
         with the record. This method is provided for testing purposes
         and users should call getRecordsForDicts instead.
+
+        While streaming, only the records that have not yet been flushed to disk are returned.
+        """
+        with self._recordsLock:
+            loaded = self._loadRecordsFromDisk()
+            records = self._records
+        if loaded and self._recordsLoadedListener is not None:
+            # Called without holding our lock, as the listener may unload other entities.
+            self._recordsLoadedListener(self)
+        return records
+
+    def setRecordsLoadedListener(self, listener):
+        """
+        listener: A function called with this object each time getRawRecords() reads the
+        records back from disk (e.g. by the DataEntityStore that fetched it, to keep the
+        records in memory under its ceiling), or None.
+        """
+        self._recordsLoadedListener = listener
+
+    def areRecordsLoaded(self):
+        """
+        Returns False if the records of the file have not been read from disk yet (or have
+        been unloaded), True otherwise.
+        """
+        return not self._recordsAreOnDisk
+
+    def unloadRecords(self):
         """
-        return self._records
+        Frees the memory held by the records. They will be read back from the file the next
+        time they are needed. Records that have not been written to the file can't be
+        unloaded.
+        """
+        with self._recordsLock:
+            if self._recordsAreOnDisk:
+                return
+            if not self.canUnloadRecords():
+                raise RuntimeError(
+                    "Cannot unload the records of {path} before they are written to the file.".format(
+                        path=self.getFilePath()))
+            self._records = []
+            self._recordsAreOnDisk = True
+
+    def canUnloadRecords(self):
+        """
+        Returns True if the records are loaded and identical to those in the file, so that
+        unloadRecords() can free them.
+        """
+        return not self._recordsAreOnDisk and not self.isStreaming() and \
+            not self._recordsAreModified and self.fileExists()
+
+    # Measuring the memory used by records means visiting each value, so the memory used
+    # by large files is extrapolated from this many records.
+    _recordsMemorySampleSize = 1000
+
+    def getRecordsMemoryUsage(self):
+        """
+        Returns the approximate number of bytes used by the records held in memory (0 if
+        they haven't been loaded).
+        """
+        with self._recordsLock:
+            if self._recordsAreOnDisk:
+                return 0
+            records = self._records
+        sample = records[:AnnotatedCSVData._recordsMemorySampleSize]
+        if len(sample) == 0:
+            return sys.getsizeof(records)
+        sampleSize = sum(sys.getsizeof(record) + sum(sys.getsizeof(value) for value in record)
+                         for record in sample)
+        return sys.getsizeof(records) + sampleSize * len(records) // len(sample)
+
+    def isStreaming(self):
+        return self._streamWriter is not None
+
+    def beginStreamingWrite(self, chunkSize=1000):
+        """
+        Start writing the file incrementally, so that its records don't all need to be held
+        in memory at once. The metadata header (and any records already added) is written
+        out immediately, and from then on records passed to addRecord() are written out in
+        chunks of chunkSize. Changes to the metadata after this point are not written.
+
+        The file is written under a temporary name and only moved into place by
+        writeToFile(), so a run that fails partway through never leaves behind a file that
+        looks complete. Afterwards, the records are read back from disk when they are needed.
+
+        chunkSize: The number of records to hold in memory before writing them out.
+        """
+        if self.isStreaming():
+            raise RuntimeError("Already streaming records to {path}.".format(
+                path=self.getFilePath()))
+        self._loadRecordsFromDisk()
+        self._streamChunkSize = chunkSize
+        self._openStream(self._getStreamFilePath())
+        self._flushRecordsToStream()
+
+    def _getStreamFilePath(self):
+        return "{path}.partial".format(path=self.getFilePath())
+
+    def _openStream(self, path):
+        """
+        Opens the file that records are streamed to and writes its metadata header.
+        Subclasses that store records in another format override this method,
+        _writeRecordsToStream() and _closeStream().
+        """
+        self._streamFile = open(path, 'w', newline='\n')
+        self._streamWriter = self._createCSVWriter(self._streamFile)
+        self._writeMetadata(self._streamWriter)
+
+    def _writeRecordsToStream(self, records):
+        self._streamWriter.writerows(records)
+
+    def _closeStream(self):
+        self._streamFile.close()
+        self._streamFile = None
+        self._streamWriter = None
+
+    def _flushRecordsToStream(self):
+        self._writeRecordsToStream(self._records)
+        self._records = []
 
-    def getDataFrame(self, firstRowContainsHeaders=False):
+    def abortStreamingWrite(self):
+        """
+        Stop a streaming write without finishing the file. The temporary file is deleted
+        and the records that were not yet written out are discarded, so the file (if it
+        exists) is left as it was before beginStreamingWrite(), and the records are read
+        back from it when they are needed.
+        """
+        if not self.isStreaming():
+            return
+        try:
+            self._closeStream()
+        finally:
+            self._streamFile = None
+            self._streamWriter = None
+            try:
+                os.remove(self._getStreamFilePath())
+            except FileNotFoundError:
+                pass
+            self._invalidateDataFrames()
+            self._records = []
+            self._recordsAreOnDisk = self.fileExists()
+            self._recordsAreModified = False
+
+    def _finishStreamingWrite(self):
+        self._flushRecordsToStream()
+        self._closeStream()
+        os.replace(self._getStreamFilePath(), self.getFilePath())
+        self._recordsAreOnDisk = True
+        self._recordsAreModified = False
+
+    def _loadRecordsFromDisk(self):
+        """
+        Reads the records of the file, the first time they are needed after the file
+        was read, written by streaming, or unloaded. Returns True if they were read.
+        """
+        with self._recordsLock:
+            if self._recordsAreOnDisk:
+                self._recordsAreOnDisk = False
+                self._records = []
+                self._readFile(readRecords=True, readMetadata=False)
+                return True
+            return False
+
+    def getDataFrame(self, firstRowContainsHeaders=False, columns=None,
+                     applyDatatypes=False):
         """
         Returns file data in the form of a pandas DataFrame.
 
+        DataFrames are cached (see DataFrameCache), so asking for the same DataFrame again
+        is cheap until records are added or the file is read again. Each call returns a
+        deep copy of the cached DataFrame, so callers may modify its columns and values.
+        The Python objects held by object columns (e.g. the lists of "list" columns) are
+        shared with the cache, though, and must not be modified in place.
+
         firstRowContainsHeaders: False if the column names are stored in metadata, True if
         the column names are found in the first row of the records (default False).
+        columns: A list of the names of the columns to include (default all of them).
+        applyDatatypes: If True, the column datatypes stored in the metadata are applied to
+        the DataFrame (see _applyDatatypes). If False (default), or if the column names are
+        found in the first row of the records, the columns hold the raw record values.
         """
+        cacheKey = (firstRowContainsHeaders,
+                    tuple(columns) if columns is not None else None,
+                    applyDatatypes)
+        frame = DataFrameCache().get(self._dataFrameCacheID, cacheKey)
+        if frame is None:
+            frame = self._buildDataFrame(firstRowContainsHeaders, columns, applyDatatypes)
+            self._cacheDataFrame(cacheKey, frame)
+        # Without pandas' copy-on-write, writes to a shallow copy would reach the cached
+        # DataFrame too.
+        return frame.copy(deep=True)
+
+    def _buildDataFrame(self, firstRowContainsHeaders, columns, applyDatatypes):
+        if self._recordsAreOnDisk and not firstRowContainsHeaders:
+            frame = self._readDataFrameFromFile(columns, applyDatatypes)
+            if frame is not None:
+                return self._applyDatatypes(frame) if applyDatatypes else frame
+
+        records = self.getRawRecords()
         if not firstRowContainsHeaders:
-            return pd.DataFrame.from_records(
-                self._records, columns=self.getColumnNames())
+            frame = pd.DataFrame.from_records(
+                records, columns=self.getColumnNames())
         else:
-            return pd.DataFrame.from_records(
-                self._records[1:], columns=self._records[0])
+            frame = pd.DataFrame.from_records(
+                records[1:], columns=records[0])
+        if columns is not None:
+            frame = frame[columns]
+        if applyDatatypes and not firstRowContainsHeaders:
+            frame = self._applyDatatypes(frame)
+        return frame
+
+    def _cacheDataFrame(self, cacheKey, frame):
+        if self._dataFrameCacheFinalizer is None:
+            # Drop our DataFrames from the cache once this object is garbage collected.
+            self._dataFrameCacheFinalizer = weakref.finalize(
+                self, DataFrameCache().invalidate, self._dataFrameCacheID)
+        DataFrameCache().put(self._dataFrameCacheID, cacheKey, frame)
+        self._hasCachedDataFrames = True
+
+    def _invalidateDataFrames(self):
+        if self._hasCachedDataFrames:
+            DataFrameCache().invalidate(self._dataFrameCacheID)
+            self._hasCachedDataFrames = False
+
+    def setMetadataAttribute(self, key, value):
+        # Column names and datatypes determine how DataFrames are built.
+        if key == "names" or key == "datatypes":
+            self._invalidateDataFrames()
+        super().setMetadataAttribute(key, value)
+
+    # String columns where at most this fraction of the values are distinct (e.g. the
+    # author emails of a commit log) are stored as categoricals, which take far less memory.
+    categoricalThreshold = 0.5
+
+    def _applyDatatypes(self, frame):
+        """
+        Converts the columns of a DataFrame built from the records to their declared
+        datatypes. "int" columns become int64 (or the nullable Int64 if values are missing),
+        "float" columns float64, "bool" columns bool, and "list" columns, whose values are
+        strings delimited by semicolons, lists of strings. Other columns are treated as
+        strings, and become categoricals if few of their values are distinct. Columns whose
+        values can't be converted to their declared type are left as they are.
+        """
+        datatypes = dict(zip(self.getColumnNames(), self.getColumnDatatypes()))
+
+        def isMissing(value):
+            return value is None or value == "" or (isinstance(value, float) and value != value)
+
+        for name in frame.columns:
+            datatype = datatypes.get(name, "str")
+            column = frame[name]
+            if datatype == "int" or datatype == "float":
+                numericColumn = pd.to_numeric(column, errors="coerce")
+                if (numericColumn.isna() & ~column.map(isMissing)).any():
+                    continue
+                if datatype == "float":
+                    frame[name] = numericColumn.astype("float64")
+                elif numericColumn.isna().any():
+                    frame[name] = numericColumn.astype("Int64")
+                else:
+                    frame[name] = numericColumn.astype("int64")
+            elif datatype == "bool":
+                frame[name] = column.map(
+                    lambda value: value if isinstance(value, bool) else str(value).lower() == "true")
+            elif datatype == "list":
+                frame[name] = column.map(
+                    lambda value: value if isinstance(value, list)
+                    else [] if isMissing(value) else str(value).split(";"))
+            elif len(column) > 1 and pd.api.types.infer_dtype(column, skipna=False) == "string" \
+                    and column.nunique() <= len(column) * self.categoricalThreshold:
+                frame[name] = column.astype("category")
+        return frame
 
     def getRecordsAsDicts(self):
         """
@@ -339,7 +988,7 @@ class AnnotatedCSVData(ReposcannerDataEntity):
         """
         columnNames = self.getColumnNames()
         recordDicts = []
-        for record in self._records:
+        for record in self.getRawRecords():
             recordDict = {}
             for index in range(len(columnNames)):
                 recordDict[columnNames[index]] = record[index]
@@ -361,6 +1010,33 @@ class AnnotatedCSVData(ReposcannerDataEntity):
             and hasColumnNames and hasColumnDatatypes
 
     def readFromFile(self):
+        """
+        Reads the metadata of the file. The records themselves are only read when they are
+        first needed (e.g. by getRawRecords() or getDataFrame()), so files that are never
+        used don't cost any time or memory beyond their header.
+        """
+        self._invalidateDataFrames()
+        if len(self._records) > 0 and not self._recordsAreOnDisk:
+            # Records read from the file are added to those we already have.
+            self._readFile(readRecords=True, readMetadata=True)
+        else:
+            self._readFile(readRecords=False, readMetadata=True)
+            self._recordsAreOnDisk = True
+            self._recordsAreModified = False
+
+    def _readFile(self, readRecords, readMetadata):
+        with open(self.getFilePath(), 'r', newline='\n') as f:
+            self._readMetadataBlock(f, readMetadata=readMetadata)
+            if readRecords:
+                self._records.extend(csv.reader(f, delimiter=',', quotechar='|'))
+
+    def _readMetadataBlock(self, f, readMetadata):
+        """
+        Reads the lines of metadata at the top of an open file, leaving the file positioned
+        at the first record.
+
+        readMetadata: If False, the metadata is skipped over instead of being parsed.
+        """
         def readMetadataFromFile(text):
             try:
                 # TODO: This may turn out to be a fragile way of parsing the
@@ -373,56 +1049,298 @@ class AnnotatedCSVData(ReposcannerDataEntity):
                 raise ValueError(
                     "Failed to parse metadata in {path}: {text}".format(
                         path=self.getFilePath(), text=text))
-        with open(self.getFilePath(), 'r', newline='\n') as f:
-            csvreader = csv.reader(f, delimiter=',', quotechar='|')
-            currentlyReadingMetadata = True
-            for row in csvreader:
-                if currentlyReadingMetadata:
-                    if len(row) > 0 and row[0][0] == '#':
-                        metadataKey, metadataValue = readMetadataFromFile(row[0])
-                        if metadataKey == "names" or metadataKey == "datatypes":
-                            # TODO: Parse names and datatypes, which are lists delimited
-                            # by semicolons.
-                            metadataValue = metadataValue.split(sep=';')
-                            self.setMetadataAttribute(metadataKey, metadataValue)
-                        else:
-                            if metadataKey == "datecreated":
-                                metadataValue = datetime.date.fromisoformat(
-                                    metadataValue)
-                            self.setMetadataAttribute(metadataKey, metadataValue)
-                    else:
-                        currentlyReadingMetadata = False
-                else:
-                    self.addRecord(row)
+        while True:
+            position = f.tell()
+            line = f.readline()
+            # Metadata values containing a delimiter are quoted by the CSV writer.
+            if not (line.startswith('#') or line.startswith('|#')):
+                break
+            if not readMetadata:
+                continue
+            row = next(csv.reader([line], delimiter=',', quotechar='|'))
+            metadataKey, metadataValue = readMetadataFromFile(row[0])
+            if metadataKey == "names" or metadataKey == "datatypes":
+                # TODO: Parse names and datatypes, which are lists delimited
+                # by semicolons.
+                metadataValue = metadataValue.split(sep=';')
+                self.setMetadataAttribute(metadataKey, metadataValue)
+            else:
+                if metadataKey == "datecreated":
+                    metadataValue = datetime.date.fromisoformat(
+                        metadataValue)
+                self.setMetadataAttribute(metadataKey, metadataValue)
+        f.seek(position)
+
+    def _readDataFrameFromFile(self, columns, applyDatatypes):
+        """
+        Builds a DataFrame straight from the file with pandas' vectorized CSV parser,
+        without going through lists of records. Only the requested columns are parsed.
+        If applyDatatypes is True, numeric columns are parsed with their declared types;
+        otherwise every value is read as the string that was written. Returns None if the
+        records don't match the column names in the metadata.
+        """
+        names = self.getColumnNames()
+        if columns is None:
+            columns = names
+        if not set(columns).issubset(names):
+            return None
+        parsedTypes = {"int": "int64", "float": "float64"}
+        declaredTypes = dict(zip(names, self.getColumnDatatypes()))
+        usecols = [names.index(column) for column in columns]
 
-    def writeToFile(self):
+        with open(self.getFilePath(), 'r', newline='\n') as f:
+            self._readMetadataBlock(f, readMetadata=False)
+            position = f.tell()
+            firstLine = f.readline()
+            if len(firstLine.strip()) == 0:
+                return None
+            if len(next(csv.reader([firstLine], delimiter=',', quotechar='|'))) != len(names):
+                return None
+
+            frame = None
+            for useDeclaredTypes in [True, False] if applyDatatypes else [False]:
+                dtype = {index: parsedTypes.get(declaredTypes.get(names[index]), object)
+                         if useDeclaredTypes else object for index in usecols}
+                f.seek(position)
+                try:
+                    frame = pd.read_csv(f, sep=',', quotechar='|', header=None, dtype=dtype,
+                                        na_filter=False, skip_blank_lines=True,
+                                        usecols=usecols, engine='c')
+                    break
+                except (ValueError, pd.errors.ParserError):
+                    # Either a value doesn't match its declared type (we'll fall back to
+                    # strings) or rows have different numbers of values.
+                    frame = None
+        if frame is None or frame.isna().any().any():
+            # Rows that were shorter than the first one were padded.
+            return None
+        frame.columns = [names[index] for index in frame.columns]
+        return frame[columns]
+
+    def _createCSVWriter(self, f):
+        return csv.writer(
+            f,
+            delimiter=',',
+            quotechar='|',
+            quoting=csv.QUOTE_MINIMAL)
+
+    def _writeMetadata(self, csvwriter):
         def writeMetadataFieldToFile(csvwriter, key, value):
             csvwriter.writerow(["#{key} {value}".format(key=key, value=value)])
-        with open(self.getFilePath(), 'w', newline='\n') as f:
-            csvwriter = csv.writer(
-                f,
-                delimiter=',',
-                quotechar='|',
-                quoting=csv.QUOTE_MINIMAL)
-
-            # Expected Metadata for CSV files.
-            executionid = self.getReposcannerExecutionID()
-            creator = self.getCreator()
-            dateCreated = self.getDateCreated()
-            projectID = self.getProjectID()
-            projectName = self.getProjectName()
-            url = self.getURL()
-            names = ";".join(self.getColumnNames())
-            datatypes = ";".join(self.getColumnDatatypes())
-
-            writeMetadataFieldToFile(csvwriter, "executionid", executionid)
-            writeMetadataFieldToFile(csvwriter, "creator", creator)
-            writeMetadataFieldToFile(csvwriter, "datecreated", dateCreated)
-            writeMetadataFieldToFile(csvwriter, "projectid", projectID)
-            writeMetadataFieldToFile(csvwriter, "projectname", projectName)
-            writeMetadataFieldToFile(csvwriter, "url", url)
-            writeMetadataFieldToFile(csvwriter, "names", names)
-            writeMetadataFieldToFile(csvwriter, "datatypes", datatypes)
 
+        # Expected Metadata for CSV files.
+        executionid = self.getReposcannerExecutionID()
+        creator = self.getCreator()
+        dateCreated = self.getDateCreated()
+        projectID = self.getProjectID()
+        projectName = self.getProjectName()
+        url = self.getURL()
+        names = ";".join(self.getColumnNames())
+        datatypes = ";".join(self.getColumnDatatypes())
+
+        writeMetadataFieldToFile(csvwriter, "executionid", executionid)
+        writeMetadataFieldToFile(csvwriter, "creator", creator)
+        writeMetadataFieldToFile(csvwriter, "datecreated", dateCreated)
+        writeMetadataFieldToFile(csvwriter, "projectid", projectID)
+        writeMetadataFieldToFile(csvwriter, "projectname", projectName)
+        writeMetadataFieldToFile(csvwriter, "url", url)
+        writeMetadataFieldToFile(csvwriter, "names", names)
+        writeMetadataFieldToFile(csvwriter, "datatypes", datatypes)
+
+        # Any additional metadata set by the creator of the file (e.g. the
+        # commit a routine last mined up to) is written after the expected fields.
+        expectedKeys = ["executionid", "creator", "datecreated", "projectid",
+                        "projectname", "url", "names", "datatypes"]
+        for key in self.getAttributeKeys():
+            if key not in expectedKeys:
+                writeMetadataFieldToFile(
+                    csvwriter, key, self.getMetadataAttribute(key))
+
+    def writeToFile(self):
+        """
+        Writes the metadata and records out to the file. If a streaming write is in
+        progress, this writes out the remaining records and finishes the file instead.
+        """
+        if self.isStreaming():
+            self._finishStreamingWrite()
+            return
+        self._loadRecordsFromDisk()
+        with open(self.getFilePath(), 'w', newline='\n') as f:
+            csvwriter = self._createCSVWriter(f)
+            self._writeMetadata(csvwriter)
             for record in self._records:
                 csvwriter.writerow(record)
+        self._recordsAreModified = False
+
+
+class AnnotatedParquetData(AnnotatedCSVData):
+    """
+    This data entity class represents a table of records stored in a typed, columnar
+    Apache Parquet file. It offers the same interface as AnnotatedCSVData, and the same
+    metadata is stored in the key-value metadata of the file.
+
+    Columns are stored with the types given by setColumnDatatypes(): "int", "float" and
+    "bool" columns are stored as such, "list" columns (whose values are lists or strings
+    delimited by semicolons) as lists of strings, and everything else as strings. Records
+    returned by getRawRecords() have the same shape as the ones that were added, with list
+    values joined by semicolons. getDataFrame() returns typed columns, and can read just
+    the requested columns from disk without touching the others.
+
+    This class requires the (optional) pyarrow package.
+    """
+
+    def __init__(self, filePath):
+        super().__init__(filePath)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            self.pyarrowIsAvailable = False
+            self.pyarrowImportRef = None
+        else:
+            self.pyarrowIsAvailable = True
+            self.pyarrowImportRef = pyarrow
+
+    def _getPyArrow(self):
+        if not self.pyarrowIsAvailable:
+            raise ImportError(
+                "AnnotatedParquetData requires the pyarrow package, which is not installed.")
+        return self.pyarrowImportRef
+
+    def _getColumnTypes(self):
+        pa = self._getPyArrow()
+        arrowTypes = {"int": pa.int64(), "float": pa.float64(), "bool": pa.bool_(),
+                      "list": pa.list_(pa.string())}
+        datatypes = self.getColumnDatatypes()
+        columnTypes = []
+        for index in range(len(self.getColumnNames())):
+            datatype = datatypes[index] if index < len(datatypes) else "str"
+            columnTypes.append(arrowTypes.get(datatype, pa.string()))
+        return columnTypes
+
+    def _getSchema(self):
+        pa = self._getPyArrow()
+        metadata = {}
+        for key in self.getAttributeKeys():
+            value = self.getMetadataAttribute(key)
+            if value is None:
+                continue
+            if key == "names" or key == "datatypes":
+                value = ";".join(value)
+            metadata["reposcanner:{key}".format(key=key)] = str(value)
+        fields = [pa.field(name, columnType) for name, columnType in
+                  zip(self.getColumnNames(), self._getColumnTypes())]
+        return pa.schema(fields, metadata=metadata)
+
+    def _recordsToTable(self, records):
+        pa = self._getPyArrow()
+
+        def convert(value, columnType):
+            if pa.types.is_list(columnType):
+                if value is None or value == "":
+                    return []
+                return list(value) if isinstance(value, list) else str(value).split(";")
+            if value is None or (value == "" and not pa.types.is_string(columnType)):
+                return None
+            if pa.types.is_integer(columnType):
+                return int(value)
+            elif pa.types.is_floating(columnType):
+                return float(value)
+            elif pa.types.is_boolean(columnType):
+                return value if isinstance(value, bool) else str(value).lower() == "true"
+            else:
+                return str(value)
+
+        schema = self._getSchema()
+        arrays = []
+        for index, field in enumerate(schema):
+            arrays.append(pa.array([convert(record[index], field.type) for record in records],
+                                   type=field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def _tableToRecords(self, table):
+        pa = self._getPyArrow()
+        columns = []
+        for field, column in zip(table.schema, table.columns):
+            values = column.to_pylist()
+            if pa.types.is_list(field.type):
+                values = [";".join(value) if value is not None else "" for value in values]
+            columns.append(values)
+        return [list(record) for record in zip(*columns)]
+
+    def getDataFrame(self, firstRowContainsHeaders=False, columns=None,
+                     applyDatatypes=False):
+        """
+        Returns file data in the form of a typed pandas DataFrame. List columns hold lists
+        of strings.
+
+        firstRowContainsHeaders: Column names are always stored in the metadata of Parquet
+        files. If True, the records are treated as in AnnotatedCSVData.getDataFrame().
+        columns: A list of the names of the columns to include (default all of them). If the
+        records have not been loaded, only these columns are read from disk.
+        applyDatatypes: If True, string columns with few distinct values become
+        categoricals, as in AnnotatedCSVData.getDataFrame() (default False). The other
+        columns are typed by the file itself.
+        """
+        return super().getDataFrame(firstRowContainsHeaders=firstRowContainsHeaders,
+                                    columns=columns, applyDatatypes=applyDatatypes)
+
+    def _buildDataFrame(self, firstRowContainsHeaders, columns, applyDatatypes):
+        if firstRowContainsHeaders:
+            return super()._buildDataFrame(firstRowContainsHeaders, columns, applyDatatypes)
+        if self._recordsAreOnDisk:
+            table = self._getPyArrow().parquet.read_table(self.getFilePath(), columns=columns)
+        else:
+            table = self._recordsToTable(self._records)
+            if columns is not None:
+                table = table.select(columns)
+        frame = table.to_pandas()
+        for field in table.schema:
+            if self._getPyArrow().types.is_list(field.type):
+                frame[field.name] = frame[field.name].map(list)
+        if applyDatatypes:
+            frame = self._applyDatatypes(frame)
+        return frame
+
+    def _readFile(self, readRecords, readMetadata):
+        parquet = self._getPyArrow().parquet
+        if readMetadata:
+            metadata = parquet.read_schema(self.getFilePath()).metadata or {}
+            for key, value in metadata.items():
+                key = key.decode()
+                if not key.startswith("reposcanner:"):
+                    continue
+                key = key[len("reposcanner:"):]
+                value = value.decode()
+                if key == "names" or key == "datatypes":
+                    value = value.split(sep=';') if len(value) > 0 else []
+                elif key == "datecreated":
+                    value = datetime.date.fromisoformat(value)
+                self.setMetadataAttribute(key, value)
+        if readRecords:
+            self._records.extend(self._tableToRecords(parquet.read_table(self.getFilePath())))
+
+    def _openStream(self, path):
+        self._streamFile = None
+        self._streamWriter = self._getPyArrow().parquet.ParquetWriter(path, self._getSchema())
+
+    def _writeRecordsToStream(self, records):
+        if len(records) > 0:
+            self._streamWriter.write_table(self._recordsToTable(records))
+
+    def _closeStream(self):
+        self._streamWriter.close()
+        self._streamWriter = None
+
+    def writeToFile(self):
+        """
+        Writes the metadata and records out to the file. If a streaming write is in
+        progress, this writes out the remaining records and finishes the file instead.
+        """
+        if self.isStreaming():
+            self._finishStreamingWrite()
+            return
+        self._loadRecordsFromDisk()
+        self._getPyArrow().parquet.write_table(
+            self._recordsToTable(self._records), self.getFilePath())
+        self._recordsAreModified = False
@@ -6,7 +6,7 @@ from reposcanner.analyses import DataAnalysis
 from reposcanner.requests import OfflineRoutineRequest, OnlineRoutineRequest, AnalysisRequestModel
 from reposcanner.response import ResponseFactory
 from reposcanner.provenance import ReposcannerRunInformant
-from reposcanner.data import DataEntityFactory
+from reposcanner.data import DataEntityFactory, DataCriteria
 import datetime
 
 
@@ -102,19 +102,18 @@ class DummyOnlineRoutine(OnlineRepositoryRoutine):
 
 
 class DummyAnalysisRequest(AnalysisRequestModel):
-    def criteriaFunction(self, entity):
+    def getDataDependencies(self):
+        return ["DummyOfflineRoutine", "DummyOnlineRoutine"]
+
+    def getDataCriteria(self):
         """
         The DummyAnalysisRequest attempts to fetch all data from the data store which
         was created by a DummyOfflineRoutine or a DummyOnlineRoutine.
         """
-        try:
-            creator = entity.getCreator()
-            if creator == "DummyOfflineRoutine" or creator == "DummyOnlineRoutine":
-                return True
-            else:
-                return False
-        except AttributeError as e:
-            return False
+        return DataCriteria(creator=["DummyOfflineRoutine", "DummyOnlineRoutine"])
+
+    def criteriaFunction(self, entity):
+        return self.getDataCriteria()(entity)
 
 
 class DummyAnalysis(DataAnalysis):
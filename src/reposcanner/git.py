@@ -1,9 +1,17 @@
 from enum import Enum, auto
 import re
-import urllib3
+import hashlib
+import json
+import os
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from urllib.parse import urlparse
 
+import requests
 import github as pygithub
+from github.Requester import HTTPSRequestsConnectionClass
 import gitlab as pygitlab
 import bitbucket as pybitbucket
 import pygit2
@@ -44,6 +52,58 @@ class VCSAPISessionCreator(ABC):
     to version control system API libraries to establish
     sessions with those services.
     """
+
+    def __init__(self):
+        self._responseCache = None
+        self._clientPool = None
+
+    def setResponseCache(self, responseCache):
+        """
+        responseCache: An HTTPResponseCache object through which sessions send their
+        requests, or None to send them directly.
+        """
+        self._responseCache = responseCache
+
+    def getResponseCache(self):
+        return self._responseCache
+
+    def setClientPool(self, clientPool):
+        """
+        clientPool: A VCSAPIClientPool object from which sessions borrow their API clients,
+        or None to create a new client for every session.
+        """
+        self._clientPool = clientPool
+
+    def getClientPool(self):
+        return self._clientPool
+
+    def release(self, session):
+        """
+        Called once a session returned by connect() is no longer used, so that the client
+        it was created with can be reused by later sessions.
+        """
+        if self._clientPool is not None:
+            self._clientPool.release(session)
+
+    def _openSession(self, key, createClient, openSession):
+        """
+        Returns the session opened by calling openSession(client) with a client borrowed
+        from the client pool (or created with createClient(), if there is no pool). The
+        client is lent to the session until release() is called.
+
+        key: The key of the client in the pool (see VCSAPIClientPool.getKey()).
+        """
+        if self._clientPool is None:
+            return openSession(createClient())
+        client = self._clientPool.acquire(key, createClient)
+        try:
+            session = openSession(client)
+        except BaseException:
+            self._clientPool.checkIn(key, client)
+            raise
+        self._clientPool.lend(session, key, client)
+        return session
+
     @abstractmethod
     def canHandleRepository(self, repositoryLocation):
         """
@@ -72,8 +132,19 @@ class VCSAPISessionCompositeCreator(VCSAPISessionCreator):
     """
 
     def __init__(self):
+        super().__init__()
         self._children = []
 
+    def setResponseCache(self, responseCache):
+        super().setResponseCache(responseCache)
+        for child in self._children:
+            child.setResponseCache(responseCache)
+
+    def setClientPool(self, clientPool):
+        super().setClientPool(clientPool)
+        for child in self._children:
+            child.setClientPool(clientPool)
+
     def addChild(self, child):
         self._children.append(child)
 
@@ -98,6 +169,547 @@ class VCSAPISessionCompositeCreator(VCSAPISessionCreator):
                 return child.connect(repositoryLocation, credentials)
 
 
+class HTTPResponseCache:
+    """
+    An on-disk cache of the responses to HTTP GET requests made to version control platform
+    APIs. Cached responses are revalidated with conditional requests (If-None-Match and
+    If-Modified-Since), so a page that hasn't changed comes back as a bodyless 304 response,
+    which GitHub doesn't count against the rate limit. When the cache grows beyond its
+    maximum size, the least recently used responses are evicted.
+    """
+
+    DEFAULTMAXIMUMSIZE = 512 * 1024 * 1024
+
+    def __init__(self, cacheDirectory, maximumSize=DEFAULTMAXIMUMSIZE):
+        """
+        cacheDirectory: The directory in which responses are stored. It is created if needed.
+        maximumSize: The number of bytes cached responses may use on disk.
+        """
+        self._cacheDirectory = cacheDirectory
+        self._maximumSize = maximumSize
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        os.makedirs(cacheDirectory, exist_ok=True)
+        self._entries = OrderedDict()
+        self._size = 0
+        entries = []
+        for fileName in os.listdir(cacheDirectory):
+            if fileName.endswith(".json"):
+                key = fileName[:-len(".json")]
+                try:
+                    entries.append((os.path.getmtime(self._getMetadataPath(key)), key,
+                                    self._getEntrySize(key)))
+                except OSError:
+                    continue
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._size += size
+        with self._lock:
+            self._evict()
+
+    def getCacheDirectory(self):
+        return self._cacheDirectory
+
+    def getMaximumSize(self):
+        return self._maximumSize
+
+    def getSize(self):
+        """Returns the number of bytes used by cached responses."""
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def getHits(self):
+        """Returns the number of requests answered from the cache after revalidation."""
+        return self._hits
+
+    def getMisses(self):
+        """Returns the number of GET requests whose response had to be downloaded."""
+        return self._misses
+
+    def getEvictions(self):
+        return self._evictions
+
+    def _getMetadataPath(self, key):
+        return os.path.join(self._cacheDirectory, key + ".json")
+
+    def _getContentPath(self, key):
+        return os.path.join(self._cacheDirectory, key + ".body")
+
+    def _getEntrySize(self, key):
+        return os.path.getsize(self._getMetadataPath(key)) + \
+            os.path.getsize(self._getContentPath(key))
+
+    def getKey(self, request):
+        """
+        Returns the key under which the response to a request is cached. Responses depend
+        on the credentials used, so these are part of the key (only as a digest).
+
+        request: A requests.PreparedRequest object.
+        """
+        description = [request.method, request.url, request.headers.get("Accept"),
+                       request.headers.get("Authorization"), request.headers.get("PRIVATE-TOKEN")]
+        return hashlib.sha256(json.dumps(description).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns a tuple of the metadata (a dictionary with the status, reason, headers and
+        encoding of the response) and the content cached under the key, or None.
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            try:
+                with open(self._getMetadataPath(key), 'r') as metadataFile:
+                    metadata = json.load(metadataFile)
+                with open(self._getContentPath(key), 'rb') as contentFile:
+                    content = contentFile.read()
+                os.utime(self._getMetadataPath(key))
+            except (OSError, ValueError):
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return metadata, content
+
+    def put(self, key, response):
+        """
+        Store a response under the key. Responses larger than the cache are not stored.
+
+        response: A requests.Response object whose content has been read.
+        """
+        metadata = {"status": response.status_code, "reason": response.reason,
+                    "headers": dict(response.headers), "encoding": response.encoding}
+        content = response.content
+        with self._lock:
+            if len(content) > self._maximumSize:
+                return
+            self._remove(key)
+            try:
+                # Write to temporary files first so that a partially written entry is
+                # never read back.
+                for path, data, mode in [(self._getContentPath(key), content, 'wb'),
+                                         (self._getMetadataPath(key), json.dumps(metadata), 'w')]:
+                    with open(path + ".tmp", mode) as entryFile:
+                        entryFile.write(data)
+                    os.replace(path + ".tmp", path)
+                size = self._getEntrySize(key)
+            except OSError:
+                self._remove(key)
+                return
+            self._entries[key] = size
+            self._size += size
+            self._evict()
+
+    def _remove(self, key):
+        self._size -= self._entries.pop(key, 0)
+        for path in [self._getMetadataPath(key), self._getContentPath(key)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        while self._size > self._maximumSize and len(self._entries) > 0:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self._evictions += 1
+
+    def recordHit(self):
+        with self._lock:
+            self._hits += 1
+
+    def recordMiss(self):
+        with self._lock:
+            self._misses += 1
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+
+class CachingHTTPAdapter(requests.adapters.HTTPAdapter):
+    """
+    A requests transport adapter that sends GET requests through an HTTPResponseCache.
+    Requests for cached responses are made conditional, and a 304 response is replaced
+    by the cached response (with the headers of the 304 response, e.g. the current rate
+    limits, applied to it), so the API libraries never see the difference.
+    """
+
+    def __init__(self, responseCache, **kwargs):
+        super().__init__(**kwargs)
+        self._responseCache = responseCache
+
+    def getResponseCache(self):
+        return self._responseCache
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != "GET" or stream:
+            return super().send(request, stream=stream, **kwargs)
+
+        key = self._responseCache.getKey(request)
+        cachedEntry = self._responseCache.get(key)
+        if cachedEntry is not None:
+            cachedHeaders = cachedEntry[0]["headers"]
+            if "ETag" in cachedHeaders:
+                request.headers["If-None-Match"] = cachedHeaders["ETag"]
+            if "Last-Modified" in cachedHeaders:
+                request.headers["If-Modified-Since"] = cachedHeaders["Last-Modified"]
+
+        response = super().send(request, stream=stream, **kwargs)
+        if response.status_code == 304 and cachedEntry is not None:
+            self._responseCache.recordHit()
+            return self._buildCachedResponse(request, response, *cachedEntry)
+
+        self._responseCache.recordMiss()
+        if response.status_code == 200 and \
+                ("ETag" in response.headers or "Last-Modified" in response.headers):
+            self._responseCache.put(key, response)
+        return response
+
+    def _buildCachedResponse(self, request, notModifiedResponse, metadata, content):
+        response = requests.Response()
+        response.status_code = metadata["status"]
+        response.reason = metadata["reason"]
+        response.headers = requests.structures.CaseInsensitiveDict(metadata["headers"])
+        for header, value in notModifiedResponse.headers.items():
+            if header.lower() not in ["content-length", "content-type", "transfer-encoding"]:
+                response.headers[header] = value
+        response.encoding = metadata["encoding"]
+        response._content = content
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = notModifiedResponse.elapsed
+        notModifiedResponse.close()
+        return response
+
+
+class GitHubHTTPSConnection(HTTPSRequestsConnectionClass):
+    """
+    The HTTPS connection PyGithub uses, with its requests session registered with a
+    VCSAPIClientPool, if one is given (so the connections it opens are counted) and, if a
+    response cache is given, sending requests through a CachingHTTPAdapter. If the key of a token is given
+    (see GitHubRateLimitGovernor.getTokenKey()), every request waits for the permission of
+    the GitHubRateLimitGovernor, which is then told the quota reported by the response.
+    """
+
+    def __init__(self, host, responseCache=None, tokenKey=None, clientPool=None, **kwargs):
+        super().__init__(host, **kwargs)
+        self._tokenKey = tokenKey
+        if responseCache is not None:
+            self.adapter = CachingHTTPAdapter(responseCache,
+                                              max_retries=self.retry,
+                                              pool_connections=self.pool_size,
+                                              pool_maxsize=self.pool_size)
+            self.session.mount("https://", self.adapter)
+        if clientPool is not None:
+            clientPool.registerHTTPSession(self.session)
+
+    def getresponse(self):
+        if self._tokenKey is None:
+            return super().getresponse()
+        governor = GitHubRateLimitGovernor()
+        resource = GitHubRateLimitGovernor.getResource(self.url)
+        governor.acquire(self._tokenKey, resource)
+        response = super().getresponse()
+        governor.observeHeaders(self._tokenKey, resource, dict(response.getheaders()))
+        return response
+
+
+class VCSAPIClientPool:
+    """
+    A pool of the authenticated API clients (pygithub.Github and gitlab.Gitlab objects)
+    built by the session creators, keyed by platform, host and credentials. A client is
+    lent to one task at a time, as the clients are not thread-safe, and returns to the pool
+    when the session created with it is released. Later tasks with the same key then reuse
+    the client and its keep-alive HTTP connections, instead of opening new connections
+    (with a new TLS handshake) for every repository and routine.
+
+    The pool counts the clients it creates and reuses, and the connections their HTTP
+    sessions open. Disabling the pool (setEnabled(False)) makes every session use a new
+    client, as before, which is useful to compare the number of connections opened.
+
+    A pool belongs to the ReposcannerManager of a run, which hands it to the session
+    creators of its online routines (see VCSAPISessionCreator.setClientPool()).
+    """
+
+    def __init__(self):
+        self._enabled = True
+        self._idleClients = {}
+        self._lentClients = {}
+        self._httpSessions = []
+        self._clientsCreated = 0
+        self._clientsReused = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def getKey(platform, host, credentials, responseCache=None):
+        """
+        Returns the key of the clients for a host and credentials. Credentials are only
+        part of the key as a digest.
+
+        platform: A RepositoryLocation.VersionControlPlatform value.
+        host: The host name of the API.
+        credentials: A VersionControlPlatformCredentials object.
+        responseCache: The HTTPResponseCache the clients send their requests through, if any.
+        """
+        secret = json.dumps([credentials.getUsername(), credentials.getPassword(),
+                             credentials.getToken()])
+        return (platform, host, hashlib.sha256(secret.encode("utf-8")).hexdigest(),
+                id(responseCache) if responseCache is not None else None)
+
+    def isEnabled(self):
+        return self._enabled
+
+    def setEnabled(self, enabled):
+        with self._lock:
+            self._enabled = enabled
+            if not enabled:
+                self._idleClients = {}
+
+    def acquire(self, key, createClient):
+        """
+        Returns an idle client with the given key, or a new one built by calling
+        createClient(). The client must be given back with lend() or checkIn().
+        """
+        with self._lock:
+            idleClients = self._idleClients.get(key, [])
+            if len(idleClients) > 0:
+                self._clientsReused += 1
+                return idleClients.pop()
+            self._clientsCreated += 1
+        return createClient()
+
+    def checkIn(self, key, client):
+        """
+        Return a client to the pool, so that later sessions with the same key can use it.
+        """
+        with self._lock:
+            if self._enabled:
+                self._idleClients.setdefault(key, []).append(client)
+
+    def lend(self, session, key, client):
+        """
+        Record that a session (e.g. a repository object) was created with a client, which
+        returns to the pool when the session is released.
+        """
+        with self._lock:
+            self._lentClients[id(session)] = (session, key, client)
+
+    def release(self, session):
+        """
+        Return the client a session was created with to the pool. Sessions that were not
+        created with a pooled client are ignored.
+        """
+        with self._lock:
+            entry = self._lentClients.pop(id(session), None)
+        if entry is not None:
+            _, key, client = entry
+            self.checkIn(key, client)
+
+    def registerHTTPSession(self, httpSession):
+        """
+        Count the connections opened by a requests.Session used by a client.
+        """
+        with self._lock:
+            self._httpSessions.append(httpSession)
+
+    def getConnectionCount(self):
+        """
+        Returns the number of HTTP connections (and so TLS handshakes, for HTTPS) opened by
+        the registered HTTP sessions.
+        """
+        with self._lock:
+            httpSessions = list(self._httpSessions)
+        connections = 0
+        for httpSession in httpSessions:
+            for adapter in httpSession.adapters.values():
+                for key in adapter.poolmanager.pools.keys():
+                    connectionPool = adapter.poolmanager.pools.get(key)
+                    if connectionPool is not None:
+                        connections += connectionPool.num_connections
+        return connections
+
+    def getMetrics(self):
+        """
+        Returns a dictionary with the number of clients created and reused and the number of
+        connections opened.
+        """
+        return {"clientsCreated": self._clientsCreated,
+                "clientsReused": self._clientsReused,
+                "connections": self.getConnectionCount()}
+
+    def clear(self):
+        with self._lock:
+            self._idleClients = {}
+            self._lentClients = {}
+            self._httpSessions = []
+            self._clientsCreated = 0
+            self._clientsReused = 0
+
+
+class GitHubRateLimitGovernor:
+    """
+    Keeps track of the GitHub API quota of each token, as reported by the x-ratelimit-*
+    headers of its responses, and makes the sessions that share a token wait before they
+    exhaust it. GitHub gives each token a separate quota for each resource (core, search,
+    graphql, ...), named by the x-ratelimit-resource header, so the quota of each token
+    and resource is tracked separately and each request is paced against the quota of its
+    own resource. Once less than a fifth of a quota remains, its requests are spread evenly
+    over the time left until the quota resets, and a small reserve is never spent. The
+    governor also keeps metrics on how each quota was used.
+
+    Like the DataFrameCache, the state of the governor is shared by all of its instances,
+    so every session that uses a token is governed together.
+    """
+
+    # Class variables shared by every instance of the governor.
+    _quotas = {}
+    _condition = threading.Condition()
+    _reserve = 50
+    _pacingThreshold = 0.2
+
+    @staticmethod
+    def getTokenKey(token):
+        """
+        Returns the name under which a token's quota is tracked. Tokens themselves are
+        never stored by the governor.
+        """
+        return "token:{digest}".format(digest=hashlib.sha256(token.encode("utf-8")).hexdigest()[:12])
+
+    @staticmethod
+    def getResource(url):
+        """
+        Returns the name of the quota (the x-ratelimit-resource GitHub will report) that a
+        request to a URL counts against.
+        """
+        path = urlparse(url).path.rstrip("/")
+        if path.endswith("/graphql"):
+            return "graphql"
+        elif "/search/code" in path:
+            return "code_search"
+        elif "/search/" in path:
+            return "search"
+        else:
+            return "core"
+
+    def getReserve(self):
+        return GitHubRateLimitGovernor._reserve
+
+    def setReserve(self, reserve):
+        """
+        reserve: The number of requests of each quota that are never spent.
+        """
+        with GitHubRateLimitGovernor._condition:
+            GitHubRateLimitGovernor._reserve = reserve
+            GitHubRateLimitGovernor._condition.notify_all()
+
+    def _getState(self, tokenKey, resource):
+        if (tokenKey, resource) not in GitHubRateLimitGovernor._quotas:
+            GitHubRateLimitGovernor._quotas[(tokenKey, resource)] = {
+                "remaining": None, "limit": None, "resetTime": None, "requests": 0,
+                "pauses": 0, "secondsPaused": 0.0, "lastRequestTime": 0.0}
+        return GitHubRateLimitGovernor._quotas[(tokenKey, resource)]
+
+    def _getDelay(self, state, now):
+        if state["remaining"] is None:
+            return 0
+        if now >= state["resetTime"]:
+            # The quota has been reset. The next response will tell us how much is left.
+            state["remaining"] = None
+            return 0
+        available = state["remaining"] - GitHubRateLimitGovernor._reserve
+        if available <= 0:
+            return state["resetTime"] - now
+        if state["remaining"] < state["limit"] * GitHubRateLimitGovernor._pacingThreshold:
+            interval = (state["resetTime"] - now) / available
+            return state["lastRequestTime"] + interval - now
+        return 0
+
+    def acquire(self, tokenKey, resource="core"):
+        """
+        Blocks until a request may be made with the token, then counts it against the
+        token's quota for the given resource.
+        """
+        with GitHubRateLimitGovernor._condition:
+            state = self._getState(tokenKey, resource)
+            paused = False
+            delay = self._getDelay(state, time.time())
+            while delay > 0:
+                if not paused:
+                    state["pauses"] += 1
+                    paused = True
+                start = time.time()
+                GitHubRateLimitGovernor._condition.wait(timeout=delay)
+                state["secondsPaused"] += time.time() - start
+                delay = self._getDelay(state, time.time())
+            state["requests"] += 1
+            if state["remaining"] is not None:
+                state["remaining"] -= 1
+            state["lastRequestTime"] = time.time()
+
+    def observe(self, tokenKey, remaining, limit, resetTime, resource="core"):
+        """
+        Record the quota reported by GitHub in response to a request made with the token.
+
+        remaining: The value of the x-ratelimit-remaining header.
+        limit: The value of the x-ratelimit-limit header.
+        resetTime: The value of the x-ratelimit-reset header (seconds since the epoch).
+        resource: The value of the x-ratelimit-resource header.
+        """
+        with GitHubRateLimitGovernor._condition:
+            state = self._getState(tokenKey, resource)
+            if state["resetTime"] is None or state["remaining"] is None or \
+                    resetTime > state["resetTime"]:
+                state["remaining"] = remaining
+            elif resetTime == state["resetTime"]:
+                # Responses to concurrent requests can arrive out of order.
+                state["remaining"] = min(state["remaining"], remaining)
+            else:
+                return
+            state["limit"] = limit
+            state["resetTime"] = resetTime
+            GitHubRateLimitGovernor._condition.notify_all()
+
+    def observeHeaders(self, tokenKey, resource, headers):
+        """
+        Record the quota reported by the headers of a response to a request made with the
+        token. Responses without x-ratelimit-* headers are ignored.
+
+        resource: The resource the request was counted against by acquire(). The
+            x-ratelimit-resource header, if present, takes precedence.
+        headers: A dictionary of the headers of the response.
+        """
+        headers = {header.lower(): value for header, value in headers.items()}
+        if not all(header in headers for header in
+                   ["x-ratelimit-remaining", "x-ratelimit-limit", "x-ratelimit-reset"]):
+            return
+        self.observe(tokenKey,
+                     int(float(headers["x-ratelimit-remaining"])),
+                     int(float(headers["x-ratelimit-limit"])),
+                     int(float(headers["x-ratelimit-reset"])),
+                     headers.get("x-ratelimit-resource", resource))
+
+    def getMetrics(self):
+        """
+        Returns a dictionary mapping each (token key, resource) pair (see getTokenKey())
+        to a dictionary describing the use of that quota: the number of requests made, the
+        remaining quota and its limit, when it resets, and how many times and for how
+        many seconds requests were paused.
+        """
+        with GitHubRateLimitGovernor._condition:
+            return {quotaKey: {key: value for key, value in state.items() if key != "lastRequestTime"}
+                    for quotaKey, state in GitHubRateLimitGovernor._quotas.items()}
+
+    def clear(self):
+        with GitHubRateLimitGovernor._condition:
+            GitHubRateLimitGovernor._quotas = {}
+
+
 class GitHubAPISessionCreator(VCSAPISessionCreator):
 
     def canHandleRepository(self, repositoryLocation):
@@ -106,30 +718,63 @@ class GitHubAPISessionCreator(VCSAPISessionCreator):
 
     def connect(self, repositoryLocation, credentials):
         # These status codes are caused by random GitHub errors which should
-        # trigger a retry.
-        status_forcelist = (500, 502, 504)
+        # trigger a retry. GithubRetry also retries (after waiting) when GitHub
+        # responds that a rate limit was exceeded.
+        status_forcelist = [500, 502, 504]
         totalAllowedRetries = 3
         allowedReadErrorRetries = 3
         allowedConnectionErrorRetries = 3
-        retryHandler = urllib3.Retry(total=totalAllowedRetries,
-                                     read=allowedReadErrorRetries,
-                                     connect=allowedConnectionErrorRetries,
-                                     status_forcelist=status_forcelist)
+        retryHandler = pygithub.GithubRetry(total=totalAllowedRetries,
+                                            read=allowedReadErrorRetries,
+                                            connect=allowedConnectionErrorRetries,
+                                            status_forcelist=status_forcelist)
 
         if credentials.hasUsernameAndPasswordAvailable():
-            session = pygithub.Github(
-                credentials.getUsername(),
-                credentials.getPassword(),
-                retry=retryHandler)
+            auth = pygithub.Auth.Login(credentials.getUsername(), credentials.getPassword())
         elif credentials.hasTokenAvailable():
-            session = pygithub.Github(credentials.getToken(), retry=retryHandler)
+            auth = pygithub.Auth.Token(credentials.getToken())
         else:
             raise RuntimeError(
                 "GitHubAPISessionCreator received a VersionControlPlatformCredentials object"
                 "with no username/password or token in it.")
 
-        repository = session.get_repo(repositoryLocation.getCanonicalName())
-        return repository
+        def createClient():
+            session = pygithub.Github(auth=auth, retry=retryHandler)
+            self._useConnectionClass(session)
+            return session
+
+        key = VCSAPIClientPool.getKey(RepositoryLocation.VersionControlPlatform.GITHUB,
+                                      urlparse(pygithub.Consts.DEFAULT_BASE_URL).netloc,
+                                      credentials, self._responseCache)
+        return self._openSession(
+            key, createClient,
+            lambda session: session.get_repo(repositoryLocation.getCanonicalName()))
+
+    def _useConnectionClass(self, session):
+        """
+        Make a PyGithub session open GitHubHTTPSConnections, which count the connections
+        they open, pass requests made with a token through the GitHubRateLimitGovernor and
+        send requests through the response cache (if any). PyGithub doesn't
+        let us pass it an HTTP session, and its Requester.injectConnectionClasses() hook
+        applies to every session at once, so we replace the class of the connection this
+        session's requester opens (lazily, on the first request) instead. That attribute is
+        private to PyGithub, so setup.cfg limits PyGithub to the major version it was
+        checked against, and we check that it is still there.
+        """
+        if not hasattr(session.requester, "_Requester__connectionClass"):
+            raise RuntimeError(
+                "GitHubAPISessionCreator does not support the installed version of PyGithub, "
+                "whose requester has no connection class to replace.")
+        responseCache = self._responseCache
+        clientPool = self._clientPool
+        tokenKey = None
+        if isinstance(session.requester.auth, pygithub.Auth.Token):
+            tokenKey = GitHubRateLimitGovernor.getTokenKey(session.requester.auth.token)
+
+        def createConnection(host, port=None, **kwargs):
+            return GitHubHTTPSConnection(host, responseCache, tokenKey, clientPool,
+                                         port=port, **kwargs)
+        session.requester._Requester__connectionClass = createConnection
 
 
 class GitlabAPISessionCreator(VCSAPISessionCreator):
@@ -138,11 +783,32 @@ class GitlabAPISessionCreator(VCSAPISessionCreator):
         return repositoryLocation.getVersionControlPlatform(
         ) == RepositoryLocation.VersionControlPlatform.GITLAB
 
+    @staticmethod
+    def getBaseURL(repositoryLocation):
+        """
+        Returns the URL of the GitLab instance that hosts a repository.
+        """
+        url = repositoryLocation.getURL()
+        if "://" not in url:
+            url = "https://" + url
+        parsedURL = urlparse(url)
+        return "{scheme}://{host}".format(scheme=parsedURL.scheme, host=parsedURL.netloc)
+
     def connect(self, repositoryLocation, credentials):
         if credentials.hasTokenAvailable():
-            session = pygitlab.Gitlab(
-                repositoryLocation.getURL(),
-                private_token=credentials.getToken())
+            baseURL = GitlabAPISessionCreator.getBaseURL(repositoryLocation)
+
+            def createClient():
+                httpSession = requests.Session()
+                if self._responseCache is not None:
+                    httpSession.mount("https://", CachingHTTPAdapter(self._responseCache))
+                    httpSession.mount("http://", CachingHTTPAdapter(self._responseCache))
+                if self._clientPool is not None:
+                    self._clientPool.registerHTTPSession(httpSession)
+                return pygitlab.Gitlab(
+                    baseURL,
+                    private_token=credentials.getToken(),
+                    session=httpSession)
         elif credentials.hasUsernameAndPasswordAvailable():
             raise RuntimeError(
                 "The /session API endpoint used for username/password authentication"
@@ -153,8 +819,159 @@ class GitlabAPISessionCreator(VCSAPISessionCreator):
                 "GitlabAPISessionCreator received a VersionControlPlatformCredentials object"
                 "with no username/password or token in it.")
 
-        repository = session.projects.get(repositoryLocation.getCanonicalName())
-        return repository
+        key = VCSAPIClientPool.getKey(RepositoryLocation.VersionControlPlatform.GITLAB,
+                                      urlparse(baseURL).netloc, credentials, self._responseCache)
+        return self._openSession(
+            key, createClient,
+            lambda session: session.projects.get(repositoryLocation.getCanonicalName()))
+
+
+class GitlabEmailIndex:
+    """
+    An index mapping the email addresses of the users of a GitLab instance to their
+    usernames. The index is built with paged listings of the users of the instance (100 per
+    request) rather than one request per user, and is shared by every task that talks to
+    that instance with the same credentials during the run. If an index directory is given,
+    the index is also written there and reused by later runs until it is older than its
+    time to live.
+
+    Which addresses the listing includes depends on the token used: the public and commit
+    emails of every user, and the primary email too when an administrator's token is used.
+    Indexes are therefore kept per host and credentials, so that an index built with one
+    token is never used with (or overwritten by) another. Secondary email addresses are
+    not part of the listing; they can be included on request, at the cost of one more
+    request per user.
+
+    Like the DataFrameCache, the indexes built so far are shared by all instances of this
+    class.
+    """
+
+    DEFAULTTTL = 24 * 60 * 60
+    USERSPERPAGE = 100
+    EMAILFIELDS = ["email", "public_email", "commit_email"]
+
+    # Class variables shared by every instance of the index.
+    _indexes = {}
+    _indexLocks = {}
+    _lock = threading.Lock()
+
+    def __init__(self, indexDirectory=None, ttl=DEFAULTTTL, listSecondaryEmails=False):
+        """
+        indexDirectory: The directory in which indexes are kept between runs, or None to
+        keep them in memory only.
+        ttl: The number of seconds after which an index is built again.
+        listSecondaryEmails: If True, the secondary email addresses of each user are listed
+        too, which costs one request per user (and needs an administrator's token).
+        """
+        self._indexDirectory = indexDirectory
+        self._ttl = ttl
+        self._listSecondaryEmails = listSecondaryEmails
+
+    @staticmethod
+    def getHost(session):
+        """
+        Returns the host of the GitLab instance a python-gitlab client talks to.
+        """
+        return urlparse(session.url).netloc
+
+    @staticmethod
+    def getKey(session, listSecondaryEmails=False):
+        """
+        Returns the name of the index of a python-gitlab client: the host it talks to and
+        a digest of the credentials it uses. Credentials themselves are never stored.
+        Indexes that include secondary email addresses are named separately.
+        """
+        secret = "\n".join(str(token) for token in
+                           [session.private_token, session.oauth_token, session.job_token])
+        return "{host}_{digest}{suffix}".format(
+            host=re.sub(r'[^\w.-]', '_', GitlabEmailIndex.getHost(session)),
+            digest=hashlib.sha256(secret.encode("utf-8")).hexdigest()[:12],
+            suffix="_secondary" if listSecondaryEmails else "")
+
+    def isListingSecondaryEmails(self):
+        return self._listSecondaryEmails
+
+    def getIndexDirectory(self):
+        return self._indexDirectory
+
+    def getTTL(self):
+        return self._ttl
+
+    def _getIndexPath(self, key):
+        fileName = "{key}_gitlabEmailIndex.json".format(key=key)
+        return os.path.join(self._indexDirectory, fileName)
+
+    def _isFresh(self, entry):
+        return entry is not None and time.time() - entry["created"] < self._ttl
+
+    def getIndex(self, session):
+        """
+        Returns a dictionary mapping (lowercase) email addresses to usernames for the host
+        and credentials of a python-gitlab client, building the index if there is no fresh
+        one.
+
+        session: A gitlab.Gitlab object.
+        """
+        key = GitlabEmailIndex.getKey(session, self._listSecondaryEmails)
+        with GitlabEmailIndex._lock:
+            indexLock = GitlabEmailIndex._indexLocks.setdefault(key, threading.Lock())
+        # Tasks that need the same index wait for the one that is building it.
+        with indexLock:
+            entry = GitlabEmailIndex._indexes.get(key)
+            if not self._isFresh(entry):
+                entry = self._load(key)
+            if not self._isFresh(entry):
+                entry = {"created": time.time(), "emails": self.build(session)}
+                self._save(key, entry)
+            GitlabEmailIndex._indexes[key] = entry
+            return entry["emails"]
+
+    def build(self, session):
+        """
+        Lists the users of a GitLab instance and returns a dictionary mapping their
+        (lowercase) email addresses to their usernames. Secondary email addresses are only
+        included if the index was asked to list them.
+        """
+        emails = {}
+        listSecondaryEmails = self._listSecondaryEmails
+        for user in session.users.list(iterator=True, per_page=GitlabEmailIndex.USERSPERPAGE):
+            username = user.attributes["username"]
+            for field in GitlabEmailIndex.EMAILFIELDS:
+                email = user.attributes.get(field)
+                if email:
+                    emails[email.lower()] = username
+            if listSecondaryEmails:
+                try:
+                    for userEmail in user.emails.list(iterator=True):
+                        emails[userEmail.email.lower()] = username
+                except pygitlab.exceptions.GitlabError:
+                    # Only administrators may list the emails of other users, so there is
+                    # no point in asking for those of the remaining users.
+                    listSecondaryEmails = False
+        return emails
+
+    def _load(self, key):
+        if self._indexDirectory is None:
+            return None
+        try:
+            with open(self._getIndexPath(key), 'r') as indexFile:
+                return json.load(indexFile)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, key, entry):
+        if self._indexDirectory is None:
+            return
+        os.makedirs(self._indexDirectory, exist_ok=True)
+        path = self._getIndexPath(key)
+        with open(path + ".tmp", 'w') as indexFile:
+            json.dump(entry, indexFile)
+        os.replace(path + ".tmp", path)
+
+    def clear(self):
+        """Forget the indexes built during this run. Indexes on disk are kept."""
+        with GitlabEmailIndex._lock:
+            GitlabEmailIndex._indexes = {}
 
 
 class BitbucketAPISessionCreator(VCSAPISessionCreator):
@@ -1,14 +1,20 @@
 from reposcanner.contrib import ContributorAccountListRoutine, OfflineCommitCountsRoutine, GambitCommitAuthorshipInferenceAnalysis
 from reposcanner.contrib import CommitInfoMiningRoutine, OnlineCommitAuthorshipRoutine
 from reposcanner.dummy import DummyOfflineRoutine, DummyOnlineRoutine, DummyAnalysis
-from reposcanner.git import CredentialKeychain
-from reposcanner.data import DataEntityStore
+from reposcanner.git import CredentialKeychain, GitHubRateLimitGovernor, HTTPResponseCache
+from reposcanner.git import VCSAPIClientPool
+from reposcanner.data import DataEntityStore, DataFrameCache
+import reposcanner.data as dataEntities
 from reposcanner.response import ResponseFactory
-from reposcanner.routines import RepositoryRoutine, ExternalCommandLineToolRoutine
+from reposcanner.routines import RepositoryRoutine, ExternalCommandLineToolRoutine, OfflineRepositoryRoutine
+from reposcanner.routines import RoutineResultCache, OnlineRepositoryRoutine, OnlineRoutineEngine
 import datetime
 import logging
 import curses
+import json
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm  # For progress checking in non-GUI mode.
 from abc import ABC, abstractmethod
 
@@ -32,10 +38,33 @@ class ManagerTask(ABC):
     def __init__(self, request):
         self._request = request
         self._response = None
+        self._startTime = None
+        self._endTime = None
+        self._restored = False
 
     def getRequestClassName(self):
         return self._request.__class__.__name__
 
+    def getJournalKey(self):
+        """
+        Returns a string that identifies the task across runs, used by the TaskJournal.
+        """
+        return self.getRequestClassName()
+
+    def restoreResponse(self, response):
+        """
+        Record a response loaded from the TaskJournal of an earlier run, so that the
+        task does not need to be executed again.
+        """
+        self._response = response
+        self._restored = True
+
+    def wasRestored(self):
+        """
+        Returns True if the task's response was restored from an earlier run.
+        """
+        return self._restored
+
     def getRequest(self):
         return self._request
 
@@ -45,6 +74,56 @@ class ManagerTask(ABC):
     def getResponse(self):
         return self._response
 
+    def getStartTime(self):
+        """
+        Returns the datetime at which the task began executing, or None
+        if the task has not been executed yet.
+        """
+        return self._startTime
+
+    def getEndTime(self):
+        """
+        Returns the datetime at which the task finished executing, or None
+        if the task has not finished yet.
+        """
+        return self._endTime
+
+    def selectAgent(self, agents):
+        """
+        Scan through a set of available routines or analyses and return the first
+        one that can execute the request held by this task, or None if there is no
+        such routine or analysis.
+
+        agents: An iterable of RepositoryRoutine and/or DataAnalysis objects.
+        """
+        for agent in agents:
+            if agent.canHandleRequest(self._request):
+                return agent
+        return None
+
+    def execute(self, agent):
+        """
+        Have the agent handle the request and record the response, along with
+        the start and end times of the execution. This method does not touch the
+        DataEntityStore or the lab notebook, so it is safe to call from a worker thread.
+
+        agent: The RepositoryRoutine or DataAnalysis object selected for this task.
+        """
+        self._startTime = datetime.datetime.now()
+        self._response = agent.run(self._request)
+        self._endTime = datetime.datetime.now()
+
+    def setFailureResponseForMissingAgent(self):
+        """
+        Create and store a failure response for the case where no routines or
+        analyses can handle the request held by this task.
+        """
+        responseFactory = ResponseFactory()
+        self._response = responseFactory.createFailureResponse(
+            message="No routine/analysis was found that could \
+                            execute the request ({requestType}).".format(
+                requestType=type(self._request)))
+
     def process(self, agents, store, notebook):
         """
         Scan through a set of available routines or analyses and see if any can
@@ -55,25 +134,31 @@ class ManagerTask(ABC):
         store: A DataEntityStore instance, provided by the manager.
         notebook: A ReposcannerNotebook object, used for logging results.
         """
-        selectedAgent = None
-        for agent in agents:
-            if agent.canHandleRequest(self._request):
-                selectedAgent = agent
-                break
+        selectedAgent = self.selectAgent(agents)
         if selectedAgent is not None:
             if notebook is not None:
                 notebook.onTaskStart(self, store, selectedAgent)
-            if self._request.isAnalysisRequestType():
-                self._request.fetchDataFromStore(store)
-            self._response = selectedAgent.run(self._request)
+            self.fetchDataFromStore(selectedAgent, store)
+            self.execute(selectedAgent)
             if notebook is not None:
                 notebook.onTaskCompletion(self, selectedAgent)
         else:
-            responseFactory = ResponseFactory()
-            self._response = responseFactory.createFailureResponse(
-                message="No routine/analysis was found that could \
-                                execute the request ({requestType}).".format(
-                    requestType=type(request)))
+            self.setFailureResponseForMissingAgent()
+
+    def fetchDataFromStore(self, agent, store):
+        """
+        Load the data that the task needs from the DataEntityStore into its request: the
+        data matching an analysis request's criteria, or the outputs a routine with data
+        dependencies reads. The manager calls this from its own thread, as the store must
+        not be used by the workers that execute tasks.
+
+        agent: The routine or analysis that will handle the task.
+        store: A DataEntityStore instance, provided by the manager.
+        """
+        if self._request.isAnalysisRequestType():
+            self._request.fetchDataFromStore(store)
+        elif isinstance(agent, RepositoryRoutine) and len(agent.getDataDependencies()) > 0:
+            self._request.setData(store.getByCriteria(agent.getDataCriteria(self._request)))
 
     @abstractmethod
     def getResponseDescription(self):
@@ -119,6 +204,29 @@ class ManagerRepositoryRoutineTask(ManagerTask):
     def getProjectID(self):
         return self._projectID
 
+    def getJournalKey(self):
+        return "{requestType} {url}".format(requestType=self.getRequestClassName(), url=self._url)
+
+    @staticmethod
+    def executeWithSharedCommitWalk(tasks, agents):
+        """
+        Execute several offline routine tasks that target the same repository using a
+        single walk over its history, and record each task's response. Like execute(),
+        this does not touch the DataEntityStore or the lab notebook.
+
+        tasks: A list of ManagerRepositoryRoutineTask objects whose requests share a clone.
+        agents: A list of OfflineRepositoryRoutine objects that support shared commit walks,
+        one for each task.
+        """
+        startTime = datetime.datetime.now()
+        responses = OfflineRepositoryRoutine.executeWithSharedCommitWalk(
+            agents, [task.getRequest() for task in tasks])
+        endTime = datetime.datetime.now()
+        for task, response in zip(tasks, responses):
+            task._startTime = startTime
+            task._response = response
+            task._endTime = endTime
+
     def getProjectName(self):
         return self._projectName
 
@@ -185,6 +293,248 @@ class ManagerAnalysisTask(ManagerTask):
             )
 
 
+class ManagerTaskGraph:
+    """
+    A dependency graph over the manager's tasks. Each analysis task depends on the tasks
+    handled by the routines (or analyses) named in its request's getDataDependencies(), or
+    on every routine task if the request does not declare any dependencies. Routine tasks
+    depend on the tasks for the same repository handled by the routines named in their
+    routine's getDataDependencies(), which is usually none.
+
+    The graph also provides a deterministic execution order in which each task with
+    dependencies is placed directly after the last task it depends on, so an analysis can
+    run as soon as the data it needs is available rather than after every routine has
+    finished.
+    """
+
+    def __init__(self, tasks, agents):
+        """
+        tasks: A list of ManagerTask objects, in the order they were created.
+        agents: An iterable of RepositoryRoutine and/or DataAnalysis objects
+        that will handle the tasks.
+        """
+        self._agents = agents
+        self._dependencies = {}
+        routineTasks = [task for task in tasks
+                        if not task.getRequest().isAnalysisRequestType()]
+        analysisTasks = [task for task in tasks
+                         if task.getRequest().isAnalysisRequestType()]
+        for task in routineTasks:
+            self._dependencies[task] = self._findRoutineDependencies(task, routineTasks)
+        for task in analysisTasks:
+            self._dependencies[task] = self._findDependencies(task, tasks)
+        independentTasks = [task for task in routineTasks if len(self._dependencies[task]) == 0]
+        independentTaskSet = set(independentTasks)
+        dependentTasks = [task for task in tasks if task not in independentTaskSet]
+        self._order = self._computeOrder(independentTasks, dependentTasks)
+        self._dependents = {task: [] for task in self._order}
+        for task in self._order:
+            for dependency in self._dependencies[task]:
+                self._dependents[dependency].append(task)
+
+    def _getAgentName(self, task):
+        agent = task.selectAgent(self._agents)
+        if agent is None:
+            return None
+        return agent.__class__.__name__
+
+    def _findRoutineDependencies(self, task, routineTasks):
+        agent = task.selectAgent(self._agents)
+        if not isinstance(agent, RepositoryRoutine) or len(agent.getDataDependencies()) == 0:
+            return []
+        url = task.getRequest().getRepositoryLocation().getURL()
+        return [otherTask for otherTask in routineTasks
+                if otherTask is not task and
+                self._getAgentName(otherTask) in agent.getDataDependencies() and
+                otherTask.getRequest().getRepositoryLocation().getURL() == url]
+
+    def _findDependencies(self, task, tasks):
+        declaredDependencies = task.getRequest().getDataDependencies()
+        if declaredDependencies is None:
+            return [otherTask for otherTask in tasks
+                    if not otherTask.getRequest().isAnalysisRequestType()]
+        return [otherTask for otherTask in tasks
+                if otherTask is not task and
+                self._getAgentName(otherTask) in declaredDependencies]
+
+    def _computeOrder(self, independentTasks, dependentTasks):
+        # Each task with dependencies goes after the last task it depends on and after the
+        # tasks with dependencies already placed there, so the order is made of the
+        # independent tasks, each followed by a block of dependent tasks. A task's position
+        # is its independent task's index and its index in that block (-1 for the
+        # independent task itself). Tasks that depend on nothing go in a block at the start.
+        blocks = [[] for task in independentTasks]
+        headBlock = []
+        position = {task: (index, -1) for index, task in enumerate(independentTasks)}
+        unplaced = list(dependentTasks)
+        while len(unplaced) > 0:
+            ready = [task for task in unplaced
+                     if all(dependency in position for dependency in self._dependencies[task])]
+            if len(ready) == 0:
+                raise ValueError(
+                    "Tasks have circular data dependencies: {requestTypes}".format(
+                        requestTypes=[task.getRequestClassName() for task in unplaced]))
+            # Tasks that become ready at the same point keep their creation order.
+            for task in ready:
+                blockIndex = max([position[dependency][0]
+                                  for dependency in self._dependencies[task]], default=-1)
+                block = headBlock if blockIndex == -1 else blocks[blockIndex]
+                position[task] = (blockIndex, len(block))
+                block.append(task)
+            unplaced = [task for task in unplaced if task not in position]
+        order = list(headBlock)
+        for task, block in zip(independentTasks, blocks):
+            order.append(task)
+            order.extend(block)
+        return order
+
+    def getTasks(self):
+        """
+        Returns the tasks in a deterministic order that respects their dependencies.
+        """
+        return self._order
+
+    def getDependencies(self, task):
+        """
+        Returns the list of tasks that must be completed before the task can be executed.
+        """
+        return self._dependencies[task]
+
+    def getDependents(self, task):
+        """
+        Returns the list of tasks that depend on the task, in execution order.
+        """
+        return self._dependents[task]
+
+    def isReady(self, task, completedTasks):
+        """
+        Returns True if every task that the task depends on is in completedTasks.
+        """
+        return all(dependency in completedTasks for dependency in self._dependencies[task])
+
+
+class TaskJournal:
+    """
+    An append-only journal of the tasks completed during a run, written as one JSON object
+    per line. Each entry records the task's journal key, the configuration parameters of the
+    routine or analysis that handled it, and the path, class and MD5 hash of each data
+    entity it produced. Entries are flushed to disk as soon as they are written, so if a run
+    is interrupted, the next run can restore the tasks that had finished and only execute
+    the rest.
+    """
+
+    def __init__(self, filePath):
+        """
+        filePath: The path of the journal file.
+        """
+        self._filePath = filePath
+
+    def getFilePath(self):
+        return self._filePath
+
+    def clear(self):
+        """
+        Start a new journal, discarding the entries of earlier runs.
+        """
+        with open(self._filePath, 'w'):
+            pass
+
+    def _describeAgent(self, agent):
+        try:
+            parameters = agent.getConfigurationParameters()
+        except AttributeError:
+            parameters = None
+        return json.dumps(parameters, sort_keys=True, default=str)
+
+    def recordCompletedTask(self, task, agent):
+        """
+        Append an entry for a task to the journal. Only successful tasks are recorded,
+        since failed tasks should be attempted again.
+
+        task: A ManagerTask object that has a response.
+        agent: The routine or analysis that handled the task.
+        """
+        response = task.getResponse()
+        if response is None or not response.wasSuccessful():
+            return
+        outputs = []
+        for attachment in response.getAttachments():
+            if isinstance(attachment, dataEntities.ReposcannerDataEntity) and attachment.fileExists():
+                outputs.append({"path": os.path.abspath(attachment.getFilePath()),
+                                "class": attachment.__class__.__name__,
+                                "md5": attachment.getMD5Hash()})
+        entry = {"task": task.getJournalKey(),
+                 "agent": self._describeAgent(agent),
+                 "message": response.getMessage(),
+                 "outputs": outputs}
+        with open(self._filePath, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def readEntries(self):
+        """
+        Returns a dictionary mapping journal keys to the latest entry recorded for them.
+        A truncated last line, left by a run that was killed while writing it, is ignored.
+        """
+        entries = {}
+        if not os.path.exists(self._filePath):
+            return entries
+        with open(self._filePath) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[entry["task"]] = entry
+        return entries
+
+    def restoreTasks(self, tasks, agents, taskGraph=None):
+        """
+        Restore the responses of the tasks that completed in an earlier run, provided they
+        were handled by an identically configured routine or analysis, their output
+        files are unchanged and every task they depend on was restored too (otherwise
+        their results would be built from outdated inputs). Returns the list of restored
+        tasks.
+
+        tasks: A list of ManagerTask objects, in an order that respects their dependencies.
+        agents: The routines and analyses available to the manager.
+        taskGraph: The ManagerTaskGraph of the tasks, or None if they have no dependencies.
+        """
+        entries = self.readEntries()
+        responseFactory = ResponseFactory()
+        restoredTasks = []
+        for task in tasks:
+            entry = entries.get(task.getJournalKey())
+            agent = task.selectAgent(agents)
+            if entry is None or agent is None or entry["agent"] != self._describeAgent(agent):
+                continue
+            if taskGraph is not None and \
+                    not all(dependency in restoredTasks for dependency in taskGraph.getDependencies(task)):
+                continue
+            outputs = self._loadOutputs(entry["outputs"])
+            if outputs is None:
+                continue
+            task.restoreResponse(responseFactory.createSuccessResponse(
+                message=entry["message"], attachments=outputs))
+            restoredTasks.append(task)
+        return restoredTasks
+
+    def _loadOutputs(self, outputs):
+        entities = []
+        for output in outputs:
+            entityClass = getattr(dataEntities, output["class"], None)
+            if not isinstance(entityClass, type) or \
+                    not issubclass(entityClass, dataEntities.ReposcannerDataEntity):
+                return None
+            entity = entityClass(output["path"])
+            if not entity.fileExists() or entity.getMD5Hash() != output["md5"]:
+                return None
+            entity.readFromFile()
+            entities.append(entity)
+        return entities
+
+
 class ReposcannerManager:
     """
     The ReposcannerRoutineManager is responsible for launching and tracking executions
@@ -192,26 +542,88 @@ class ReposcannerManager:
     passes the necessary repository and credential data to it.
     """
 
+    # The name of the file in the output directory that holds the TaskJournal.
+    TASKJOURNALFILENAME = "reposcannerTaskJournal.jsonl"
+
     def __init__(
             self,
             notebook=None,
             outputDirectory="./",
             workspaceDirectory="./",
-            gui=False):
+            gui=False,
+            workers=None,
+            updateClones=False,
+            resume=False):
+        """
+        notebook: A ReposcannerLabNotebook object used for provenance tracking, or None.
+        outputDirectory: The directory where routines and analyses write their outputs.
+        workspaceDirectory: The directory where offline routines clone repositories.
+        gui: If True, run in the curses-based GUI mode.
+        workers: The number of worker threads used to execute repository routine tasks
+        concurrently. If None, the value is taken from the config file (if present),
+        otherwise tasks are executed one at a time.
+        updateClones: If True, offline routines fetch new objects into clones that already
+        exist in the workspace instead of using them as-is. This can also be enabled in
+        the config file.
+        resume: If True, tasks that completed during an earlier run (according to the task
+        journal in the output directory) are not executed again. Their outputs are loaded
+        into the DataEntityStore instead.
+        """
         self._notebook = notebook
         self._repositoryRoutines = []
         self._externalCommandLineToolRoutines = []
         self._analyses = []
         self._tasks = []
+        self._taskGraph = None
         self._keychain = None
         self._outputDirectory = outputDirectory
         self._workspaceDirectory = workspaceDirectory
         self._guiModeEnabled = gui
+        self._workers = workers
+        self._updateClones = updateClones
+        self._resume = resume
+        self._journal = None
+        self._onlineConcurrencyPerHost = None
+        self._responseCache = None
+        self._clientPool = VCSAPIClientPool()
+        # Clones that have already been brought up to date during the current run.
+        self._updatedCloneDirectories = set()
         self._store = DataEntityStore()
 
     def initializeRoutinesAndAnalyses(self, configData):
         """Constructs RepositoryRoutine and DataAnalysis objects that belong to the manager."""
 
+        if 'workers' in configData and self._workers is None:
+            # A value passed on the command-line takes precedence over the config file.
+            self.setNumberOfWorkers(configData['workers'])
+        if configData.get('updateClones', False):
+            self._updateClones = True
+        if 'onlineConcurrencyPerHost' in configData:
+            self.setOnlineConcurrencyPerHost(configData['onlineConcurrencyPerHost'])
+        if 'dataFrameCacheSize' in configData:
+            # The budget for cached DataFrames, shared by all data entities, in megabytes.
+            DataFrameCache().setBudget(int(configData['dataFrameCacheSize']) * 1024 * 1024)
+        if 'dataStoreMemoryCeiling' in configData:
+            # The memory that records fetched from the store may use, in megabytes.
+            self._store.setMemoryCeiling(int(configData['dataStoreMemoryCeiling']) * 1024 * 1024)
+        if configData.get('spillDataToDisk', False):
+            self._store.setSpillToDisk(True)
+        if 'reuseAPISessions' in configData:
+            # Online tasks for the same host and credentials share API clients and their
+            # connections unless this is turned off.
+            self._clientPool.setEnabled(configData['reuseAPISessions'] is not False)
+        resultCache = None
+        if 'resultCacheDirectory' in configData:
+            # Offline routines reuse the outputs of earlier runs kept in this directory.
+            resultCache = RoutineResultCache(configData['resultCacheDirectory'])
+        if 'httpCacheDirectory' in configData:
+            # Online routines revalidate the API responses of earlier runs kept in this
+            # directory instead of downloading them again. The size is in megabytes.
+            maximumSize = HTTPResponseCache.DEFAULTMAXIMUMSIZE
+            if 'httpCacheSize' in configData:
+                maximumSize = int(configData['httpCacheSize']) * 1024 * 1024
+            self._responseCache = HTTPResponseCache(configData['httpCacheDirectory'], maximumSize)
+
         if 'routines' in configData:
             for routineEntry in configData['routines']:
                 if isinstance(routineEntry, dict):
@@ -227,6 +639,12 @@ class ReposcannerManager:
                     routineClazz = getattr(sys.modules[__name__], routineName)
                     routineInstance = routineClazz()
                     routineInstance.setConfigurationParameters(configParameters)
+                    if isinstance(routineInstance, OfflineRepositoryRoutine):
+                        routineInstance.setResultCache(resultCache)
+                        routineInstance.setUpdatedCloneDirectories(self._updatedCloneDirectories)
+                    if isinstance(routineInstance, OnlineRepositoryRoutine):
+                        routineInstance.setResponseCache(self._responseCache)
+                        routineInstance.setClientPool(self._clientPool)
 
                     if isinstance(routineInstance, RepositoryRoutine):
                         self._repositoryRoutines.append(routineInstance)
@@ -278,6 +696,61 @@ class ReposcannerManager:
         """
         self._store.insert(entity)
 
+    def getDataEntityStore(self):
+        """
+        Provides the DataEntityStore that holds the data
+        available to analyses. Used for testing purposes.
+        """
+        return self._store
+
+    def getAllAgents(self):
+        """
+        Provides a list of all routines and analyses
+        available for the manager to delegate tasks to.
+        """
+        return self._repositoryRoutines + \
+            self._externalCommandLineToolRoutines + \
+            self._analyses
+
+    def getTasks(self):
+        """
+        Provides the list of tasks in the order they will be executed.
+        Used for testing purposes.
+        """
+        return self._tasks
+
+    def getSharedCommitWalkGroups(self):
+        """
+        Find the offline routine tasks that can share a single walk over the history of a
+        clone. Returns a dictionary mapping each such task to a (tasks, agents) tuple
+        describing the group it belongs to. Tasks that have no partner to share a walk
+        with are left out.
+        """
+        groupsByCloneDirectory = {}
+        for task in self._tasks:
+            if task.wasRestored():
+                continue
+            request = task.getRequest()
+            agent = task.selectAgent(self.getAllAgents())
+            if not isinstance(agent, OfflineRepositoryRoutine) or \
+                    not agent.supportsSharedCommitWalk() or request.hasErrors() or \
+                    len(agent.getDataDependencies()) > 0:
+                continue
+            cloneDirectory = os.path.abspath(request.getCloneDirectory())
+            if cloneDirectory not in groupsByCloneDirectory:
+                groupsByCloneDirectory[cloneDirectory] = ([], [])
+            groupTasks, groupAgents = groupsByCloneDirectory[cloneDirectory]
+            groupTasks.append(task)
+            groupAgents.append(agent)
+
+        groups = {}
+        for group in groupsByCloneDirectory.values():
+            groupTasks, groupAgents = group
+            if len(groupTasks) > 1:
+                for task in groupTasks:
+                    groups[task] = group
+        return groups
+
     def getRoutines(self):
         """
         Provides a list of all routines
@@ -312,6 +785,51 @@ class ReposcannerManager:
     def isGUIModeEnabled(self):
         return self._guiModeEnabled
 
+    def isCloneUpdatingEnabled(self):
+        return self._updateClones
+
+    def getNumberOfWorkers(self):
+        """
+        Returns the number of worker threads used to execute repository
+        routine tasks. A value of 1 means tasks are executed one at a time.
+        """
+        if self._workers is None:
+            return 1
+        return self._workers
+
+    def setNumberOfWorkers(self, workers):
+        """
+        workers: A positive integer indicating how many repository routine tasks
+        may be executed concurrently.
+        """
+        workers = int(workers)
+        if workers < 1:
+            raise ValueError(
+                "The number of workers must be a positive integer (got {workers}).".format(
+                    workers=workers))
+        self._workers = workers
+
+    def getOnlineConcurrencyPerHost(self):
+        """
+        Returns the number of online routine requests that may be in flight at once for
+        each host when executing in parallel. By default, this is the number of workers.
+        """
+        if self._onlineConcurrencyPerHost is None:
+            return self.getNumberOfWorkers()
+        return self._onlineConcurrencyPerHost
+
+    def setOnlineConcurrencyPerHost(self, concurrency):
+        """
+        concurrency: A positive integer indicating how many online routine requests may be
+        in flight at once for each host.
+        """
+        concurrency = int(concurrency)
+        if concurrency < 1:
+            raise ValueError(
+                "The online concurrency per host must be a positive integer (got {concurrency}).".format(
+                    concurrency=concurrency))
+        self._onlineConcurrencyPerHost = concurrency
+
     def buildTask(self, projectID, projectName, url, routineOrAnalysis):
         """Constructs a task to hold a request/response pair."""
         requestType = routineOrAnalysis.getRequestType()
@@ -329,6 +847,7 @@ class ReposcannerManager:
                     request = requestType(repositoryURL=url,
                                           outputDirectory=self._outputDirectory,
                                           workspaceDirectory=self._workspaceDirectory)
+                    request.setUpdateClone(self._updateClones)
                 task = ManagerRepositoryRoutineTask(
                     projectID=projectID, projectName=projectName, url=url, request=request)
                 return task
@@ -345,56 +864,261 @@ class ReposcannerManager:
         """Interpret the user's inputs so we know what repositories we need to
         collect data on and how we can access them."""
         self._keychain = CredentialKeychain(credentialsDictionary)
-        for projectID in repositoryDictionary:
-            projectEntry = repositoryDictionary[projectID]
-            if "name" in projectEntry:
-                projectName = projectEntry["name"]
-            else:
-                projectName = ""
+        for routine in self._repositoryRoutines:
+            for projectID in repositoryDictionary:
+                projectEntry = repositoryDictionary[projectID]
+                if "name" in projectEntry:
+                    projectName = projectEntry["name"]
+                else:
+                    projectName = ""
 
-            for url in projectEntry["urls"]:
-                for routine in self._repositoryRoutines:
+                for url in projectEntry["urls"]:
                     task = self.buildTask(projectID, projectName, url, routine)
                     if self._notebook is not None:
                         self._notebook.onTaskCreation(task)
                     self._tasks.append(task)
         for analysis in self._analyses:
-            task = self.buildTask(projectID, projectName, url, analysis)
+            task = self.buildTask(None, None, None, analysis)
             if self._notebook is not None:
                 self._notebook.onTaskCreation(task)
             self._tasks.append(task)
 
+        # Order the tasks so that each analysis comes right after the data it depends on.
+        self._taskGraph = ManagerTaskGraph(self._tasks, self.getAllAgents())
+        self._tasks = self._taskGraph.getTasks()
+
     def run(self, repositoriesDataFile, credentialsDataFile, configDataFile):
         """
         run() is the primary method that is called by the main function.
         This method starts Reposcanner's execution.
         """
+        # Each run brings the clones it uses up to date again.
+        self._updatedCloneDirectories.clear()
         self.initializeRoutinesAndAnalyses(configDataFile.getData())
         self.prepareTasks(repositoriesDataFile.getData(), credentialsDataFile.getData())
+        self.prepareTaskJournal()
 
         if not self.isGUIModeEnabled():
             self.executeWithNoGUI()
         else:
             self.executeWithGUI()
+        self.logGitHubQuotaUsage()
+        self.logResponseCacheUsage()
+        self.logAPISessionUsage()
+
+    def logGitHubQuotaUsage(self):
+        """
+        Log how much of each GitHub token's API quotas was used during the run.
+        """
+        for (tokenKey, resource), metrics in GitHubRateLimitGovernor().getMetrics().items():
+            logging.info("GitHub {resource} quota for {token}: {requests} request(s), {remaining} of "
+                         "{limit} remaining, paused {pauses} time(s) for {seconds:.1f}s.".format(
+                             resource=resource, token=tokenKey, requests=metrics["requests"],
+                             remaining=metrics["remaining"], limit=metrics["limit"],
+                             pauses=metrics["pauses"], seconds=metrics["secondsPaused"]))
+
+    def getResponseCache(self):
+        return self._responseCache
+
+    def getClientPool(self):
+        return self._clientPool
+
+    def getUpdatedCloneDirectories(self):
+        return self._updatedCloneDirectories
+
+    def logAPISessionUsage(self):
+        """
+        Log how many API clients were created and reused, and how many connections (i.e.
+        TLS handshakes) they opened.
+        """
+        metrics = self._clientPool.getMetrics()
+        logging.info("API sessions: {created} client(s) created, {reused} reused, "
+                     "{connections} connection(s) opened.".format(
+                         created=metrics["clientsCreated"], reused=metrics["clientsReused"],
+                         connections=metrics["connections"]))
+
+    def logResponseCacheUsage(self):
+        """
+        Log how many API responses were answered from the HTTP response cache.
+        """
+        if self._responseCache is None:
+            return
+        logging.info("HTTP response cache: {hits} hit(s), {misses} miss(es), {evictions} "
+                     "eviction(s), {size:.1f} MB in {path}.".format(
+                         hits=self._responseCache.getHits(),
+                         misses=self._responseCache.getMisses(),
+                         evictions=self._responseCache.getEvictions(),
+                         size=self._responseCache.getSize() / (1024 * 1024),
+                         path=self._responseCache.getCacheDirectory()))
+
+    def isResumeEnabled(self):
+        return self._resume
+
+    def getTaskJournal(self):
+        return self._journal
+
+    def prepareTaskJournal(self):
+        """
+        Set up the journal of completed tasks in the output directory. When resuming, the
+        tasks recorded by the previous run are restored first; otherwise the journal is
+        started afresh. If the journal can't be written, the run continues without it.
+        """
+        journal = TaskJournal(os.path.join(self._outputDirectory, ReposcannerManager.TASKJOURNALFILENAME))
+        try:
+            if self._resume:
+                restoredTasks = journal.restoreTasks(
+                    self._tasks, self.getAllAgents(), self._taskGraph)
+                logging.info("Restored {restored} of {total} task(s) from {path}.".format(
+                    restored=len(restoredTasks), total=len(self._tasks), path=journal.getFilePath()))
+            else:
+                journal.clear()
+        except OSError as exception:
+            logging.warning("Cannot use the task journal {path}: {exception}".format(
+                path=journal.getFilePath(), exception=exception))
+            return
+        self._journal = journal
+
+    def recordTaskInJournal(self, task):
+        """
+        Add a task that was executed during this run to the task journal, if there is one.
+        """
+        if self._journal is None or task.wasRestored():
+            return
+        try:
+            self._journal.recordCompletedTask(task, task.selectAgent(self.getAllAgents()))
+        except OSError as exception:
+            logging.warning("Cannot write to the task journal {path}: {exception}".format(
+                path=self._journal.getFilePath(), exception=exception))
 
     def executeWithNoGUI(self):
         """
-        Plain-text execution mode.
+        Plain-text execution mode. Offline routines that target the same repository
+        share a single walk over its history.
         """
+        if self.getNumberOfWorkers() > 1:
+            self.executeInParallelWithNoGUI()
+            return
+
+        sharedCommitWalkGroups = self.getSharedCommitWalkGroups()
         for task in tqdm(self._tasks):
-            task.process(
-                self._repositoryRoutines +
-                self._externalCommandLineToolRoutines +
-                self._analyses,
-                self._store,
-                self._notebook)
-            response = task.getResponse()
-            print(task.getResponseDescription())
-            if not task.getResponse().wasSuccessful():
-                for attachment in response.getAttachments():
-                    print(attachment)
+            if task.wasRestored():
+                pass
+            elif task in sharedCommitWalkGroups:
+                groupTasks, groupAgents = sharedCommitWalkGroups[task]
+                if not task.hasResponse():
+                    ManagerRepositoryRoutineTask.executeWithSharedCommitWalk(
+                        groupTasks, groupAgents)
+                if self._notebook is not None:
+                    agent = groupAgents[groupTasks.index(task)]
+                    self._notebook.onTaskStart(task, self._store, agent)
+                    self._notebook.onTaskCompletion(task, agent)
+            else:
+                task.process(self.getAllAgents(), self._store, self._notebook)
+            self.commitTaskResults(task)
+
+    def executeInParallelWithNoGUI(self):
+        """
+        Plain-text execution mode where tasks are executed on bounded pools of worker
+        threads. Routine tasks are submitted up front, while each analysis task (and each
+        routine task that reads the outputs of other routines) is submitted as soon as every
+        task it depends on has been committed. Analyses get their own pool
+        so they don't queue up behind the remaining routines. Offline routines that target
+        the same repository share a single walk over its history on one worker. Online
+        routines are handed to an OnlineRoutineEngine instead, which runs them on a pool of
+        getOnlineConcurrencyPerHost() threads for each platform host.
+
+        Workers only run the routines and analyses; the responses are committed to the
+        DataEntityStore and the lab notebook by the calling thread following the order
+        given by the task graph, so the results of a run do not depend on which tasks
+        happened to finish first.
+        """
+        agents = self.getAllAgents()
+        sharedCommitWalkGroups = self.getSharedCommitWalkGroups()
+        futures = {}
+        # The number of tasks each task still waits on. A task is submitted once it drops
+        # to zero.
+        unmetDependencies = {task: len(self._taskGraph.getDependencies(task))
+                             for task in self._tasks}
+
+        def submit(executor, task):
+            if task.wasRestored():
+                futures[task] = (None, None)
+                return
+            if task in sharedCommitWalkGroups:
+                groupTasks, groupAgents = sharedCommitWalkGroups[task]
+                future = executor.submit(
+                    ManagerRepositoryRoutineTask.executeWithSharedCommitWalk,
+                    groupTasks, groupAgents)
+                for groupTask, groupAgent in zip(groupTasks, groupAgents):
+                    futures[groupTask] = (groupAgent, future)
+                return
+            agent = task.selectAgent(agents)
+            if agent is None:
+                task.setFailureResponseForMissingAgent()
+                futures[task] = (None, None)
+                return
+            # Only this thread uses the store, so the data a task reads from it is fetched
+            # (and an analysis's start is logged) before the task is handed off.
+            if task.getRequest().isAnalysisRequestType() and self._notebook is not None:
+                self._notebook.onTaskStart(task, self._store, agent)
+            task.fetchDataFromStore(agent, self._store)
+            if isinstance(agent, OnlineRepositoryRoutine):
+                futures[task] = (agent, onlineEngine.submit(
+                    OnlineRoutineEngine.getHost(task.getRequest()), task.execute, agent))
+                return
+            futures[task] = (agent, executor.submit(task.execute, agent))
+
+        workers = self.getNumberOfWorkers()
+        onlineEngine = OnlineRoutineEngine(concurrencyPerHost=self.getOnlineConcurrencyPerHost())
+        try:
+            with tqdm(total=len(self._tasks)) as progressBar, \
+                    ThreadPoolExecutor(max_workers=workers) as routineExecutor, \
+                    ThreadPoolExecutor(max_workers=workers) as analysisExecutor:
+                def submitToPool(task):
+                    if task.getRequest().isAnalysisRequestType():
+                        submit(analysisExecutor, task)
+                    else:
+                        submit(routineExecutor, task)
+
+                for task in self._tasks:
+                    if not task.getRequest().isAnalysisRequestType() and task not in futures and \
+                            unmetDependencies[task] == 0:
+                        submit(routineExecutor, task)
+                for task in self._tasks:
+                    if task not in futures and unmetDependencies[task] == 0:
+                        submitToPool(task)
+
+                for task in self._tasks:
+                    agent, future = futures[task]
+                    if future is not None:
+                        future.result()
+                        if self._notebook is not None:
+                            if not task.getRequest().isAnalysisRequestType():
+                                self._notebook.onTaskStart(task, self._store, agent)
+                            self._notebook.onTaskCompletion(task, agent)
+                    self.commitTaskResults(task)
+                    progressBar.update(1)
+                    # Submit the tasks whose last unmet dependency was this one.
+                    for dependentTask in self._taskGraph.getDependents(task):
+                        unmetDependencies[dependentTask] -= 1
+                        if unmetDependencies[dependentTask] == 0 and dependentTask not in futures:
+                            submitToPool(dependentTask)
+        finally:
+            onlineEngine.shutdown()
+
+    def commitTaskResults(self, task):
+        """
+        Report the outcome of a processed task and add any data it produced
+        to the DataEntityStore.
+        """
+        response = task.getResponse()
+        print(task.getResponseDescription())
+        if not response.wasSuccessful():
             for attachment in response.getAttachments():
-                self._store.insert(attachment)
+                print(attachment)
+        for attachment in response.getAttachments():
+            self._store.insert(attachment)
+        self.recordTaskInJournal(task)
 
     def executeWithGUI(self):
         """
@@ -510,13 +1234,15 @@ class ReposcannerManager:
                 footer.addstr(1, 4, taskDescription, curses.A_BOLD)
                 footer.border(2)
                 footer.refresh()
-                currentTask.process(
-                    self._repositoryRoutines +
-                    self._analyses,
-                    self._store,
-                    self._notebook)
+                if not currentTask.wasRestored():
+                    currentTask.process(
+                        self._repositoryRoutines +
+                        self._analyses,
+                        self._store,
+                        self._notebook)
                 for attachment in currentTask.getResponse().getAttachments():
                     self._store.insert(attachment)
+                self.recordTaskInJournal(currentTask)
 
                 messages.insert(0, currentTask.getResponseDescription())
                 screen.refresh()
@@ -293,7 +293,11 @@ class ReposcannerLabNotebook(AbstractLabNotebook):
         taskID = "rs:task{taskid}".format(taskid=id(task))
         agentID = "rs:{clazz}".format(clazz=agent.__class__.__name__)
 
-        startTime = datetime.datetime.now()
+        # Tasks executed by a worker thread are logged after the fact, so we
+        # prefer the time recorded by the task itself when it is available.
+        startTime = task.getStartTime()
+        if startTime is None:
+            startTime = datetime.datetime.now()
 
         self._document.wasStartedBy(activity=taskID, trigger=agentID, time=startTime)
 
@@ -334,7 +338,9 @@ class ReposcannerLabNotebook(AbstractLabNotebook):
         taskID = "rs:task{taskid}".format(taskid=id(task))
         agentID = "rs:{clazz}".format(clazz=agent.__class__.__name__)
 
-        endTime = datetime.datetime.now()
+        endTime = task.getEndTime()
+        if endTime is None:
+            endTime = datetime.datetime.now()
         taskWasSuccessful = task.getResponse().wasSuccessful()
         taskMessage = task.getResponse().getMessage()
         self._document.wasEndedBy(
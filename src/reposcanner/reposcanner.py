@@ -80,7 +80,10 @@ def scannerMain(args):
         notebook=notebook,
         outputDirectory=args.outputDirectory,
         workspaceDirectory=args.workspaceDirectory,
-        gui=args.gui)
+        gui=args.gui,
+        workers=args.workers,
+        updateClones=args.updateClones,
+        resume=args.resume)
 
     if args.reposcannerDataDirectory is not None:
         loadReposcannerData(args.reposcannerDataDirectory, notebook, manager)
@@ -124,6 +127,23 @@ reposcannerDataDirectory:
 gui:
     type: bool
     help: Enables GUI mode, which provides a dynamically refreshed console view of Reposcanner's progress.
+updateClones:
+    type: bool
+    help: |
+        Fetch new commits into clones that already exist in the workspace directory
+        instead of reusing them as-is. This can also be enabled with updateClones in the config file.
+resume:
+    type: bool
+    help: |
+        Resume an interrupted run. Tasks recorded as completed in the task journal of the
+        output directory, whose outputs are unchanged, are not executed again.
+workers:
+    type: int
+    default: null
+    help: |
+        (Optional) The number of repository routine tasks to execute concurrently.
+        This overrides the workers setting in the config file. By default, tasks
+        are executed one at a time. Ignored in GUI mode.
 """
 
 
@@ -141,12 +161,15 @@ def run():
         # This code sets the default action to "store"
         # and the default type to "string".
         # **Unless** "type" is set to "bool", in which
-        # case the default action is "store_true".
+        # case the default action is "store_true", or
+        # "type" is set to "int".
         try:
             if props["type"] == "bool":
                 del props["type"]
                 if "action" not in props:
                     props["action"] = "store_true"
+            elif props["type"] == "int":
+                props["type"] = int
         except KeyError:  # default to string type
             props["type"] = str
         if "action" not in props:
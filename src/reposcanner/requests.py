@@ -81,11 +81,26 @@ class AnalysisRequestModel(BaseRequestModel):
         """
         return True
 
+    def getDataDependencies(self):
+        """
+        Classes that inherit from AnalysisRequestModel should
+        override this method to list the names of the routines
+        (or analyses) whose outputs the analysis works with,
+        i.e. the creators accepted by criteriaFunction. The
+        ReposcannerManager uses these names to schedule the
+        analysis as soon as that data is available. By default,
+        this function returns None, which means that the analysis
+        waits until every routine has finished.
+        """
+        return None
+
     def getDataCriteria(self):
         """
         This is called to get the criteria function, which is passed
         to DataEntityStore.getByCriteria() to retrieve the data which
-        is needed by the analysis.
+        is needed by the analysis. Subclasses may override this to return
+        a DataCriteria object instead, which lets the store answer the
+        query from its indexes rather than testing every entity.
         """
         return self.criteriaFunction
 
@@ -171,6 +186,7 @@ class RepositoryRoutineRequestModel(BaseRequestModel):
 
         """
         super().__init__()
+        self._data = []
         factory = gitEntities.GitEntityFactory()
         self._repositoryLocation = None
         try:
@@ -213,6 +229,19 @@ class RepositoryRoutineRequestModel(BaseRequestModel):
     def getOutputDirectory(self):
         return self._outputDirectory
 
+    def setData(self, entities):
+        """
+        Called by the ReposcannerManager prior to running a routine that has data
+        dependencies, with the data entities the routine needs from the DataEntityStore.
+        """
+        self._data = list(entities)
+
+    def getData(self):
+        """
+        Get any stored data associated with this request.
+        """
+        return self._data
+
     @classmethod
     def isRoutineRequestType(cls):
         return True
@@ -302,6 +331,7 @@ class OfflineRoutineRequest(RepositoryRoutineRequestModel):
                 should create a clone of the input repository.
         """
         super().__init__(repositoryURL, outputDirectory)
+        self._updateClone = False
         try:
             self._workspaceDirectory = workspaceDirectory
             if not os.path.isdir(
@@ -317,6 +347,17 @@ class OfflineRoutineRequest(RepositoryRoutineRequestModel):
                         {workspaceDirectory}: {exception}".format(workspaceDirectory=self._workspaceDirectory,
                                                                   exception=exception))
 
+    def setUpdateClone(self, updateClone):
+        """
+        updateClone: If True, and a clone of the repository already exists in the
+        workspace, the routine fetches any new objects from the repository's remote
+        before using the clone. Otherwise the existing clone is used as-is.
+        """
+        self._updateClone = updateClone
+
+    def shouldUpdateClone(self):
+        return self._updateClone
+
     def getCloneDirectory(self):
         return Path(self._workspaceDirectory) \
             / "{repoOwner}_{repoName}".format(
@@ -1,9 +1,18 @@
 from abc import ABC, abstractmethod
 import urllib3
 import os
+import logging
+import threading
+import hashlib
+import json
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 import pygit2
 from reposcanner.git import GitEntityFactory, RepositoryLocation
 from reposcanner.response import ResponseFactory
+import reposcanner.data as dataEntities
 
 
 class DataMiningRoutine(ABC):
@@ -75,10 +84,39 @@ class DataMiningRoutine(ABC):
         """
         self.configParameters = configParameters
 
+    def getConfigurationParameter(self, key, default=None):
+        """
+        Returns the value of a single configuration parameter, or the default if the
+        routine was not given that parameter.
+        """
+        parameters = self.getConfigurationParameters()
+        if isinstance(parameters, dict) and key in parameters:
+            return parameters[key]
+        return default
+
 
 class RepositoryRoutine(DataMiningRoutine):
     """The abstract base class for all software repository analysis routines."""
-    pass
+
+    def getDataDependencies(self):
+        """
+        Returns the names of the routines whose outputs for the same repository this
+        routine reads. The ReposcannerManager only executes a task for this routine once
+        the tasks of those routines for the same repository have completed, and passes
+        their outputs to the routine through the request (see getDataCriteria()). By
+        default, routines have no data dependencies.
+        """
+        return []
+
+    def getDataCriteria(self, request):
+        """
+        Returns the DataCriteria that select the data entities a routine with data
+        dependencies needs from the DataEntityStore to handle a request. The manager
+        fetches these on its own thread (the store is not thread-safe) and hands them to
+        the request with setData().
+        """
+        return dataEntities.DataCriteria(creator=self.getDataDependencies(),
+                                         url=[request.getRepositoryLocation().getURL()])
 
 
 class ExternalCommandLineToolRoutine(DataMiningRoutine):
@@ -132,16 +170,429 @@ class ExternalCommandLineToolRoutine(DataMiningRoutine):
                         etype=type(e)), attachments=[e])
 
 
+class CommitVisitor(ABC):
+    """
+    Abstract base class for objects that receive the commits of a repository one at a time
+    during a SharedCommitWalk. Offline routines that only need to look at each commit once
+    can provide a visitor so that several routines can share a single walk over a clone.
+    """
+
+    def isSatisfied(self):
+        """
+        Returns True if the visitor does not need to see any more commits. A walk stops
+        early once all of its visitors are satisfied. By default, visitors want every commit.
+        """
+        return False
+
+    def getHiddenCommits(self):
+        """
+        Returns a list of commit hashes whose history the visitor does not need to see,
+        or None if the visitor needs the full history (the default). A walk only skips
+        the history that every one of its visitors has asked to hide, so visitors must
+        still be prepared to receive commits reachable from the ones they listed.
+        """
+        return None
+
+    def isResultCacheable(self):
+        """
+        Returns True if the response of the visitor reflects the history it was shown, so
+        that it can be stored in a RoutineResultCache (the default).
+        """
+        return True
+
+    @abstractmethod
+    def visitCommit(self, commit):
+        """
+        Called once for each commit in the walk.
+
+        commit: A pygit2 Commit object.
+        """
+        pass
+
+    @abstractmethod
+    def getResponse(self):
+        """
+        Called after the walk has finished. Returns the ResponseModel for the routine
+        that created this visitor.
+        """
+        pass
+
+    def abort(self):
+        """
+        Called instead of (or when failing in) getResponse() if the walk did not finish,
+        so that the visitor can clean up after itself (e.g. delete a partially written
+        output file). By default, this does nothing.
+        """
+        pass
+
+
+class CompletedCommitVisitor(CommitVisitor):
+    """
+    A visitor for routines that already know their response before the walk begins
+    (e.g. because their output already exists). It never asks for any commits.
+    """
+
+    def __init__(self, response):
+        self._response = response
+
+    def isSatisfied(self):
+        return True
+
+    def isResultCacheable(self):
+        # The response was decided without looking at the history, e.g. by skipping.
+        return False
+
+    def visitCommit(self, commit):
+        pass
+
+    def getResponse(self):
+        return self._response
+
+
+class SharedCommitWalk:
+    """
+    Walks the history of a clone once and feeds every commit to each of the visitors
+    registered with it, so the cost of walking is paid once per repository rather than
+    once per routine. Commits are visited starting at HEAD in topological order, with
+    ties broken by commit time (newest first).
+    """
+
+    def __init__(self, session):
+        """
+        session: A pygit2 Repository object.
+        """
+        self._session = session
+        self._visitors = []
+
+    def addVisitor(self, visitor):
+        self._visitors.append(visitor)
+
+    def getVisitors(self):
+        return self._visitors
+
+    def run(self):
+        """
+        Walk the history, passing each commit to every visitor that is not yet satisfied.
+        Returns the number of commits that were walked.
+        """
+        numberOfCommitsWalked = 0
+        activeVisitors = [visitor for visitor in self._visitors if not visitor.isSatisfied()]
+        if len(activeVisitors) == 0:
+            return numberOfCommitsWalked
+
+        hiddenCommits = None
+        for visitor in activeVisitors:
+            visitorHiddenCommits = visitor.getHiddenCommits()
+            if visitorHiddenCommits is None:
+                hiddenCommits = set()
+                break
+            elif hiddenCommits is None:
+                hiddenCommits = set(visitorHiddenCommits)
+            else:
+                hiddenCommits &= set(visitorHiddenCommits)
+
+        walker = self._session.walk(self._session.head.target,
+                                    pygit2.GIT_SORT_TIME | pygit2.GIT_SORT_TOPOLOGICAL)
+        for hiddenCommit in hiddenCommits:
+            walker.hide(hiddenCommit)
+
+        for commit in walker:
+            numberOfCommitsWalked += 1
+            for visitor in activeVisitors:
+                visitor.visitCommit(commit)
+            activeVisitors = [visitor for visitor in activeVisitors if not visitor.isSatisfied()]
+            if len(activeVisitors) == 0:
+                break
+        return numberOfCommitsWalked
+
+
+class RoutineResultCache:
+    """
+    A persistent cache of the outputs of offline routines, shared across runs. Each entry is
+    keyed by the routine's class and resultVersion, its configuration parameters, the URL
+    of the repository and the commit its HEAD resolved to, so a routine whose inputs have not
+    changed can reuse the files it produced in an earlier run instead of recomputing them.
+
+    Entries are stored in subdirectories of the cache directory, one per key, holding a
+    copy of each output file and an entry.json file describing them.
+    """
+
+    ENTRYFILENAME = "entry.json"
+
+    def __init__(self, cacheDirectory):
+        """
+        cacheDirectory: The directory where cached results are stored. It is created if
+        it does not exist.
+        """
+        self._cacheDirectory = cacheDirectory
+        os.makedirs(cacheDirectory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def getCacheDirectory(self):
+        return self._cacheDirectory
+
+    def getHits(self):
+        return self._hits
+
+    def getMisses(self):
+        return self._misses
+
+    def getKey(self, routine, request, headCommit):
+        """
+        Returns the key of the cache entry for the outputs of a routine.
+
+        routine: An OfflineRepositoryRoutine object.
+        request: The OfflineRoutineRequest being processed.
+        headCommit: The hash of the commit that HEAD of the clone resolved to.
+        """
+        description = {
+            "routine": "{module}.{name}".format(
+                module=routine.__class__.__module__, name=routine.__class__.__name__),
+            "version": routine.resultVersion,
+            "parameters": routine.getConfigurationParameters(),
+            "url": request.getRepositoryLocation().getURL(),
+            "headcommit": headCommit}
+        serialized = json.dumps(description, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    def _getEntryDirectory(self, key):
+        return os.path.join(self._cacheDirectory, key)
+
+    def get(self, key, outputDirectory):
+        """
+        Copies the files of a cache entry into the output directory and returns a list of
+        data entities for them, or None if there is no (readable) entry for the key.
+
+        key: A key returned by getKey().
+        outputDirectory: The directory the routine would have written its outputs to.
+        """
+        entryDirectory = self._getEntryDirectory(key)
+        entities = None
+        try:
+            with open(os.path.join(entryDirectory, RoutineResultCache.ENTRYFILENAME)) as f:
+                entry = json.load(f)
+            entities = []
+            for item in entry["files"]:
+                entityClass = getattr(dataEntities, item["class"])
+                if not issubclass(entityClass, dataEntities.AnnotatedCSVData):
+                    raise ValueError("Unexpected entity class {name}".format(name=item["class"]))
+                outputPath = os.path.join(outputDirectory, item["name"])
+                shutil.copyfile(os.path.join(entryDirectory, item["name"]), outputPath)
+                entity = entityClass(outputPath)
+                entity.readFromFile()
+                entities.append(entity)
+        except FileNotFoundError:
+            entities = None
+        except Exception as exception:
+            logging.warning("Ignoring unreadable result cache entry {path}: {exception}".format(
+                path=entryDirectory, exception=exception))
+            entities = None
+        with self._lock:
+            if entities is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return entities
+
+    def put(self, key, response):
+        """
+        Stores the attachments of a successful response under the key. Responses that are
+        not successful, or have attachments that aren't annotated data files written to
+        disk, are not cached. Returns True if the response was stored.
+
+        key: A key returned by getKey().
+        response: The ResponseModel returned by the routine.
+        """
+        if not response.wasSuccessful() or not response.hasAttachments():
+            return False
+        for attachment in response.getAttachments():
+            if not isinstance(attachment, dataEntities.AnnotatedCSVData) or \
+                    not attachment.fileExists() or attachment.isStreaming():
+                return False
+        names = [os.path.basename(attachment.getFilePath())
+                 for attachment in response.getAttachments()]
+        if len(set(names)) != len(names) or RoutineResultCache.ENTRYFILENAME in names:
+            return False
+
+        entryDirectory = self._getEntryDirectory(key)
+        if os.path.exists(entryDirectory):
+            return True
+        # Build the entry next to its final location and move it into place in one step, so
+        # that readers never see a partial entry.
+        temporaryDirectory = tempfile.mkdtemp(dir=self._cacheDirectory, prefix=".partial-")
+        try:
+            files = []
+            for name, attachment in zip(names, response.getAttachments()):
+                shutil.copyfile(attachment.getFilePath(), os.path.join(temporaryDirectory, name))
+                files.append({"name": name, "class": attachment.__class__.__name__})
+            with open(os.path.join(temporaryDirectory, RoutineResultCache.ENTRYFILENAME), 'w') as f:
+                json.dump({"files": files}, f)
+            os.rename(temporaryDirectory, entryDirectory)
+        except OSError:
+            # Another routine stored the same entry first, or the cache isn't writable.
+            shutil.rmtree(temporaryDirectory, ignore_errors=True)
+            return os.path.exists(entryDirectory)
+        return True
+
+
 class OfflineRepositoryRoutine(RepositoryRoutine):
     """
     Class that encapsulates the stages of a PyGit2-based analysis procedure operating on a clone of a repository.
     """
 
-    def execute(self, request):
+    # Offline routines that target the same repository share a clone. When the manager
+    # runs tasks concurrently, we must make sure only one of them creates that clone.
+    _cloneDirectoryLocks = {}
+    _cloneDirectoryLocksGuard = threading.Lock()
+
+    # Part of the key of the routine's entries in a RoutineResultCache. Subclasses should
+    # increment it whenever a change to the routine changes its outputs.
+    resultVersion = 1
+
+    _resultCache = None
+    _updatedCloneDirectories = None
+
+    def setResultCache(self, resultCache):
         """
-        The Offline routine execute() method delegates responsibility for performing the routine to
-        the offlineImplementation() method. Subclasses of this class are responsible for
-        overriding that methods.
+        resultCache: A RoutineResultCache in which to look up and store the routine's
+        outputs, or None to always run the routine (the default).
+        """
+        self._resultCache = resultCache
+
+    def getResultCache(self):
+        return self._resultCache
+
+    def setUpdatedCloneDirectories(self, updatedCloneDirectories):
+        """
+        updatedCloneDirectories: A set of the clones that have already been brought up to
+        date during this run, shared by the routines of a manager so that routines sharing
+        a clone only fetch from the remote once. If None (the default), the clone is
+        updated every time it is opened.
+        """
+        self._updatedCloneDirectories = updatedCloneDirectories
+
+    def getUpdatedCloneDirectories(self):
+        return self._updatedCloneDirectories
+
+    def getResultCacheKey(self, request, session):
+        """
+        Returns the key of the routine's outputs for the request in its RoutineResultCache,
+        or None if the routine has no cache or the clone has no HEAD commit.
+
+        request: An OfflineRoutineRequest object.
+        session: A pygit2 Repository object.
+        """
+        if self._resultCache is None or session.head_is_unborn:
+            return None
+        return self._resultCache.getKey(self, request, str(session.head.target))
+
+    def getCachedResponse(self, request, key):
+        """
+        Returns a success response holding the cached outputs for the key, or None if
+        there are none.
+        """
+        if key is None:
+            return None
+        entities = self._resultCache.get(key, request.getOutputDirectory())
+        if entities is None:
+            return None
+        responseFactory = ResponseFactory()
+        return responseFactory.createSuccessResponse(
+            message="[{name}] Repository is unchanged since the cached result, skipping...".format(
+                name=self.__class__.__name__), attachments=entities)
+
+    def cacheResponse(self, key, response):
+        """
+        Stores the outputs of a response in the routine's RoutineResultCache, if it has one.
+        """
+        if key is not None:
+            self._resultCache.put(key, response)
+
+    @classmethod
+    def getCloneDirectoryLock(cls, cloneDirectory):
+        """
+        Returns the lock that guards the creation of the clone held in cloneDirectory.
+        """
+        key = os.path.abspath(cloneDirectory)
+        with cls._cloneDirectoryLocksGuard:
+            if key not in cls._cloneDirectoryLocks:
+                cls._cloneDirectoryLocks[key] = threading.Lock()
+            return cls._cloneDirectoryLocks[key]
+
+    @classmethod
+    def supportsSharedCommitWalk(cls):
+        """
+        Tells the caller whether this routine provides a CommitVisitor via
+        createCommitVisitor(), which allows it to take part in a SharedCommitWalk.
+        """
+        return False
+
+    def openClone(self, request):
+        """
+        Returns a pygit2 Repository object for the clone of the repository
+        targeted by the request, cloning the repository first if necessary.
+
+        request: An OfflineRoutineRequest object.
+        """
+        with self.getCloneDirectoryLock(request.getCloneDirectory()):
+            if not os.path.exists(request.getCloneDirectory()):
+                def init_remote(repo, name, url):
+                    # Create the remote with a mirroring url
+                    remote = repo.remotes.create(
+                        name, url, "+refs/heads/*:refs/heads/*")
+                    # And set the configuration option to true for the push command
+                    #mirror_var = "remote.{}.mirror".format(name)
+                    #repo.config[mirror_var] = True
+                    # Return the remote, which pygit2 will use to perform the clone
+                    return remote
+                session = pygit2.clone_repository(
+                    request.getRepositoryLocation().getURL(),
+                    request.getCloneDirectory(),
+                    bare=True,
+                    remote=init_remote)
+            else:
+                session = pygit2.Repository(request.getCloneDirectory())
+                cloneDirectory = os.path.abspath(request.getCloneDirectory())
+                updatedCloneDirectories = self._updatedCloneDirectories
+                if request.shouldUpdateClone() and (updatedCloneDirectories is None or
+                                                    cloneDirectory not in updatedCloneDirectories):
+                    self.updateClone(session)
+                    if updatedCloneDirectories is not None:
+                        updatedCloneDirectories.add(cloneDirectory)
+        return session
+
+    def updateClone(self, session):
+        """
+        Fetch any new objects into an existing clone from its configured remote(s),
+        rather than cloning the whole repository again. Only objects that are not
+        already in the clone are transferred. Returns a tuple containing the number
+        of references that were created or moved and the number of objects received.
+
+        session: A pygit2 Repository object.
+        """
+        def snapshotReferences():
+            return {name: session.references[name].target for name in session.references}
+
+        referencesBeforeFetch = snapshotReferences()
+        numberOfReceivedObjects = 0
+        for remote in session.remotes:
+            transferProgress = remote.fetch()
+            numberOfReceivedObjects += transferProgress.received_objects
+        referencesAfterFetch = snapshotReferences()
+
+        numberOfUpdatedReferences = len(
+            [name for name in referencesAfterFetch
+             if referencesBeforeFetch.get(name) != referencesAfterFetch[name]])
+        logging.info("Updated clone {path}: {refs} reference(s) updated, {objects} object(s) received.".format(
+            path=session.path, refs=numberOfUpdatedReferences, objects=numberOfReceivedObjects))
+        return numberOfUpdatedReferences, numberOfReceivedObjects
+
+    def checkRequest(self, request):
+        """
+        Returns a failure response if the routine cannot process the request,
+        or None if the request is acceptable.
         """
         responseFactory = ResponseFactory()
         if not self.canHandleRequest(request):
@@ -151,42 +602,138 @@ class OfflineRepositoryRoutine(RepositoryRoutine):
             return responseFactory.createFailureResponse(
                 message="The request had errors in it and cannot be processed.",
                 attachments=request.getErrors())
+        return None
+
+    def execute(self, request):
+        """
+        The Offline routine execute() method delegates responsibility for performing the routine to
+        the offlineImplementation() method. Subclasses of this class are responsible for
+        overriding that methods.
+        """
+        responseFactory = ResponseFactory()
+        failureResponse = self.checkRequest(request)
+        if failureResponse is not None:
+            return failureResponse
+        elif self.supportsSharedCommitWalk():
+            return OfflineRepositoryRoutine.executeWithSharedCommitWalk([self], [request])[0]
         else:
             try:
-                if not os.path.exists(request.getCloneDirectory()):
-                    def init_remote(repo, name, url):
-                        # Create the remote with a mirroring url
-                        remote = repo.remotes.create(
-                            name, url, "+refs/heads/*:refs/heads/*")
-                        # And set the configuration option to true for the push command
-                        #mirror_var = "remote.{}.mirror".format(name)
-                        #repo.config[mirror_var] = True
-                        # Return the remote, which pygit2 will use to perform the clone
-                        return remote
-                    session = pygit2.clone_repository(
-                        request.getRepositoryLocation().getURL(),
-                        request.getCloneDirectory(),
-                        bare=True,
-                        remote=init_remote)
-                else:
-                    session = pygit2.Repository(request.getCloneDirectory())
-
-                return self.offlineImplementation(request=request, session=session)
+                session = self.openClone(request)
+                key = self.getResultCacheKey(request, session)
+                response = self.getCachedResponse(request, key)
+                if response is None:
+                    response = self.offlineImplementation(request=request, session=session)
+                    self.cacheResponse(key, response)
+                return response
 
             except Exception as e:
                 return responseFactory.createFailureResponse(
                     message="OfflineRepositoryRoutine Encountered an unexpected exception ({etype}).".format(
                         etype=type(e)), attachments=[e])
 
+    @staticmethod
+    def executeWithSharedCommitWalk(routines, requests):
+        """
+        Execute several offline routines against the same repository with a single walk over
+        its history. Every routine must support shared commit walks, and every request must
+        target the same clone directory. Returns a list of responses, one per routine, in the
+        same order as the routines.
+
+        routines: A list of OfflineRepositoryRoutine objects.
+        requests: A list of OfflineRoutineRequest objects, one per routine.
+        """
+        responseFactory = ResponseFactory()
+        responses = [None] * len(routines)
+        visitors = {}
+        keys = {}
+        session = None
+        for index, (routine, request) in enumerate(zip(routines, requests)):
+            responses[index] = routine.checkRequest(request)
+            if responses[index] is not None:
+                continue
+            try:
+                if session is None:
+                    session = routine.openClone(request)
+                keys[index] = routine.getResultCacheKey(request, session)
+                responses[index] = routine.getCachedResponse(request, keys[index])
+                if responses[index] is not None:
+                    continue
+                visitor = routine.createCommitVisitor(request=request, session=session)
+                if visitor is not None:
+                    visitors[index] = visitor
+                else:
+                    responses[index] = routine.offlineImplementation(
+                        request=request, session=session)
+                    routine.cacheResponse(keys[index], responses[index])
+            except Exception as e:
+                responses[index] = responseFactory.createFailureResponse(
+                    message="OfflineRepositoryRoutine Encountered an unexpected exception ({etype}).".format(
+                        etype=type(e)), attachments=[e])
+
+        if session is not None:
+            walk = SharedCommitWalk(session)
+            for index in visitors:
+                walk.addVisitor(visitors[index])
+            walkFinished = False
+            try:
+                walk.run()
+                walkFinished = True
+            except Exception as e:
+                for index in visitors:
+                    responses[index] = responseFactory.createFailureResponse(
+                        message="OfflineRepositoryRoutine Encountered an unexpected exception ({etype}).".format(
+                            etype=type(e)), attachments=[e])
+            finally:
+                if not walkFinished:
+                    # Don't leave partially written outputs behind.
+                    for visitor in visitors.values():
+                        visitor.abort()
+            if not walkFinished:
+                return responses
+
+        for index in visitors:
+            try:
+                responses[index] = visitors[index].getResponse()
+                if visitors[index].isResultCacheable():
+                    routines[index].cacheResponse(keys[index], responses[index])
+            except Exception as e:
+                visitors[index].abort()
+                responses[index] = responseFactory.createFailureResponse(
+                    message="OfflineRepositoryRoutine Encountered an unexpected exception ({etype}).".format(
+                        etype=type(e)), attachments=[e])
+        return responses
+
+    def createCommitVisitor(self, request, session):
+        """
+        Routines that support shared commit walks should override this method to return a
+        CommitVisitor that computes the routine's results one commit at a time.
+        By default, this returns None.
+
+        request: An OfflineRoutineRequest object.
+        session: A pygit2 Repository object.
+        """
+        return None
+
     def offlineImplementation(self, request, session):
         """
         This method should contain the PyGit2-based implementation of the routine.
-        By default, it'll return a failure response. Subclasses are responsible for
-        overriding this method.
+        By default, if the routine provides a CommitVisitor, it walks the history of the
+        clone with that visitor alone. Otherwise, it'll return a failure response.
+        Subclasses are responsible for overriding this method or createCommitVisitor().
 
         request: An OfflineRoutineRequest object.
         session: A pygit2 Repository object.
         """
+        visitor = self.createCommitVisitor(request=request, session=session)
+        if visitor is not None:
+            walk = SharedCommitWalk(session)
+            walk.addVisitor(visitor)
+            try:
+                walk.run()
+                return visitor.getResponse()
+            except BaseException:
+                visitor.abort()
+                raise
         responseFactory = ResponseFactory()
         return responseFactory.createFailureResponse(
             message="This routine has no implementation available"
@@ -207,6 +754,26 @@ class OnlineRepositoryRoutine(RepositoryRoutine):
         compositeCreator.addChild(gitlabCreator)
         self._sessionCreator = compositeCreator
 
+    def setResponseCache(self, responseCache):
+        """
+        responseCache: An HTTPResponseCache object through which the routine's API sessions
+        send their requests, or None.
+        """
+        self._sessionCreator.setResponseCache(responseCache)
+
+    def getResponseCache(self):
+        return self._sessionCreator.getResponseCache()
+
+    def setClientPool(self, clientPool):
+        """
+        clientPool: A VCSAPIClientPool object from which the routine's API sessions borrow
+        their clients, or None.
+        """
+        self._sessionCreator.setClientPool(clientPool)
+
+    def getClientPool(self):
+        return self._sessionCreator.getClientPool()
+
     def execute(self, request):
         """
         The Online routine execute() method delegates responsibility for performing the routine to
@@ -232,22 +799,22 @@ class OnlineRepositoryRoutine(RepositoryRoutine):
             credentials = request.getCredentials()
             try:
                 if platform == RepositoryLocation.VersionControlPlatform.GITHUB:
-                    return self.githubImplementation(
-                        request=request, session=self._sessionCreator.connect(
-                            repositoryLocation, credentials))
+                    implementation = self.githubImplementation
                 elif platform == RepositoryLocation.VersionControlPlatform.GITLAB:
-                    return self.gitlabImplementation(
-                        request=request, session=self._sessionCreator.connect(
-                            repositoryLocation, credentials))
+                    implementation = self.gitlabImplementation
                 elif platform == RepositoryLocation.VersionControlPlatform.BITBUCKET:
-                    return self.bitbucketImplementation(
-                        request=request, session=self._sessionCreator.connect(
-                            repositoryLocation, credentials))
+                    implementation = self.bitbucketImplementation
                 else:
                     return responseFactory.createFailureResponse(
                         message="The platform of the repository is \
                                                 not supported by this routine ({platform}).".format(
                                 platform=platform))
+                session = self._sessionCreator.connect(repositoryLocation, credentials)
+                try:
+                    return implementation(request=request, session=session)
+                finally:
+                    # Let later tasks reuse the client the session was created with.
+                    self._sessionCreator.release(session)
             except Exception as e:
                 return responseFactory.createFailureResponse(
                     message="OnlineRepositoryRoutine Encountered an unexpected exception.",
@@ -306,3 +873,99 @@ class OnlineRepositoryRoutine(RepositoryRoutine):
         return responseFactory.createFailureResponse(
             message="This routine has no implementation available \
                         to handle a Bitbucket repository.")
+
+
+class OnlineRoutineEngine:
+    """
+    Executes online routines on a bounded pool of threads for each host (e.g. github.com
+    or a self-hosted GitLab instance), so that requests for many repositories can be in
+    flight at once while a large run does not overwhelm any one platform API. The routine
+    implementations block on the platform APIs, so each request in flight holds one of
+    its host's threads, and the number of threads of a host is its concurrency limit.
+
+    Work is submitted from other threads with submit() or executeRoutines(), and the pool
+    of a host is started on first use.
+    """
+
+    DEFAULTCONCURRENCYPERHOST = 4
+
+    def __init__(self, concurrencyPerHost=DEFAULTCONCURRENCYPERHOST, hostLimits=None):
+        """
+        concurrencyPerHost: The number of requests that may be in flight at once for a host.
+        hostLimits: A dictionary mapping host names to limits that override
+        concurrencyPerHost for those hosts.
+        """
+        if concurrencyPerHost < 1:
+            raise ValueError("The concurrency per host must be a positive integer.")
+        self._concurrencyPerHost = concurrencyPerHost
+        self._hostLimits = dict(hostLimits) if hostLimits is not None else {}
+        self._executors = {}
+        self._inFlight = {}
+        self._peakInFlight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def getHost(request):
+        """
+        Returns the host name of the repository targeted by a request.
+        """
+        return urlparse(request.getRepositoryLocation().getURL()).hostname
+
+    def getConcurrencyLimit(self, host):
+        return self._hostLimits.get(host, self._concurrencyPerHost)
+
+    def getPeakConcurrency(self, host):
+        """
+        Returns the largest number of requests that were in flight at once for a host.
+        """
+        return self._peakInFlight.get(host, 0)
+
+    def isRunning(self):
+        return len(self._executors) > 0
+
+    def shutdown(self):
+        """
+        Stop the threads of every host once the work submitted to them has finished.
+        """
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors = {}
+        for executor in executors:
+            executor.shutdown(wait=True)
+
+    def _getExecutor(self, host):
+        with self._lock:
+            if host not in self._executors:
+                self._executors[host] = ThreadPoolExecutor(
+                    max_workers=self.getConcurrencyLimit(host),
+                    thread_name_prefix="OnlineRoutineEngine-{host}".format(host=host))
+            return self._executors[host]
+
+    def _run(self, host, function, *args):
+        with self._lock:
+            self._inFlight[host] = self._inFlight.get(host, 0) + 1
+            self._peakInFlight[host] = max(self._peakInFlight.get(host, 0), self._inFlight[host])
+        try:
+            return function(*args)
+        finally:
+            with self._lock:
+                self._inFlight[host] -= 1
+
+    def submit(self, host, function, *args):
+        """
+        Schedule a call of function(*args) on the threads of a host and return a
+        concurrent.futures.Future for its result. Can be called from any thread.
+        """
+        return self._getExecutor(host).submit(self._run, host, function, *args)
+
+    def executeRoutines(self, routines, requests):
+        """
+        Execute several online routines concurrently and return their responses, in the
+        same order as the routines.
+
+        routines: A list of OnlineRepositoryRoutine objects.
+        requests: A list of requests, one per routine.
+        """
+        futures = [self.submit(OnlineRoutineEngine.getHost(request), routine.run, request)
+                   for routine, request in zip(routines, requests)]
+        return [future.result() for future in futures]
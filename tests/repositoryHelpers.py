@@ -0,0 +1,32 @@
+"""
+Helpers shared by the test modules that need small Git repositories to work on.
+"""
+import pygit2
+
+
+def addCommitsToRepository(repository, numberOfCommits):
+    signatures = [pygit2.Signature("John Smith", "jsmith@gmail.com"),
+                  pygit2.Signature("Alice Jones", "alice@llnl.gov")]
+    if repository.head_is_unborn:
+        parents = []
+        start = 0
+    else:
+        parents = [repository.head.target]
+        start = len(list(repository.walk(repository.head.target)))
+    for i in range(start, start + numberOfCommits):
+        if len(parents) == 0:
+            builder = repository.TreeBuilder()
+        else:
+            builder = repository.TreeBuilder(repository[parents[0]].tree)
+        blob = repository.create_blob("line {i}\n".format(i=i).encode() * (i + 1))
+        builder.insert("file{i}.txt".format(i=i), blob, pygit2.GIT_FILEMODE_BLOB)
+        signature = signatures[i % len(signatures)]
+        commitID = repository.create_commit(
+            "HEAD", signature, signature, "Commit {i}".format(i=i), builder.write(), parents)
+        parents = [commitID]
+    return repository
+
+
+def createBareRepositoryWithCommits(path, numberOfCommits):
+    repository = pygit2.init_repository(str(path), bare=True)
+    return addCommitsToRepository(repository, numberOfCommits)
@@ -1,4 +1,7 @@
+import time
 import pytest
+import pygit2
+from repositoryHelpers import createBareRepositoryWithCommits
 from reposcanner.git import GitEntityFactory
 import reposcanner.routines as routines
 import reposcanner.requests as requests
@@ -263,3 +266,174 @@ def test_OnlineRepositoryRoutine_defaultBitbucketImplementationReturnsFailedResp
     assert(response.hasMessage())
     assert(response.getMessage() == "This routine has no implementation available \
                         to handle a Bitbucket repository.")
+
+
+class CountingCommitVisitor(routines.CommitVisitor):
+    def __init__(self, limit=None, hiddenCommits=None):
+        self.visitedCommits = []
+        self.limit = limit
+        self.hiddenCommits = hiddenCommits
+
+    def getHiddenCommits(self):
+        return self.hiddenCommits
+
+    def isSatisfied(self):
+        return self.limit is not None and len(self.visitedCommits) >= self.limit
+
+    def visitCommit(self, commit):
+        self.visitedCommits.append(str(commit.id))
+
+    def getResponse(self):
+        return responses.ResponseFactory().createSuccessResponse()
+
+
+def test_SharedCommitWalk_feedsEveryCommitToEveryVisitorInOnePass(tmp_path):
+    repository = createBareRepositoryWithCommits(tmp_path / "repo", numberOfCommits=5)
+    visitorA = CountingCommitVisitor()
+    visitorB = CountingCommitVisitor()
+    walk = routines.SharedCommitWalk(repository)
+    walk.addVisitor(visitorA)
+    walk.addVisitor(visitorB)
+    assert(walk.run() == 5)
+    assert(len(visitorA.visitedCommits) == 5)
+    assert(visitorA.visitedCommits == visitorB.visitedCommits)
+    assert(visitorA.visitedCommits[0] == str(repository.head.target))
+
+
+def test_SharedCommitWalk_stopsOnceAllVisitorsAreSatisfied(tmp_path):
+    repository = createBareRepositoryWithCommits(tmp_path / "repo", numberOfCommits=5)
+    visitor = CountingCommitVisitor(limit=2)
+    walk = routines.SharedCommitWalk(repository)
+    walk.addVisitor(visitor)
+    walk.addVisitor(routines.CompletedCommitVisitor(
+        responses.ResponseFactory().createSuccessResponse()))
+    assert(walk.run() == 2)
+    assert(len(visitor.visitedCommits) == 2)
+
+
+def test_SharedCommitWalk_onlyHidesHistoryThatEveryVisitorHides(tmp_path):
+    repository = createBareRepositoryWithCommits(tmp_path / "repo", numberOfCommits=5)
+    thirdCommit = list(repository.walk(repository.head.target))[2]
+    hidingVisitor = CountingCommitVisitor(hiddenCommits=[str(thirdCommit.id)])
+    walk = routines.SharedCommitWalk(repository)
+    walk.addVisitor(hidingVisitor)
+    assert(walk.run() == 2)
+
+    walk.addVisitor(CountingCommitVisitor())
+    assert(walk.run() == 5)
+
+
+def test_OfflineRepositoryRoutine_doesNotSupportSharedCommitWalkByDefault(mocker):
+    mocker.patch.multiple(routines.OfflineRepositoryRoutine, __abstractmethods__=set())
+    genericRoutine = routines.OfflineRepositoryRoutine()
+    assert(not genericRoutine.supportsSharedCommitWalk())
+    assert(genericRoutine.createCommitVisitor(request=None, session=None) is None)
+
+
+def test_OfflineRepositoryRoutine_canFetchNewCommitsIntoExistingClone(mocker, tmp_path):
+    mocker.patch.multiple(routines.OfflineRepositoryRoutine, __abstractmethods__=set())
+    upstream = createBareRepositoryWithCommits(tmp_path / "upstream", numberOfCommits=2)
+    clone = pygit2.clone_repository(
+        str(tmp_path / "upstream"), str(tmp_path / "clone"), bare=True,
+        remote=lambda repo, name, url: repo.remotes.create(
+            name, url, "+refs/heads/*:refs/heads/*"))
+
+    signature = pygit2.Signature("John Smith", "jsmith@gmail.com")
+    headCommit = upstream[upstream.head.target]
+    builder = upstream.TreeBuilder(headCommit.tree)
+    builder.insert("newfile.txt", upstream.create_blob(b"new\n"), pygit2.GIT_FILEMODE_BLOB)
+    newCommitID = upstream.create_commit(
+        "HEAD", signature, signature, "New commit", builder.write(), [headCommit.id])
+
+    genericRoutine = routines.OfflineRepositoryRoutine()
+    numberOfUpdatedReferences, numberOfReceivedObjects = genericRoutine.updateClone(clone)
+    assert(numberOfUpdatedReferences == 1)
+    # A commit, its tree, and the new blob.
+    assert(numberOfReceivedObjects == 3)
+    assert(clone.head.target == newCommitID)
+
+    assert(genericRoutine.updateClone(clone) == (0, 0))
+
+
+def test_OfflineRepositoryRoutine_updatesExistingCloneOnlyWhenRequested(mocker, tmp_path):
+    mocker.patch.multiple(routines.OfflineRepositoryRoutine, __abstractmethods__=set())
+    createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=1)
+    updateClone = mocker.patch.object(
+        routines.OfflineRepositoryRoutine, "updateClone", return_value=(0, 0))
+    genericRoutine = routines.OfflineRepositoryRoutine()
+
+    request = requests.OfflineRoutineRequest(
+        repositoryURL="https://github.com/owner/repo",
+        outputDirectory=str(tmp_path),
+        workspaceDirectory=str(tmp_path))
+    assert(not request.shouldUpdateClone())
+    genericRoutine.openClone(request)
+    assert(updateClone.call_count == 0)
+
+    request.setUpdateClone(True)
+    genericRoutine.openClone(request)
+    assert(updateClone.call_count == 1)
+    genericRoutine.openClone(request)
+    assert(updateClone.call_count == 2)
+
+    # Clones shared by several routines are only updated once per run.
+    updatedCloneDirectories = set()
+    genericRoutine.setUpdatedCloneDirectories(updatedCloneDirectories)
+    otherRoutine = routines.OfflineRepositoryRoutine()
+    otherRoutine.setUpdatedCloneDirectories(updatedCloneDirectories)
+    genericRoutine.openClone(request)
+    otherRoutine.openClone(request)
+    assert(updateClone.call_count == 3)
+    assert(len(updatedCloneDirectories) == 1)
+
+
+class OfflineSessionCreator:
+    """Hands out placeholder sessions without contacting a platform API."""
+
+    def canHandleRepository(self, repositoryLocation):
+        return True
+
+    def connect(self, repositoryLocation, credentials):
+        return None
+
+    def release(self, session):
+        pass
+
+
+class SlowOnlineRoutine(routines.OnlineRepositoryRoutine):
+    """Waits on a pretend platform API for a while before responding with the URL."""
+
+    def getRequestType(self):
+        return requests.OnlineRoutineRequest
+
+    def githubImplementation(self, request, session):
+        time.sleep(0.05)
+        return responses.ResponseFactory().createSuccessResponse(
+            attachments=request.getRepositoryLocation().getURL())
+
+    def gitlabImplementation(self, request, session):
+        return self.githubImplementation(request, session)
+
+
+def test_OnlineRoutineEngine_runsBlockingImplementationsConcurrentlyWithinHostLimits():
+    engine = routines.OnlineRoutineEngine(concurrencyPerHost=3, hostLimits={"gitlab.com": 2})
+    urls = ["https://github.com/owner/repo{i}".format(i=i) for i in range(9)] + \
+        ["https://gitlab.com/owner/repo{i}".format(i=i) for i in range(4)]
+    routine = SlowOnlineRoutine()
+    routine.sessionCreator = OfflineSessionCreator()
+    onlineRequests = [requests.OnlineRoutineRequest(
+        repositoryURL=url, outputDirectory="./", token="ab5571mc1") for url in urls]
+    try:
+        start = time.perf_counter()
+        results = engine.executeRoutines([routine] * len(urls), onlineRequests)
+        elapsed = time.perf_counter() - start
+    finally:
+        engine.shutdown()
+
+    assert(all(response.wasSuccessful() for response in results))
+    assert([response.getAttachments()[0] for response in results] == urls)
+    assert(engine.getPeakConcurrency("github.com") == 3)
+    assert(engine.getPeakConcurrency("gitlab.com") == 2)
+    # Run one at a time, the 13 requests would take at least 0.65 seconds.
+    assert(elapsed < 0.5)
+    assert(not engine.isRunning())
@@ -1,6 +1,7 @@
 import pytest
 import reposcanner.data as data
 import datetime
+import os
 
 
 def test_AnnotatedCSVData_isDirectlyConstructible():
@@ -239,6 +240,260 @@ def test_YAMLData_canSupportNestedParametersForMiningRoutineConfigurations(
     assert(dataDict['routines'][1]['ExternalToolRoutine']['verbose'] == False)
 
 
+def test_AnnotatedCSVData_preservesAdditionalMetadataAcrossWriteAndRead(tmpdir):
+    sub = tmpdir.mkdir("datatest")
+    filePath = str(sub.join("csvtest.csv"))
+    dataEntity = data.AnnotatedCSVData(filePath)
+    dataEntity.setReposcannerExecutionID("aaaa")
+    dataEntity.setCreator("routine")
+    dataEntity.setDateCreated(datetime.date.today())
+    dataEntity.setColumnNames(["a"])
+    dataEntity.setColumnDatatypes(["str"])
+    dataEntity.setMetadataAttribute("headcommit", "0123abcd")
+    dataEntity.addRecord(["x"])
+    dataEntity.writeToFile()
+
+    dataEntityB = data.AnnotatedCSVData(filePath)
+    dataEntityB.readFromFile()
+    assert(dataEntityB.getMetadataAttribute("headcommit") == "0123abcd")
+    assert(dataEntityB.getRawRecords() == [["x"]])
+
+
+def test_AnnotatedCSVData_canStreamRecordsToDiskInChunks(tmpdir):
+    sub = tmpdir.mkdir("datatest")
+    filePath = str(sub.join("csvtest.csv"))
+    dataEntity = data.AnnotatedCSVData(filePath)
+    dataEntity.setReposcannerExecutionID("aaaa")
+    dataEntity.setCreator("routine")
+    dataEntity.setDateCreated(datetime.date.today())
+    dataEntity.setColumnNames(["a", "b"])
+    dataEntity.setColumnDatatypes(["str", "int"])
+    dataEntity.addRecord(["x", 0])
+
+    dataEntity.beginStreamingWrite(chunkSize=2)
+    assert(dataEntity.isStreaming())
+    for i in range(1, 6):
+        dataEntity.addRecord(["x", i])
+        assert(len(dataEntity.getRawRecords()) < 2)
+    assert(not dataEntity.fileExists())
+
+    dataEntity.writeToFile()
+    assert(not dataEntity.isStreaming())
+    assert(dataEntity.fileExists())
+    assert(not os.path.exists(filePath + ".partial"))
+    assert(dataEntity.getRawRecords() == [["x", str(i)] for i in range(6)])
+    assert(list(dataEntity.getDataFrame(applyDatatypes=False)["b"]) == [str(i) for i in range(6)])
+
+    dataEntityB = data.AnnotatedCSVData(filePath)
+    dataEntityB.readFromFile()
+    assert(dataEntityB.getCreator() == "routine")
+    assert(dataEntityB.getRawRecords() == dataEntity.getRawRecords())
+
+
+def test_AnnotatedCSVData_readsRecordsOnlyWhenTheyAreNeeded(tmpdir):
+    sub = tmpdir.mkdir("datatest")
+    filePath = str(sub.join("csvtest.csv"))
+    dataEntity = data.AnnotatedCSVData(filePath)
+    dataEntity.setCreator("routine")
+    dataEntity.setDateCreated(datetime.date.today())
+    dataEntity.setColumnNames(["a"])
+    dataEntity.setColumnDatatypes(["str"])
+    for i in range(3):
+        dataEntity.addRecord([str(i)])
+    dataEntity.writeToFile()
+
+    dataEntityB = data.AnnotatedCSVData(filePath)
+    dataEntityB.readFromFile()
+    assert(dataEntityB.getCreator() == "routine")
+    assert(not dataEntityB.areRecordsLoaded())
+    assert(dataEntityB.getRawRecords() == [["0"], ["1"], ["2"]])
+    assert(dataEntityB.areRecordsLoaded())
+
+    dataEntityB.unloadRecords()
+    assert(not dataEntityB.areRecordsLoaded())
+    assert(len(dataEntityB.getDataFrame()) == 3)
+
+    dataEntityB.addRecord(["3"])
+    with pytest.raises(RuntimeError):
+        dataEntityB.unloadRecords()
+    dataEntityB.writeToFile()
+    dataEntityB.unloadRecords()
+    assert(dataEntityB.getRecordsAsDicts()[3] == {"a": "3"})
+
+
+def test_AnnotatedParquetData_canRoundTripTypedRecordsAndMetadata(tmpdir):
+    pytest.importorskip("pyarrow")
+    sub = tmpdir.mkdir("datatest")
+    filePath = str(sub.join("test.parquet"))
+    dataEntity = data.DataEntityFactory().createAnnotatedParquetData(filePath)
+    timestamp = datetime.date.today()
+    dataEntity.setReposcannerExecutionID("19m397b")
+    dataEntity.setCreator("routine")
+    dataEntity.setDateCreated(timestamp)
+    dataEntity.setProjectID("ABC552")
+    dataEntity.setProjectName("QuantumSorcery")
+    dataEntity.setURL("https://www.github.com/quantsci/quantumsorcery/")
+    dataEntity.setColumnNames(["authorEmail", "insertions", "namesOfFilesChanged"])
+    dataEntity.setColumnDatatypes(["str", "int", "list"])
+    dataEntity.setMetadataAttribute("headcommit", "0123abcd")
+    dataEntity.addRecord(["jsmith@gmail.com", 3, "a.py;b.py"])
+    dataEntity.addRecord(["alice@llnl.gov", "0", ""])
+    dataEntity.writeToFile()
+
+    dataEntityB = data.AnnotatedParquetData(filePath)
+    dataEntityB.readFromFile()
+    assert(not dataEntityB.areRecordsLoaded())
+    assert(dataEntityB.getDateCreated() == timestamp)
+    assert(dataEntityB.getURL() == "https://www.github.com/quantsci/quantumsorcery/")
+    assert(dataEntityB.getMetadataAttribute("headcommit") == "0123abcd")
+    assert(dataEntityB.validateMetadata())
+
+    emails = dataEntityB.getDataFrame(columns=["authorEmail"])
+    assert(list(emails.columns) == ["authorEmail"])
+    assert(not dataEntityB.areRecordsLoaded())
+
+    frame = dataEntityB.getDataFrame()
+    assert(str(frame["insertions"].dtype) == "int64")
+    assert(list(frame["namesOfFilesChanged"]) == [["a.py", "b.py"], []])
+    assert(dataEntityB.getRawRecords() == [["jsmith@gmail.com", 3, "a.py;b.py"],
+                                           ["alice@llnl.gov", 0, ""]])
+
+
+def test_AnnotatedParquetData_canStreamRecordsToDisk(tmpdir):
+    pytest.importorskip("pyarrow")
+    sub = tmpdir.mkdir("datatest")
+    filePath = str(sub.join("test.parquet"))
+    dataEntity = data.AnnotatedParquetData(filePath)
+    dataEntity.setCreator("routine")
+    dataEntity.setColumnNames(["a", "b"])
+    dataEntity.setColumnDatatypes(["str", "int"])
+    dataEntity.beginStreamingWrite(chunkSize=2)
+    for i in range(5):
+        dataEntity.addRecord(["x", i])
+    dataEntity.writeToFile()
+
+    dataEntityB = data.AnnotatedParquetData(filePath)
+    dataEntityB.readFromFile()
+    assert(dataEntityB.getCreator() == "routine")
+    assert(dataEntityB.getRawRecords() == [["x", i] for i in range(5)])
+
+
+def test_AnnotatedCSVData_appliesColumnDatatypesToDataFrames(tmpdir):
+    sub = tmpdir.mkdir("datatest")
+    filePath = str(sub.join("csvtest.csv"))
+    dataEntity = data.AnnotatedCSVData(filePath)
+    dataEntity.setCreator("routine")
+    dataEntity.setDateCreated(datetime.date.today())
+    dataEntity.setColumnNames(["email", "message", "insertions", "files", "misdeclared"])
+    dataEntity.setColumnDatatypes(["str", "str", "int", "list", "int"])
+    for i in range(4):
+        dataEntity.addRecord(["a@b.com", "message {i}".format(i=i), i, "x.py;y.py", "n/a"])
+    dataEntity.writeToFile()
+
+    dataEntityB = data.AnnotatedCSVData(filePath)
+    dataEntityB.readFromFile()
+    frame = dataEntityB.getDataFrame(applyDatatypes=True)
+    assert(str(frame["email"].dtype) == "category")
+    assert(str(frame["message"].dtype) != "category")
+    assert(str(frame["insertions"].dtype) == "int64")
+    assert(frame["insertions"].sum() == 6)
+    assert(frame["files"][0] == ["x.py", "y.py"])
+    assert(list(frame["misdeclared"]) == ["n/a"] * 4)
+
+    rawFrame = dataEntityB.getDataFrame()
+    assert(list(rawFrame["insertions"]) == ["0", "1", "2", "3"])
+
+
+def test_AnnotatedCSVData_cachesDataFramesUntilRecordsChange():
+    data.DataFrameCache().clear()
+    dataEntity = data.AnnotatedCSVData("routineresults.csv")
+    dataEntity.setColumnNames(["a"])
+    dataEntity.setColumnDatatypes(["int"])
+    dataEntity.addRecord([1])
+
+    frame = dataEntity.getDataFrame(applyDatatypes=True)
+    assert(len(data.DataFrameCache()) == 1)
+    frame["b"] = 2
+    frame.loc[0, "a"] = 5
+    assert(list(dataEntity.getDataFrame(applyDatatypes=True).columns) == ["a"])
+    assert(list(dataEntity.getDataFrame(applyDatatypes=True)["a"]) == [1])
+    assert(len(data.DataFrameCache()) == 1)
+    dataEntity.getDataFrame()
+    assert(len(data.DataFrameCache()) == 2)
+
+    dataEntity.addRecord([2])
+    assert(len(data.DataFrameCache()) == 0)
+    assert(list(dataEntity.getDataFrame(applyDatatypes=True)["a"]) == [1, 2])
+
+    del dataEntity
+    assert(len(data.DataFrameCache()) == 0)
+
+
+def test_DataFrameCache_evictsLeastRecentlyUsedFramesToStayWithinBudget():
+    cache = data.DataFrameCache()
+    cache.clear()
+    originalBudget = cache.getBudget()
+    try:
+        entities = []
+        for i in range(3):
+            entity = data.AnnotatedCSVData("routineresults{i}.csv".format(i=i))
+            entity.setColumnNames(["a"])
+            entity.setColumnDatatypes(["int"])
+            for j in range(100):
+                entity.addRecord([j])
+            entities.append(entity)
+        frameSize = cache.estimateSize(entities[0].getDataFrame())
+        cache.setBudget(frameSize * 2)
+        entities[1].getDataFrame()
+        entities[0].getDataFrame()
+        entities[2].getDataFrame()
+        assert(len(cache) == 2)
+        assert(cache.getSize() <= cache.getBudget())
+        assert(cache.get(entities[1]._dataFrameCacheID, (False, None, False)) is None)
+        assert(cache.get(entities[0]._dataFrameCacheID, (False, None, False)) is not None)
+    finally:
+        cache.setBudget(originalBudget)
+        cache.clear()
+
+
+def test_AnnotatedCSVData_bulkReaderRoundTripsAwkwardValues(tmpdir):
+    sub = tmpdir.mkdir("datatest")
+    filePath = str(sub.join("csvtest.csv"))
+    dataEntity = data.AnnotatedCSVData(filePath)
+    dataEntity.setCreator("routine")
+    dataEntity.setDateCreated(datetime.date.today())
+    dataEntity.setProjectName("Quantum, Sorcery")
+    dataEntity.setColumnNames(["a", "b", "c"])
+    dataEntity.setColumnDatatypes(["str", "str", "str"])
+    records = [["comma, inside", "pipe | inside", "new\nline"],
+               ["", "NA", "null"],
+               ["007", " padded ", "#notmetadata"]]
+    for record in records:
+        dataEntity.addRecord(record)
+    dataEntity.writeToFile()
+
+    dataEntityB = data.AnnotatedCSVData(filePath)
+    dataEntityB.readFromFile()
+    assert(dataEntityB.getRawRecords() == records)
+
+    dataEntityC = data.AnnotatedCSVData(filePath)
+    dataEntityC.readFromFile()
+    assert(dataEntityC.getDataFrame(applyDatatypes=False).values.tolist() == records)
+    assert(list(dataEntityC.getDataFrame(columns=["c", "a"]).columns) == ["c", "a"])
+    assert(not dataEntityC.areRecordsLoaded())
+
+
+def test_AnnotatedCSVData_canReadRowsOfDifferentLengths(tmpdir):
+    sub = tmpdir.mkdir("datatest")
+    filePath = str(sub.join("external.csv"))
+    with open(filePath, 'w') as outfile:
+        outfile.write("login,FID\njsmith,1\nalice\nbob,2,extra\n")
+    dataEntity = data.AnnotatedCSVData(filePath)
+    dataEntity.readFromFile()
+    assert(dataEntity.getRawRecords() == [["login", "FID"], ["jsmith", "1"], ["alice"],
+                                          ["bob", "2", "extra"]])
+
+
 def test_DataEntityStore_isDirectlyConstructible():
     store = data.DataEntityStore()
 
@@ -326,3 +581,129 @@ def test_DataEntityStore_canFilterByCriteria():
 
     onlyAdAstraRelated = store.getByCriteria(criteria_OnlyAdAstraRelated)
     assert(len(onlyAdAstraRelated) == 2)
+
+
+def test_DataEntityStore_canFilterByDeclarativeCriteriaUsingIndexes():
+    store = data.DataEntityStore()
+    configuration = data.YAMLData("config.yaml")
+    store.insert(configuration)
+    entities = []
+    for i in range(30):
+        entity = data.AnnotatedCSVData("results{i}.csv".format(i=i))
+        entity.setCreator(["CommitCountRoutine", "ContributorListRoutine", "external"][i % 3])
+        entity.setURL("https://github.com/owner/repo{i}".format(i=i % 5))
+        entity.setProjectID("P{i}".format(i=i % 2))
+        store.insert(entity)
+        entities.append(entity)
+
+    commitCounts = store.getByCriteria(data.DataCriteria(creator="CommitCountRoutine"))
+    assert(commitCounts == entities[0::3])
+
+    criteria = data.DataCriteria(creator=["CommitCountRoutine", "external"],
+                                 url="https://github.com/owner/repo0", projectID="P0")
+    expected = [entity for entity in entities if criteria(entity)]
+    assert(store.getByCriteria(criteria) == expected)
+    assert(len(expected) > 0)
+
+    assert(store.getByCriteria(data.DataCriteria(entityClass=data.YAMLData)) == [configuration])
+    assert(len(store.getByCriteria(data.DataCriteria(
+        entityClass=data.ReposcannerDataEntity))) == 31)
+    assert(store.getByCriteria(data.DataCriteria(
+        creator="CommitCountRoutine",
+        predicate=lambda entity: entity.getFilePath() == "results3.csv")) == [entities[3]])
+    assert(store.getByCriteria(data.DataCriteria(creator="NoSuchRoutine")) == [])
+    assert(not data.DataCriteria(creator="CommitCountRoutine")("garbage"))
+
+
+def test_DataEntityStore_keepsIndexesUpToDateOnRemovalAndReindexing():
+    store = data.DataEntityStore()
+    entityA = data.AnnotatedCSVData("a.csv")
+    entityB = data.AnnotatedCSVData("b.csv")
+    entityA.setCreator("CommitCountRoutine")
+    entityB.setCreator("CommitCountRoutine")
+    store.insert(entityA)
+    store.insert(entityB)
+
+    store.remove(entityA)
+    assert(store.getByCriteria(data.DataCriteria(creator="CommitCountRoutine")) == [entityB])
+
+    entityB.setCreator("ContributorListRoutine")
+    store.reindex(entityB)
+    assert(store.getByCriteria(data.DataCriteria(creator="CommitCountRoutine")) == [])
+    assert(store.getByCriteria(data.DataCriteria(
+        creator="ContributorListRoutine")) == [entityB])
+
+    try:
+        store.remove(entityA)
+        assert(False)
+    except ValueError:
+        pass
+
+
+def test_DataEntityStore_canSpillRecordsToDiskUnderAMemoryCeiling(tmpdir):
+    sub = tmpdir.mkdir("spilltest")
+    entities = []
+    for i in range(3):
+        entity = data.AnnotatedCSVData(str(sub.join("results{i}.csv".format(i=i))))
+        entity.setCreator("CommitCountRoutine")
+        entity.setDateCreated(datetime.date.today())
+        entity.setColumnNames(["a", "b"])
+        entity.setColumnDatatypes(["str", "str"])
+        for j in range(100):
+            entity.addRecord([str(j), "value{j}".format(j=j)])
+        entity.writeToFile()
+        entities.append(entity)
+    unsaved = data.AnnotatedCSVData(str(sub.join("unsaved.csv")))
+    unsaved.setCreator("CommitCountRoutine")
+    unsaved.addRecord(["x", "y"])
+
+    store = data.DataEntityStore(spillToDisk=True)
+    for entity in entities + [unsaved]:
+        store.insert(entity)
+    assert(not any(entity.areRecordsLoaded() for entity in entities))
+    assert(unsaved.getRawRecords() == [["x", "y"]])
+
+    recordsSize = entities[0].getRecordsMemoryUsage()
+    assert(recordsSize == 0)
+    criteria = data.DataCriteria(creator="CommitCountRoutine")
+    for entity in store.getByCriteria(criteria):
+        assert(len(entity.getRawRecords()) > 0)
+    recordsSize = entities[0].getRecordsMemoryUsage()
+    assert(recordsSize > 0)
+    assert(store.getRecordsMemoryUsage() >= 3 * recordsSize)
+
+    # Only two of the files fit under the ceiling, so the least recently fetched one is
+    # unloaded. It is read back from disk when it is used again.
+    store.setMemoryCeiling(2 * recordsSize + unsaved.getRecordsMemoryUsage())
+    assert(not entities[0].areRecordsLoaded())
+    assert(entities[1].areRecordsLoaded() and entities[2].areRecordsLoaded())
+    assert(entities[0].getRawRecords()[99] == ["99", "value99"])
+
+    store.getByCriteria(data.DataCriteria(entityClass=data.AnnotatedCSVData,
+                                          predicate=lambda entity: entity is entities[0]))
+    assert(entities[0].areRecordsLoaded())
+    assert(not entities[1].areRecordsLoaded())
+    assert(unsaved.areRecordsLoaded())
+
+
+def test_DataEntityStore_enforcesMemoryCeilingAsFetchedRecordsAreLoaded(tmpdir):
+    entities = []
+    for i in range(3):
+        entity = data.AnnotatedCSVData(str(tmpdir.join("results{i}.csv".format(i=i))))
+        entity.setCreator("CommitCountRoutine")
+        entity.setColumnNames(["a", "b"])
+        entity.setColumnDatatypes(["str", "str"])
+        for j in range(100):
+            entity.addRecord([str(j), "value{j}".format(j=j)])
+        entity.writeToFile()
+        entities.append(entity)
+    recordsSize = entities[0].getRecordsMemoryUsage()
+
+    # The records are only read back after getByCriteria() returns, as each is used.
+    store = data.DataEntityStore(spillToDisk=True, memoryCeiling=recordsSize * 3 // 2)
+    for entity in entities:
+        store.insert(entity)
+    for entity in store.getByCriteria(data.DataCriteria(creator="CommitCountRoutine")):
+        assert(len(entity.getRawRecords()) == 100)
+        assert(store.getRecordsMemoryUsage() <= store.getMemoryCeiling())
+    assert([entity.areRecordsLoaded() for entity in entities] == [False, False, True])
@@ -1,4 +1,11 @@
 import pytest
+import http.server
+import json
+import threading
+import time
+import github
+import gitlab
+import requests
 import reposcanner.git as gitEntities
 
 
@@ -354,6 +361,178 @@ def test_GitHubAPISessionCreator_rejectsInappropriateRepositories():
     assert(not githubCreator.canHandleRepository(repositoryLocationGarbage))
 
 
+class ConditionalRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves a page with an ETag, answering requests that already have it with a 304."""
+    conditionalRequests = 0
+
+    def do_GET(self):
+        etag = '"{path}-v1"'.format(path=self.path.strip("/"))
+        if self.headers.get("If-None-Match") == etag:
+            ConditionalRequestHandler.conditionalRequests += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("X-RateLimit-Remaining", "4999")
+            self.end_headers()
+            return
+        body = json.dumps({"page": self.path, "padding": "x" * 1000}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-RateLimit-Remaining", "5000")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def conditionalServer():
+    ConditionalRequestHandler.conditionalRequests = 0
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ConditionalRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{port}".format(port=server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_CachingHTTPAdapter_revalidatesCachedResponses(conditionalServer, tmpdir):
+    cache = gitEntities.HTTPResponseCache(str(tmpdir))
+    session = requests.Session()
+    session.mount("http://", gitEntities.CachingHTTPAdapter(cache))
+    first = session.get(conditionalServer + "/commits")
+    second = session.get(conditionalServer + "/commits")
+    assert(ConditionalRequestHandler.conditionalRequests == 1)
+    assert(cache.getMisses() == 1 and cache.getHits() == 1)
+    assert(second.status_code == 200)
+    assert(second.json() == first.json())
+    assert(second.headers["X-RateLimit-Remaining"] == "4999")
+
+    # The cache persists across runs.
+    reopenedCache = gitEntities.HTTPResponseCache(str(tmpdir))
+    assert(len(reopenedCache) == 1)
+    session.mount("http://", gitEntities.CachingHTTPAdapter(reopenedCache))
+    assert(session.get(conditionalServer + "/commits").json() == first.json())
+    assert(reopenedCache.getHits() == 1)
+
+
+def test_HTTPResponseCache_evictsLeastRecentlyUsedResponses(conditionalServer, tmpdir):
+    cache = gitEntities.HTTPResponseCache(str(tmpdir), maximumSize=3000)
+    session = requests.Session()
+    session.mount("http://", gitEntities.CachingHTTPAdapter(cache))
+    for page in ["a", "b", "a", "c"]:
+        session.get(conditionalServer + "/" + page)
+    assert(cache.getEvictions() == 1)
+    assert(cache.getSize() <= 3000)
+    session.get(conditionalServer + "/a")
+    session.get(conditionalServer + "/b")
+    assert(cache.getHits() == 2)
+    assert(cache.getMisses() == 4)
+
+
+def test_VCSAPISessionCompositeCreator_passesResponseCacheToChildren(tmpdir):
+    cache = gitEntities.HTTPResponseCache(str(tmpdir))
+    compositeCreator = gitEntities.VCSAPISessionCompositeCreator()
+    githubCreator = gitEntities.GitHubAPISessionCreator()
+    compositeCreator.addChild(githubCreator)
+    compositeCreator.setResponseCache(cache)
+    assert(githubCreator.getResponseCache() == cache)
+
+
+def test_GitHubRateLimitGovernor_pausesUntilResetWhenQuotaIsExhausted():
+    governor = gitEntities.GitHubRateLimitGovernor()
+    governor.clear()
+    tokenKey = gitEntities.GitHubRateLimitGovernor.getTokenKey("abc123")
+    assert("abc123" not in tokenKey)
+    resetTime = time.time() + 0.3
+    governor.observe(tokenKey, remaining=governor.getReserve(), limit=5000, resetTime=resetTime)
+    governor.acquire(tokenKey)
+    assert(time.time() >= resetTime)
+    metrics = governor.getMetrics()[(tokenKey, "core")]
+    assert(metrics["requests"] == 1)
+    assert(metrics["pauses"] == 1)
+    assert(metrics["secondsPaused"] > 0)
+    governor.clear()
+
+
+def test_GitHubRateLimitGovernor_keepsLowestRemainingQuotaOfAWindow():
+    governor = gitEntities.GitHubRateLimitGovernor()
+    governor.clear()
+    resetTime = time.time() + 3600
+    governor.observe("token", remaining=4000, limit=5000, resetTime=resetTime)
+    governor.observe("token", remaining=4500, limit=5000, resetTime=resetTime)
+    governor.acquire("token")
+    assert(governor.getMetrics()[("token", "core")]["remaining"] == 3999)
+    governor.observe("token", remaining=4999, limit=5000, resetTime=resetTime + 3600)
+    assert(governor.getMetrics()[("token", "core")]["remaining"] == 4999)
+    governor.clear()
+
+
+def test_GitHubRateLimitGovernor_tracksEachResourceSeparately():
+    governor = gitEntities.GitHubRateLimitGovernor()
+    governor.clear()
+    resetTime = time.time() + 3600
+    governor.observe("token", remaining=4000, limit=5000, resetTime=resetTime, resource="core")
+    governor.observe("token", remaining=governor.getReserve(), limit=5000,
+                     resetTime=resetTime, resource="graphql")
+    start = time.time()
+    governor.acquire("token", "core")
+    assert(time.time() - start < 1)
+    metrics = governor.getMetrics()
+    assert(metrics[("token", "core")]["remaining"] == 3999)
+    assert(metrics[("token", "core")]["pauses"] == 0)
+    assert(metrics[("token", "graphql")]["remaining"] == governor.getReserve())
+    governor.clear()
+
+
+def test_GitHubRateLimitGovernor_namesResourceOfRequests():
+    getResource = gitEntities.GitHubRateLimitGovernor.getResource
+    assert(getResource("/repos/owner/repo/commits?page=2") == "core")
+    assert(getResource("https://api.github.com/graphql") == "graphql")
+    assert(getResource("/api/v3/search/issues?q=bug") == "search")
+    assert(getResource("/search/code?q=def") == "code_search")
+
+
+def test_GitHubHTTPSConnection_recordsQuotaOfEachResourceReportedToIt():
+    governor = gitEntities.GitHubRateLimitGovernor()
+    governor.clear()
+    resetTime = int(time.time()) + 3600
+
+    class QuotaReportingAdapter(requests.adapters.BaseAdapter):
+        def send(self, request, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = b"{}"
+            response.request = request
+            response.url = request.url
+            isGraphQL = request.url.endswith("/graphql")
+            response.headers = requests.structures.CaseInsensitiveDict({
+                "X-RateLimit-Remaining": "4321" if isGraphQL else "4999",
+                "X-RateLimit-Limit": "5000",
+                "X-RateLimit-Reset": str(resetTime),
+                "X-RateLimit-Resource": "graphql" if isGraphQL else "core"})
+            return response
+
+        def close(self):
+            pass
+
+    tokenKey = gitEntities.GitHubRateLimitGovernor.getTokenKey("abc123")
+    connection = gitEntities.GitHubHTTPSConnection("api.github.com", tokenKey=tokenKey)
+    connection.session.mount("https://", QuotaReportingAdapter())
+    connection.request("GET", "/repos/owner/repo", None, {})
+    connection.getresponse()
+    connection.request("POST", "/graphql", "{}", {})
+    connection.getresponse()
+    metrics = governor.getMetrics()
+    assert(metrics[(tokenKey, "core")]["requests"] == 1)
+    assert(metrics[(tokenKey, "core")]["remaining"] == 4999)
+    assert(metrics[(tokenKey, "graphql")]["requests"] == 1)
+    assert(metrics[(tokenKey, "graphql")]["remaining"] == 4321)
+    governor.clear()
+
+
 def test_VCSAPISessionCompositeCreator_isConstructibleByFactory():
     factory = gitEntities.GitEntityFactory()
     githubCreator = factory.createVCSAPISessionCompositeCreator()
@@ -445,3 +624,138 @@ def test_GitlabAPISessionCreator_usernameAndPasswordComboWillTriggerRuntimeError
         username="name", password="password", token=None)
     with pytest.raises(RuntimeError):
         gitlabCreator.connect(repositoryLocation, credentials)
+
+
+def createGitlabClientWithUsers(mocker, numberOfUsers, privateToken="ab5571mc1"):
+    session = mocker.Mock(private_token=privateToken, oauth_token=None, job_token=None)
+    session.url = "https://gitlab.example.com"
+    users = []
+    for i in range(numberOfUsers):
+        user = mocker.Mock(attributes={"username": "user{i}".format(i=i),
+                                       "email": "User{i}@example.com".format(i=i),
+                                       "public_email": "" if i % 2 else "user{i}@public.org".format(i=i)})
+        user.emails.list.return_value = [mocker.Mock(email="User{i}@Secondary.net".format(i=i))]
+        users.append(user)
+    session.users.list.return_value = users
+    return session
+
+
+def test_GitlabEmailIndex_isBuiltOncePerHostAndReusedFromDisk(mocker, tmpdir):
+    session = createGitlabClientWithUsers(mocker, numberOfUsers=4)
+    emailIndex = gitEntities.GitlabEmailIndex(indexDirectory=str(tmpdir))
+    emailIndex.clear()
+    emails = emailIndex.getIndex(session)
+    assert(emails["user1@example.com"] == "user1")
+    assert(emails["user2@public.org"] == "user2")
+    assert("user3@secondary.net" not in emails)
+    assert(len(emails) == 6)
+    assert(gitEntities.GitlabEmailIndex().getIndex(session) == emails)
+    assert(session.users.list.call_count == 1)
+    # By default the index makes no requests per user.
+    assert(not any(user.emails.list.called for user in session.users.list.return_value))
+
+    # A later run reads the index kept on disk until it expires.
+    emailIndex.clear()
+    assert(emailIndex.getIndex(session) == emails)
+    assert(session.users.list.call_count == 1)
+    emailIndex.clear()
+    expiredIndex = gitEntities.GitlabEmailIndex(indexDirectory=str(tmpdir), ttl=0)
+    assert(expiredIndex.getIndex(session) == emails)
+    assert(session.users.list.call_count == 2)
+    emailIndex.clear()
+
+
+def test_GitlabEmailIndex_keepsIndexOfEachTokenSeparately(mocker, tmpdir):
+    adminSession = createGitlabClientWithUsers(mocker, numberOfUsers=4, privateToken="admin")
+    userSession = createGitlabClientWithUsers(mocker, numberOfUsers=4, privateToken="user")
+    for user in userSession.users.list.return_value:
+        user.emails.list.side_effect = gitlab.exceptions.GitlabListError("403 Forbidden")
+    emailIndex = gitEntities.GitlabEmailIndex(indexDirectory=str(tmpdir), listSecondaryEmails=True)
+    emailIndex.clear()
+    adminEmails = emailIndex.getIndex(adminSession)
+    userEmails = emailIndex.getIndex(userSession)
+    assert(emailIndex.isListingSecondaryEmails())
+    assert(adminEmails["user3@secondary.net"] == "user3")
+    assert(len(adminEmails) == 10)
+    assert("user3@secondary.net" not in userEmails)
+    # Secondary emails are not asked for again once GitLab refuses to list them.
+    assert(sum(user.emails.list.call_count for user in userSession.users.list.return_value) == 1)
+    assert(userSession.users.list.call_count == 1)
+    emailIndex.clear()
+    assert(emailIndex.getIndex(adminSession) == adminEmails)
+    assert(len(tmpdir.listdir()) == 2)
+    assert(not any("admin" in str(path) for path in tmpdir.listdir()))
+    emailIndex.clear()
+
+
+class GitlabProjectHandler(http.server.BaseHTTPRequestHandler):
+    """Answers every request for a GitLab project over keep-alive connections."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps({"id": 1, "path_with_namespace": "owner/repo"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_VCSAPIClientPool_reusesClientsAndConnectionsAcrossRepositories():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), GitlabProjectHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = "http://127.0.0.1:{port}".format(port=server.server_address[1])
+    credentials = gitEntities.VersionControlPlatformCredentials(token="ab5571mc1")
+    creator = gitEntities.GitlabAPISessionCreator()
+
+    def connectToRepositories(pool):
+        creator.setClientPool(pool)
+        for name in ["repoA", "repoB", "repoC"]:
+            repositoryLocation = gitEntities.RepositoryLocation(
+                url="{url}/owner/{name}".format(url=url, name=name))
+            session = creator.connect(repositoryLocation, credentials)
+            creator.release(session)
+        return pool.getMetrics()
+
+    try:
+        metrics = connectToRepositories(gitEntities.VCSAPIClientPool())
+        assert(metrics == {"clientsCreated": 1, "clientsReused": 2, "connections": 1})
+        pool = gitEntities.VCSAPIClientPool()
+        pool.setEnabled(False)
+        metrics = connectToRepositories(pool)
+        assert(metrics == {"clientsCreated": 3, "clientsReused": 0, "connections": 3})
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_VCSAPIClientPool_lendsEachClientToOneSessionAtATime():
+    pool = gitEntities.VCSAPIClientPool()
+    credentials = gitEntities.VersionControlPlatformCredentials(token="ab5571mc1")
+    key = gitEntities.VCSAPIClientPool.getKey(
+        gitEntities.RepositoryLocation.VersionControlPlatform.GITHUB, "api.github.com",
+        credentials)
+    assert("ab5571mc1" not in str(key))
+    first = pool.acquire(key, object)
+    second = pool.acquire(key, object)
+    assert(first is not second)
+    pool.lend("sessionA", key, first)
+    pool.release("sessionA")
+    assert(pool.acquire(key, object) is first)
+    assert(gitEntities.VCSAPIClientPool().getMetrics()["clientsCreated"] == 0)
+
+
+def test_GitHubAPISessionCreator_refusesPyGithubWithoutReplaceableConnectionClass(mocker):
+    creator = gitEntities.GitHubAPISessionCreator()
+    session = github.Github(auth=github.Auth.Token("abc123"))
+    creator._useConnectionClass(session)
+    connection = session.requester._Requester__connectionClass("api.github.com")
+    assert(isinstance(connection, gitEntities.GitHubHTTPSConnection))
+    unsupportedSession = mocker.Mock()
+    unsupportedSession.requester = object()
+    with pytest.raises(RuntimeError):
+        creator._useConnectionClass(unsupportedSession)
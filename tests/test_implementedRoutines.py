@@ -1,6 +1,13 @@
+import os
+import re
 import pytest
 import reposcanner.contrib as contributionRoutines
 import reposcanner.requests
+import reposcanner.routines
+import reposcanner.data
+import reposcanner.git
+import pygit2
+from repositoryHelpers import addCommitsToRepository, createBareRepositoryWithCommits
 
 
 def test_ContributorAccountListRoutineRequest_isDirectlyConstructible():
@@ -31,3 +38,433 @@ def test_ContributorAccountListRoutine_willRejectInAppropriateRequest():
 
     assert(not isinstance(request, routine.getRequestType()))
     assert(not routine.canHandleRequest(request))
+
+
+def test_CommitInfoMiningAndOfflineCommitCounts_canShareOneCommitWalk(tmp_path):
+    createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=3)
+    url = "https://github.com/owner/repo"
+    miningRequest = contributionRoutines.CommitInfoMiningRoutineRequest(
+        repositoryURL=url, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path))
+    countsRequest = contributionRoutines.OfflineCommitCountsRoutineRequest(
+        repositoryURL=url, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path))
+    miningRoutine = contributionRoutines.CommitInfoMiningRoutine()
+    countsRoutine = contributionRoutines.OfflineCommitCountsRoutine()
+    assert(miningRoutine.supportsSharedCommitWalk())
+    assert(countsRoutine.supportsSharedCommitWalk())
+
+    miningResponse, countsResponse = reposcanner.routines.OfflineRepositoryRoutine.executeWithSharedCommitWalk(
+        [miningRoutine, countsRoutine], [miningRequest, countsRequest])
+
+    assert(miningResponse.wasSuccessful())
+    assert(countsResponse.wasSuccessful())
+    commitLog = miningResponse.getAttachments()[0]
+    assert(len(commitLog.getRawRecords()) == 3)
+    assert(commitLog.getRawRecords()[0][12] == "file2.txt")
+    assert(commitLog.getRawRecords()[2][12] == "file0.txt")
+    commitCounts = countsResponse.getAttachments()[0].getRecordsAsDicts()
+    assert({entry["email"]: entry["commitCount"] for entry in commitCounts} ==
+           {"jsmith@gmail.com": 2, "alice@llnl.gov": 1})
+
+
+def test_CommitInfoMiningRoutine_removesPartialOutputWhenTheWalkFails(mocker, tmp_path):
+    repository = createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=3)
+    request = contributionRoutines.CommitInfoMiningRoutineRequest(
+        repositoryURL="https://github.com/owner/repo", outputDirectory=str(tmp_path),
+        workspaceDirectory=str(tmp_path))
+    routine = contributionRoutines.CommitInfoMiningRoutine()
+    routine.setConfigurationParameters({"incremental": True})
+    assert(routine.run(request).wasSuccessful())
+    outputFiles = sorted(os.listdir(str(tmp_path)))
+
+    # A failure partway through an incremental update leaves the earlier file untouched.
+    addCommitsToRepository(repository, numberOfCommits=2)
+    mocker.patch.object(contributionRoutines.CommitInfoMiningVisitor, "visitCommit",
+                        side_effect=RuntimeError("walk failed"))
+    response = routine.run(request)
+    assert(not response.wasSuccessful())
+    assert(sorted(os.listdir(str(tmp_path))) == outputFiles)
+    assert(not any(name.endswith(".partial") for name in os.listdir(str(tmp_path))))
+
+    mocker.stopall()
+    response = routine.run(request)
+    assert(response.wasSuccessful())
+    assert(len(response.getAttachments()[0].getRawRecords()) == 5)
+
+
+def test_CommitInfoMiningRoutine_incrementalModeOnlyMinesNewCommits(tmp_path):
+    repository = createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=3)
+    request = contributionRoutines.CommitInfoMiningRoutineRequest(
+        repositoryURL="https://github.com/owner/repo", outputDirectory=str(tmp_path),
+        workspaceDirectory=str(tmp_path))
+    routine = contributionRoutines.CommitInfoMiningRoutine()
+    routine.setConfigurationParameters({"incremental": True})
+    assert(routine.isIncremental())
+
+    firstResponse = routine.run(request)
+    assert(firstResponse.wasSuccessful())
+    firstLog = firstResponse.getAttachments()[0]
+    assert(firstLog.getMetadataAttribute("headcommit") == str(repository.head.target))
+
+    addCommitsToRepository(repository, numberOfCommits=2)
+    secondResponse = routine.run(request)
+    assert(secondResponse.wasSuccessful())
+    secondLog = secondResponse.getAttachments()[0]
+    records = secondLog.getRawRecords()
+    assert(len(records) == 5)
+    assert([record[12] for record in records[3:]] == ["file4.txt", "file3.txt"])
+    assert(secondLog.getMetadataAttribute("headcommit") == str(repository.head.target))
+
+    # The file written by the second run must be readable by a third.
+    thirdResponse = routine.run(request)
+    assert("up to date" in thirdResponse.getMessage())
+    assert(len(thirdResponse.getAttachments()[0].getRawRecords()) == 5)
+
+
+def test_CommitInfoMiningRoutine_skipsExistingFilesWhenNotIncremental(tmp_path):
+    repository = createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=2)
+    request = contributionRoutines.CommitInfoMiningRoutineRequest(
+        repositoryURL="https://github.com/owner/repo", outputDirectory=str(tmp_path),
+        workspaceDirectory=str(tmp_path))
+    routine = contributionRoutines.CommitInfoMiningRoutine()
+    assert(not routine.isIncremental())
+    routine.run(request)
+
+    addCommitsToRepository(repository, numberOfCommits=1)
+    response = routine.run(request)
+    assert("already exists" in response.getMessage())
+    assert(len(response.getAttachments()[0].getRawRecords()) == 2)
+
+
+def test_OfflineCommitCountsRoutine_reusesCachedResultsUntilRepositoryChanges(tmp_path):
+    repository = createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=2)
+    cache = reposcanner.routines.RoutineResultCache(str(tmp_path / "cache"))
+    routine = contributionRoutines.OfflineCommitCountsRoutine()
+    routine.setResultCache(cache)
+
+    def runInNewOutputDirectory(name):
+        outputDirectory = tmp_path / name
+        outputDirectory.mkdir()
+        request = contributionRoutines.OfflineCommitCountsRoutineRequest(
+            repositoryURL="https://github.com/owner/repo", outputDirectory=str(outputDirectory),
+            workspaceDirectory=str(tmp_path))
+        response = routine.run(request)
+        assert(response.wasSuccessful())
+        counts = response.getAttachments()[0]
+        assert(os.path.dirname(counts.getFilePath()) == str(outputDirectory))
+        return response, {entry["email"]: int(entry["commitCount"])
+                          for entry in counts.getRecordsAsDicts()}
+
+    firstResponse, firstCounts = runInNewOutputDirectory("first")
+    assert(firstCounts == {"jsmith@gmail.com": 1, "alice@llnl.gov": 1})
+    assert((cache.getHits(), cache.getMisses()) == (0, 1))
+
+    secondResponse, secondCounts = runInNewOutputDirectory("second")
+    assert("unchanged" in secondResponse.getMessage())
+    assert(secondCounts == firstCounts)
+    assert((cache.getHits(), cache.getMisses()) == (1, 1))
+
+    addCommitsToRepository(repository, numberOfCommits=1)
+    thirdResponse, thirdCounts = runInNewOutputDirectory("third")
+    assert(thirdCounts == {"jsmith@gmail.com": 2, "alice@llnl.gov": 1})
+    assert((cache.getHits(), cache.getMisses()) == (1, 2))
+
+    routine.setConfigurationParameters({"someParameter": 1})
+    runInNewOutputDirectory("fourth")
+    assert((cache.getHits(), cache.getMisses()) == (1, 3))
+
+
+def test_CommitInfoMiningRoutine_doesNotCacheSkippedResults(tmp_path):
+    repository = createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=2)
+    cache = reposcanner.routines.RoutineResultCache(str(tmp_path / "cache"))
+    request = contributionRoutines.CommitInfoMiningRoutineRequest(
+        repositoryURL="https://github.com/owner/repo", outputDirectory=str(tmp_path),
+        workspaceDirectory=str(tmp_path))
+    routine = contributionRoutines.CommitInfoMiningRoutine()
+    routine.setResultCache(cache)
+    routine.run(request)
+
+    # The existing two-commit file is skipped, not mined, so it must not be cached as the
+    # result for the new HEAD.
+    addCommitsToRepository(repository, numberOfCommits=1)
+    assert("already exists" in routine.run(request).getMessage())
+    assert("already exists" in routine.run(request).getMessage())
+    assert(cache.getHits() == 0)
+
+
+def test_CommitInfoMiningVisitor_reportsBothPathsButOneFileForRenames(tmp_path):
+    repository = createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=1)
+    builder = repository.TreeBuilder()
+    builder.insert("renamed.txt", repository[repository.head.target].tree["file0.txt"].id,
+                   pygit2.GIT_FILEMODE_BLOB)
+    signature = pygit2.Signature("John Smith", "jsmith@gmail.com")
+    repository.create_commit("HEAD", signature, signature, "Rename",
+                             builder.write(), [repository.head.target])
+
+    visitor = contributionRoutines.CommitInfoMiningVisitor(output=None)
+    changes = visitor._getChanges(repository[repository.head.target])
+    assert(sorted(changes['paths']) == ["file0.txt", "renamed.txt"])
+    assert(changes['files'] == 1)
+    assert(changes['ins'] == 0 and changes['del'] == 0)
+
+
+def createBareRepositoryWithMergeCommit(path):
+    repository = pygit2.init_repository(str(path), bare=True)
+    signature = pygit2.Signature("John Smith", "jsmith@gmail.com")
+
+    def commitFiles(files, parents, message):
+        builder = repository.TreeBuilder()
+        for name, contents in files.items():
+            builder.insert(name, repository.create_blob(contents.encode()),
+                           pygit2.GIT_FILEMODE_BLOB)
+        return repository.create_commit(None, signature, signature, message,
+                                        builder.write(), parents)
+
+    base = commitFiles({"a.txt": "a\n", "b.txt": "b\n"}, [], "Base")
+    main = commitFiles({"a.txt": "a\nmain\n", "b.txt": "b\n"}, [base], "Main")
+    side = commitFiles({"a.txt": "a\n", "b.txt": "b\nside\nside\n"}, [base], "Side")
+    merge = commitFiles({"a.txt": "a\nmain\n", "b.txt": "b\nside\nside\n"},
+                        [main, side], "Merge")
+    repository.set_head(merge)
+    return repository
+
+
+def test_CommitInfoMiningRoutine_mergeDiffModesControlHowMergesAreDiffed(tmp_path):
+    createBareRepositoryWithMergeCommit(tmp_path / "owner_repo")
+    expectedMergeRecords = {"all": ["3", "0", "2", "b.txt;a.txt"],
+                            "firstParent": ["2", "0", "1", "b.txt"],
+                            "none": ["0", "0", "0", ""]}
+    for mode, expectedMergeRecord in expectedMergeRecords.items():
+        outputDirectory = tmp_path / mode
+        outputDirectory.mkdir()
+        request = contributionRoutines.CommitInfoMiningRoutineRequest(
+            repositoryURL="https://github.com/owner/repo",
+            outputDirectory=str(outputDirectory), workspaceDirectory=str(tmp_path))
+        routine = contributionRoutines.CommitInfoMiningRoutine()
+        routine.setConfigurationParameters({"mergeDiffs": mode})
+        response = routine.run(request)
+        assert(response.wasSuccessful())
+        commitLog = response.getAttachments()[0]
+        assert(commitLog.getMetadataAttribute("mergediffs") == mode)
+        mergeRecord = commitLog.getRawRecords()[0]
+        assert([str(value) for value in mergeRecord[9:13]] == expectedMergeRecord)
+
+
+def test_CommitInfoMiningRoutine_canTurnOffRenameDetection(tmp_path):
+    repository = createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=1)
+    builder = repository.TreeBuilder()
+    builder.insert("renamed.txt", repository[repository.head.target].tree["file0.txt"].id,
+                   pygit2.GIT_FILEMODE_BLOB)
+    signature = pygit2.Signature("John Smith", "jsmith@gmail.com")
+    repository.create_commit("HEAD", signature, signature, "Rename",
+                             builder.write(), [repository.head.target])
+
+    visitor = contributionRoutines.CommitInfoMiningVisitor(output=None, detectRenames=False)
+    changes = visitor._getChanges(repository[repository.head.target])
+    assert(sorted(changes['paths']) == ["file0.txt", "renamed.txt"])
+    assert(changes['files'] == 2)
+    assert(changes['ins'] == 1 and changes['del'] == 1)
+
+
+def test_CommitInfoMiningRoutine_rejectsUnknownMergeDiffMode(tmp_path):
+    createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=1)
+    request = contributionRoutines.CommitInfoMiningRoutineRequest(
+        repositoryURL="https://github.com/owner/repo", outputDirectory=str(tmp_path),
+        workspaceDirectory=str(tmp_path))
+    routine = contributionRoutines.CommitInfoMiningRoutine()
+    routine.setConfigurationParameters({"mergeDiffs": "octopus"})
+    response = routine.run(request)
+    assert(not response.wasSuccessful())
+    assert("octopus" in response.getMessage())
+
+
+def test_CommitInfoMiningVisitor_parallelMiningMatchesSerialMining(tmp_path):
+    repository = createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=9)
+    serialOutput = reposcanner.data.AnnotatedCSVData(str(tmp_path / "serial.csv"))
+    parallelOutput = reposcanner.data.AnnotatedCSVData(str(tmp_path / "parallel.csv"))
+    serialVisitor = contributionRoutines.CommitInfoMiningVisitor(serialOutput)
+    parallelVisitor = contributionRoutines.CommitInfoMiningVisitor(
+        parallelOutput, processes=2, repositoryPath=repository.path)
+    parallelVisitor._parallelMiningThreshold = 0
+
+    walk = reposcanner.routines.SharedCommitWalk(repository)
+    walk.addVisitor(serialVisitor)
+    walk.addVisitor(parallelVisitor)
+    walk.run()
+    assert(len(parallelOutput.getRawRecords()) == 0)
+
+    assert(serialVisitor.getResponse().wasSuccessful())
+    assert(parallelVisitor.getResponse().wasSuccessful())
+    assert(len(parallelOutput.getRawRecords()) == 9)
+    assert(parallelOutput.getRawRecords() == serialOutput.getRawRecords())
+
+
+def test_CommitInfoMiningRoutine_canWriteParquetOutput(tmp_path):
+    pytest.importorskip("pyarrow")
+    createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=3)
+    request = contributionRoutines.CommitInfoMiningRoutineRequest(
+        repositoryURL="https://github.com/owner/repo", outputDirectory=str(tmp_path),
+        workspaceDirectory=str(tmp_path))
+    routine = contributionRoutines.CommitInfoMiningRoutine()
+    routine.setConfigurationParameters({"outputFormat": "parquet", "incremental": True})
+    response = routine.run(request)
+    assert(response.wasSuccessful())
+    commitLog = response.getAttachments()[0]
+    assert(isinstance(commitLog, reposcanner.data.AnnotatedParquetData))
+    assert(str(commitLog.getFilePath()).endswith("owner_repo_CommitInfoMining.parquet"))
+    emails = commitLog.getDataFrame(columns=["authorEmail"])["authorEmail"]
+    assert(list(emails) == ["jsmith@gmail.com", "alice@llnl.gov", "jsmith@gmail.com"])
+
+    response = routine.run(request)
+    assert("up to date" in response.getMessage())
+
+
+def createGitHubCommitHistory(mocker, numberOfCommits):
+    """
+    Returns a mock GitHub repository session whose REST and GraphQL APIs both list the
+    same commits. Every third commit has no GitHub account for its author.
+    """
+    logins = [None if i % 3 == 2 else "user{i}".format(i=i % 5) for i in range(numberOfCommits)]
+    hashes = ["{i:040x}".format(i=i) for i in range(numberOfCommits)]
+
+    def getActor(login):
+        if login is None:
+            return None
+        return mocker.Mock(login=login)
+
+    def getPage(query, variables):
+        start = 0 if variables["cursor"] is None else int(variables["cursor"])
+        end = min(start + 100, numberOfCommits)
+        nodes = [{"oid": hashes[i],
+                  "author": {"user": None if logins[i] is None else {"login": logins[i]}},
+                  "committer": {"user": {"login": "web-flow"}}} for i in range(start, end)]
+        history = {"pageInfo": {"hasNextPage": end < numberOfCommits, "endCursor": str(end)},
+                   "nodes": nodes}
+        return {}, {"data": {"repository": {"defaultBranchRef": {"target": {"history": history}}}}}
+
+    session = mocker.Mock()
+    session.name = "repo"
+    session.owner.login = "owner"
+    session.get_commits.return_value = [
+        mocker.Mock(sha=hashes[i], author=getActor(logins[i]), committer=getActor("web-flow"))
+        for i in range(numberOfCommits)]
+    session.requester.graphql_query.side_effect = getPage
+    return session
+
+
+def test_OnlineCommitAuthorshipRoutine_graphQLAndRESTWriteTheSameRecords(mocker, tmp_path):
+    session = createGitHubCommitHistory(mocker, numberOfCommits=250)
+    request = contributionRoutines.OnlineCommitAuthorshipRoutineRequest(
+        repositoryURL="https://github.com/owner/repo", outputDirectory=str(tmp_path),
+        token="ab5571mc1")
+    routine = contributionRoutines.OnlineCommitAuthorshipRoutine()
+
+    routine.setConfigurationParameters({"githubAPI": "rest"})
+    restResponse = routine.githubImplementation(request, session)
+    restRecords = restResponse.getAttachments()[0].getRawRecords()
+
+    routine.setConfigurationParameters(None)
+    graphQLResponse = routine.githubImplementation(request, session)
+    graphQLRecords = graphQLResponse.getAttachments()[0].getRawRecords()
+
+    assert(graphQLResponse.wasSuccessful())
+    assert(graphQLRecords == restRecords)
+    assert(len(graphQLRecords) == 250)
+    assert(graphQLRecords[2][1] == "")
+    assert(session.requester.graphql_query.call_count == 3)
+
+
+def test_OnlineCommitAuthorshipRoutine_rejectsUnknownGitHubAPI(mocker, tmp_path):
+    request = contributionRoutines.OnlineCommitAuthorshipRoutineRequest(
+        repositoryURL="https://github.com/owner/repo", outputDirectory=str(tmp_path),
+        token="ab5571mc1")
+    routine = contributionRoutines.OnlineCommitAuthorshipRoutine()
+    routine.setConfigurationParameters({"githubAPI": "soap"})
+    response = routine.githubImplementation(request, mocker.Mock())
+    assert(not response.wasSuccessful())
+    assert("soap" in response.getMessage())
+
+
+def test_OnlineCommitAuthorshipRoutine_looksUpEachContributorOfTheOfflineCommitLogOnce(
+        mocker, tmp_path):
+    createBareRepositoryWithCommits(tmp_path / "owner_repo", numberOfCommits=6)
+    miningRequest = contributionRoutines.CommitInfoMiningRoutineRequest(
+        repositoryURL="https://github.com/owner/repo", outputDirectory=str(tmp_path),
+        workspaceDirectory=str(tmp_path))
+    commitLog = contributionRoutines.CommitInfoMiningRoutine().run(
+        miningRequest).getAttachments()[0]
+    store = reposcanner.data.DataEntityStore()
+    store.insert(commitLog)
+    loginsByName = {"John Smith": "jsmith", "Alice Jones": "ajones"}
+    loginsByCommit = {record[0]: loginsByName[record[3]] for record in commitLog.getRawRecords()}
+
+    def lookUpCommits(query, variables):
+        repository = {}
+        for alias, oid in re.findall(r'(c\d+): object\(oid: "([0-9a-f]+)"\)', query):
+            user = {"login": loginsByCommit[oid]}
+            repository[alias] = {"author": {"user": user}, "committer": {"user": user}}
+        return {}, {"data": {"repository": repository}}
+
+    session = mocker.Mock()
+    session.name = "repo"
+    session.owner.login = "owner"
+    session.requester.graphql_query.side_effect = lookUpCommits
+    session.get_commit.side_effect = lambda commitHash: mocker.Mock(
+        author=mocker.Mock(login=loginsByCommit[commitHash]),
+        committer=mocker.Mock(login=loginsByCommit[commitHash]))
+    request = contributionRoutines.OnlineCommitAuthorshipRoutineRequest(
+        repositoryURL="https://github.com/owner/repo", outputDirectory=str(tmp_path),
+        token="ab5571mc1")
+    routine = contributionRoutines.OnlineCommitAuthorshipRoutine()
+    routine.setConfigurationParameters({"useOfflineCommitLog": True})
+    assert(routine.getDataDependencies() == ["CommitInfoMiningRoutine"])
+    request.setData(store.getByCriteria(routine.getDataCriteria(request)))
+    assert(request.getData() == [commitLog])
+
+    expectedRecords = [[commitHash, login, login] for commitHash, login in loginsByCommit.items()]
+    response = routine.githubImplementation(request, session)
+    assert(response.getAttachments()[0].getRawRecords() == expectedRecords)
+    assert(session.requester.graphql_query.call_count == 1)
+    assert(not session.get_commits.called)
+
+    routine.setConfigurationParameters({"useOfflineCommitLog": True, "githubAPI": "rest"})
+    response = routine.githubImplementation(request, session)
+    assert(response.getAttachments()[0].getRawRecords() == expectedRecords)
+    assert(session.get_commit.call_count == 2)
+
+
+def test_OnlineCommitAuthorshipRoutine_matchesGitlabCommitsByEmail(mocker, tmp_path):
+    gitlabClient = mocker.Mock(private_token="ab5571mc1", oauth_token=None, job_token=None)
+    gitlabClient.url = "https://gitlab.example.com"
+    jsmith = mocker.Mock(attributes={"username": "jsmith", "email": "jsmith@gmail.com"})
+    jsmith.emails.list.return_value = [mocker.Mock(email="john.smith@llnl.gov")]
+    ajones = mocker.Mock(attributes={"username": "ajones", "public_email": "alice@llnl.gov"})
+    ajones.emails.list.return_value = []
+    gitlabClient.users.list.return_value = [jsmith, ajones]
+    session = mocker.Mock()
+    session.manager.gitlab = gitlabClient
+    session.commits.list.return_value = [
+        mocker.Mock(id="a1", author_email="JSmith@gmail.com", committer_email="alice@llnl.gov"),
+        mocker.Mock(id="b2", author_email="nobody@example.com", committer_email=None),
+        mocker.Mock(id="c3", author_email="John.Smith@llnl.gov", committer_email=None)]
+    request = contributionRoutines.OnlineCommitAuthorshipRoutineRequest(
+        repositoryURL="https://gitlab.com/owner/repo", outputDirectory=str(tmp_path),
+        token="ab5571mc1")
+    routine = contributionRoutines.OnlineCommitAuthorshipRoutine()
+    routine.setConfigurationParameters({"emailIndexDirectory": str(tmp_path / "index")})
+    reposcanner.git.GitlabEmailIndex().clear()
+    response = routine.gitlabImplementation(request, session)
+    assert(response.getAttachments()[0].getRawRecords() == [["a1", "jsmith", "ajones"],
+                                                            ["b2", "", ""],
+                                                            ["c3", "", ""]])
+    assert(not jsmith.emails.list.called)
+    indexPath = tmp_path / "index" / "{key}_gitlabEmailIndex.json".format(
+        key=reposcanner.git.GitlabEmailIndex.getKey(gitlabClient))
+    assert(os.path.exists(str(indexPath)))
+
+    # Secondary emails are only looked up when the configuration asks for them.
+    routine.setConfigurationParameters({"emailIndexDirectory": str(tmp_path / "index"),
+                                        "listSecondaryEmails": True})
+    response = routine.gitlabImplementation(request, session)
+    assert(response.getAttachments()[0].getRawRecords()[2] == ["c3", "jsmith", ""])
+    assert(jsmith.emails.list.call_count == 1)
+    reposcanner.git.GitlabEmailIndex().clear()
@@ -1,6 +1,14 @@
 import reposcanner.manager as management
 import reposcanner.requests as requests
 import reposcanner.data as data
+import reposcanner.git as gitEntities
+import reposcanner.dummy as dummy
+import reposcanner.contrib as contrib
+import reposcanner.response as responses
+import datetime
+import os
+import time
+import threading
 import pytest
 
 
@@ -119,3 +127,462 @@ def test_ReposcannerManager_missingRoutinesInConfigCausesValueError(tmp_path):
     # Attempting to find and initialize NonexistentRoutine will trigger a ValueError.
     with pytest.raises(ValueError):
         manager.initializeRoutinesAndAnalyses(configDict)
+
+
+def test_ReposcannerManager_executesTasksOneAtATimeByDefault():
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=None, workspaceDirectory=None)
+    assert(manager.getNumberOfWorkers() == 1)
+
+
+def test_ReposcannerManager_numberOfWorkersCanBeSetAtConstructionTime():
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=None, workspaceDirectory=None, workers=4)
+    assert(manager.getNumberOfWorkers() == 4)
+
+
+def test_ReposcannerManager_numberOfWorkersMustBePositive():
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=None, workspaceDirectory=None)
+    with pytest.raises(ValueError):
+        manager.setNumberOfWorkers(0)
+
+
+def test_ReposcannerManager_CanReadNumberOfWorkersFromConfig():
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=None, workspaceDirectory=None)
+    manager.initializeRoutinesAndAnalyses({"workers": 8})
+    assert(manager.getNumberOfWorkers() == 8)
+
+
+def test_ReposcannerManager_numberOfWorkersPassedAtConstructionOverridesConfig():
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=None, workspaceDirectory=None, workers=2)
+    manager.initializeRoutinesAndAnalyses({"workers": 8})
+    assert(manager.getNumberOfWorkers() == 2)
+
+
+def test_ReposcannerManager_parallelExecutionCommitsResultsInTaskOrder(
+        mocker, tmp_path):
+    manager = management.ReposcannerManager(
+        notebook=None,
+        outputDirectory=str(tmp_path),
+        workspaceDirectory=str(tmp_path),
+        workers=4)
+    manager.initializeRoutinesAndAnalyses({"routines": ["DummyOnlineRoutine"]})
+
+    repositoryNames = ["repoA", "repoB", "repoC", "repoD", "repoE"]
+    repositoryDictionary = {
+        "PROJID": {
+            "name": "SciKit",
+            "urls": ["https://github.com/scikit/{name}".format(name=name)
+                     for name in repositoryNames]}}
+    credentialsDictionary = {
+        "GitHub": {"url": "https://github.com/", "token": "ab5571mc1"}}
+    manager.prepareTasks(repositoryDictionary, credentialsDictionary)
+
+    def executeGeneratesResponseOutOfOrder(self, request):
+        # Tasks for repositories earlier in the list take longer to finish.
+        repositoryName = request.getRepositoryLocation().getRepositoryName()
+        time.sleep(0.05 * (len(repositoryNames) - repositoryNames.index(repositoryName)))
+        factory = responses.ResponseFactory()
+        return factory.createSuccessResponse(attachments=[repositoryName])
+    mocker.patch.object(dummy.DummyOnlineRoutine, "execute",
+                        executeGeneratesResponseOutOfOrder)
+
+    manager.executeWithNoGUI()
+    assert(list(manager.getDataEntityStore().read()) == repositoryNames)
+
+
+def test_ReposcannerManager_analysisIsScheduledRightAfterTheDataItDependsOn(tmp_path):
+    manager = management.ReposcannerManager(
+        notebook=None,
+        outputDirectory=str(tmp_path),
+        workspaceDirectory=str(tmp_path))
+    manager.initializeRoutinesAndAnalyses({
+        "routines": ["CommitInfoMiningRoutine", "DummyOnlineRoutine"],
+        "analyses": ["GambitCommitAuthorshipInferenceAnalysis"]})
+    repositoryDictionary = {
+        "PROJID": {
+            "name": "SciKit",
+            "urls": ["https://github.com/scikit/repoA",
+                     "https://github.com/scikit/repoB"]}}
+    credentialsDictionary = {
+        "GitHub": {"url": "https://github.com/", "token": "ab5571mc1"}}
+    manager.prepareTasks(repositoryDictionary, credentialsDictionary)
+
+    requestTypes = [task.getRequestClassName() for task in manager.getTasks()]
+    assert(requestTypes == ["CommitInfoMiningRoutineRequest",
+                            "CommitInfoMiningRoutineRequest",
+                            "GambitCommitAuthorshipInferenceAnalysisRequest",
+                            "DummyOnlineRoutineRequest",
+                            "DummyOnlineRoutineRequest"])
+
+
+def test_ManagerTaskGraph_analysisWithoutDeclaredDependenciesWaitsForAllRoutines():
+    routineTaskA = management.ManagerRepositoryRoutineTask(
+        projectID="PROJID",
+        projectName="SciKit",
+        url="https://github.com/scikit/repoA",
+        request=requests.RepositoryRoutineRequestModel(
+            repositoryURL="https://github.com/scikit/repoA",
+            outputDirectory="./"))
+    routineTaskB = management.ManagerRepositoryRoutineTask(
+        projectID="PROJID",
+        projectName="SciKit",
+        url="https://github.com/scikit/repoB",
+        request=requests.RepositoryRoutineRequestModel(
+            repositoryURL="https://github.com/scikit/repoB",
+            outputDirectory="./"))
+    analysisTask = management.ManagerAnalysisTask(request=requests.AnalysisRequestModel())
+
+    graph = management.ManagerTaskGraph(
+        [analysisTask, routineTaskA, routineTaskB], agents=[])
+    assert(graph.getTasks() == [routineTaskA, routineTaskB, analysisTask])
+    assert(graph.getDependencies(analysisTask) == [routineTaskA, routineTaskB])
+    assert(not graph.isReady(analysisTask, {routineTaskA}))
+    assert(graph.isReady(analysisTask, {routineTaskA, routineTaskB}))
+    assert(graph.getDependents(routineTaskA) == [analysisTask])
+    assert(graph.getDependents(analysisTask) == [])
+
+
+def test_ManagerTaskGraph_circularDependenciesCauseValueError():
+    class FirstAnalysisRequest(requests.AnalysisRequestModel):
+        def getDataDependencies(self):
+            return ["SecondAnalysis"]
+
+    class SecondAnalysisRequest(requests.AnalysisRequestModel):
+        def getDataDependencies(self):
+            return ["FirstAnalysis"]
+
+    class FirstAnalysis(dummy.DummyAnalysis):
+        def getRequestType(self):
+            return FirstAnalysisRequest
+
+    class SecondAnalysis(dummy.DummyAnalysis):
+        def getRequestType(self):
+            return SecondAnalysisRequest
+
+    tasks = [management.ManagerAnalysisTask(request=FirstAnalysisRequest()),
+             management.ManagerAnalysisTask(request=SecondAnalysisRequest())]
+    with pytest.raises(ValueError):
+        management.ManagerTaskGraph(tasks, agents=[FirstAnalysis(), SecondAnalysis()])
+
+
+def test_ReposcannerManager_parallelExecutionRunsAnalysisBeforeUnrelatedRoutinesFinish(
+        mocker, tmp_path):
+    manager = management.ReposcannerManager(
+        notebook=None,
+        outputDirectory=str(tmp_path),
+        workspaceDirectory=str(tmp_path),
+        workers=2)
+    manager.initializeRoutinesAndAnalyses({
+        "routines": ["CommitInfoMiningRoutine", "DummyOnlineRoutine"],
+        "analyses": ["GambitCommitAuthorshipInferenceAnalysis"]})
+    repositoryDictionary = {
+        "PROJID": {"name": "SciKit", "urls": ["https://github.com/scikit/repoA"]}}
+    credentialsDictionary = {
+        "GitHub": {"url": "https://github.com/", "token": "ab5571mc1"}}
+    manager.prepareTasks(repositoryDictionary, credentialsDictionary)
+
+    analysisHasRun = threading.Event()
+
+    def executeSucceeds(self, request):
+        return responses.ResponseFactory().createSuccessResponse()
+
+    def executeSucceedsOnceAnalysisHasRun(self, request):
+        if analysisHasRun.wait(timeout=5):
+            return responses.ResponseFactory().createSuccessResponse()
+        return responses.ResponseFactory().createFailureResponse()
+
+    def analysisExecuteSignals(self, request):
+        analysisHasRun.set()
+        return responses.ResponseFactory().createSuccessResponse()
+
+    mocker.patch.object(contrib.CommitInfoMiningRoutine, "execute", executeSucceeds)
+    mocker.patch.object(dummy.DummyOnlineRoutine, "execute",
+                        executeSucceedsOnceAnalysisHasRun)
+    mocker.patch.object(contrib.GambitCommitAuthorshipInferenceAnalysis, "execute",
+                        analysisExecuteSignals)
+
+    manager.executeWithNoGUI()
+    assert(all(task.getResponse().wasSuccessful() for task in manager.getTasks()))
+
+
+def test_ReposcannerManager_groupsOfflineRoutinesOnTheSameRepositoryIntoOneCommitWalk(tmp_path):
+    manager = management.ReposcannerManager(
+        notebook=None,
+        outputDirectory=str(tmp_path),
+        workspaceDirectory=str(tmp_path))
+    manager.initializeRoutinesAndAnalyses({
+        "routines": ["CommitInfoMiningRoutine",
+                     "OfflineCommitCountsRoutine",
+                     "DummyOfflineRoutine"]})
+    repositoryDictionary = {
+        "PROJID": {
+            "name": "SciKit",
+            "urls": ["https://github.com/scikit/repoA",
+                     "https://github.com/scikit/repoB"]}}
+    manager.prepareTasks(repositoryDictionary, {})
+
+    groups = manager.getSharedCommitWalkGroups()
+    assert(len(groups) == 4)
+    for task in groups:
+        groupTasks, groupAgents = groups[task]
+        assert(task in groupTasks)
+        assert([agent.__class__.__name__ for agent in groupAgents] ==
+               ["CommitInfoMiningRoutine", "OfflineCommitCountsRoutine"])
+        assert(len(set(groupTask.getURL() for groupTask in groupTasks)) == 1)
+
+
+def test_ReposcannerManager_CanEnableCloneUpdatesFromConfig(tmp_path):
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path))
+    assert(not manager.isCloneUpdatingEnabled())
+    manager.initializeRoutinesAndAnalyses({
+        "updateClones": True, "routines": ["CommitInfoMiningRoutine"]})
+    assert(manager.isCloneUpdatingEnabled())
+    manager.prepareTasks(
+        {"PROJID": {"name": "SciKit", "urls": ["https://github.com/scikit/repoA"]}}, {})
+    assert(manager.getTasks()[0].getRequest().shouldUpdateClone())
+
+
+def test_ReposcannerManager_updatesClonesAgainOnEachRun(mocker, tmp_path):
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path))
+    for method in ["prepareTasks", "prepareTaskJournal", "executeWithNoGUI"]:
+        mocker.patch.object(manager, method)
+    configDataFile = mocker.Mock()
+    configDataFile.getData.return_value = {
+        "updateClones": True, "routines": ["CommitInfoMiningRoutine"]}
+    manager.run(mocker.Mock(), mocker.Mock(), configDataFile)
+    for routine in manager.getRoutines():
+        assert(routine.getUpdatedCloneDirectories() is manager.getUpdatedCloneDirectories())
+    manager.getUpdatedCloneDirectories().add(str(tmp_path / "scikit_repoA"))
+
+    # A second run in the same process fetches into the clones again.
+    manager.run(mocker.Mock(), mocker.Mock(), configDataFile)
+    assert(len(manager.getUpdatedCloneDirectories()) == 0)
+    otherManager = management.ReposcannerManager(
+        notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path))
+    assert(otherManager.getUpdatedCloneDirectories() is not manager.getUpdatedCloneDirectories())
+
+
+def test_ReposcannerManager_canSetDataFrameCacheBudgetFromConfig(tmp_path):
+    cache = data.DataFrameCache()
+    originalBudget = cache.getBudget()
+    try:
+        manager = management.ReposcannerManager(
+            notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path))
+        manager.initializeRoutinesAndAnalyses({
+            "dataFrameCacheSize": 64, "routines": ["CommitInfoMiningRoutine"]})
+        assert(cache.getBudget() == 64 * 1024 * 1024)
+    finally:
+        cache.setBudget(originalBudget)
+
+
+def test_ReposcannerManager_canSpillDataToDiskFromConfig(tmp_path):
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path))
+    assert(not manager.getDataEntityStore().isSpillingToDisk())
+    manager.initializeRoutinesAndAnalyses({
+        "spillDataToDisk": True, "dataStoreMemoryCeiling": 32,
+        "routines": ["CommitInfoMiningRoutine"]})
+    assert(manager.getDataEntityStore().isSpillingToDisk())
+    assert(manager.getDataEntityStore().getMemoryCeiling() == 32 * 1024 * 1024)
+
+
+def test_ReposcannerManager_givesOfflineRoutinesTheResultCacheFromConfig(tmp_path):
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path))
+    manager.initializeRoutinesAndAnalyses({
+        "resultCacheDirectory": str(tmp_path / "cache"),
+        "routines": ["CommitInfoMiningRoutine", "OfflineCommitCountsRoutine"]})
+    for routine in manager.getAllAgents():
+        assert(routine.getResultCache().getCacheDirectory() == str(tmp_path / "cache"))
+    assert(os.path.isdir(str(tmp_path / "cache")))
+
+
+def test_ReposcannerManager_resumeOnlyExecutesTasksThatDidNotComplete(mocker, tmp_path):
+    repositoryDictionary = {
+        "PROJID": {
+            "name": "SciKit",
+            "urls": ["https://github.com/scikit/repoA", "https://github.com/scikit/repoB"]}}
+    credentialsDictionary = {
+        "GitHub": {"url": "https://github.com/", "token": "ab5571mc1"}}
+    executedRepositories = []
+    failingRepositories = {"repoB"}
+
+    def executeWritesOutput(self, request):
+        repositoryName = request.getRepositoryLocation().getRepositoryName()
+        executedRepositories.append(repositoryName)
+        if repositoryName in failingRepositories:
+            return responses.ResponseFactory().createFailureResponse(message="Crashed")
+        output = data.AnnotatedCSVData(str(tmp_path / "{name}.csv".format(name=repositoryName)))
+        output.setCreator("DummyOnlineRoutine")
+        output.setDateCreated(datetime.date.today())
+        output.setColumnNames(["repository"])
+        output.setColumnDatatypes(["str"])
+        output.addRecord([repositoryName])
+        output.writeToFile()
+        return responses.ResponseFactory().createSuccessResponse(attachments=output)
+    mocker.patch.object(dummy.DummyOnlineRoutine, "execute", executeWritesOutput)
+
+    def runManager(resume):
+        del executedRepositories[:]
+        manager = management.ReposcannerManager(
+            notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path),
+            resume=resume)
+        manager.initializeRoutinesAndAnalyses({"routines": ["DummyOnlineRoutine"]})
+        manager.prepareTasks(repositoryDictionary, credentialsDictionary)
+        manager.prepareTaskJournal()
+        manager.executeWithNoGUI()
+        return manager
+
+    runManager(resume=False)
+    assert(executedRepositories == ["repoA", "repoB"])
+
+    failingRepositories.clear()
+    manager = runManager(resume=True)
+    assert(executedRepositories == ["repoB"])
+    assert(manager.getTasks()[0].wasRestored())
+    assert(sorted(entity.getRawRecords()[0][0] for entity in manager.getDataEntityStore().read())
+           == ["repoA", "repoB"])
+
+    # Outputs that changed since they were journaled are produced again.
+    with open(str(tmp_path / "repoA.csv"), 'a') as f:
+        f.write("extra\n")
+    runManager(resume=True)
+    assert(executedRepositories == ["repoA"])
+
+    runManager(resume=False)
+    assert(executedRepositories == ["repoA", "repoB"])
+
+
+def test_ReposcannerManager_resumeRerunsAnalysesWhoseInputsWereProducedAgain(mocker, tmp_path):
+    repositoryDictionary = {
+        "PROJID": {
+            "name": "SciKit",
+            "urls": ["https://github.com/scikit/repoA", "https://github.com/scikit/repoB"]}}
+    credentialsDictionary = {
+        "GitHub": {"url": "https://github.com/", "token": "ab5571mc1"}}
+    executedTasks = []
+    failingRepositories = {"repoB"}
+
+    def executeWritesOutput(self, request):
+        repositoryName = request.getRepositoryLocation().getRepositoryName()
+        executedTasks.append(repositoryName)
+        if repositoryName in failingRepositories:
+            return responses.ResponseFactory().createFailureResponse(message="Crashed")
+        output = data.AnnotatedCSVData(str(tmp_path / "{name}.csv".format(name=repositoryName)))
+        output.setCreator("DummyOnlineRoutine")
+        output.setDateCreated(datetime.date.today())
+        output.setColumnNames(["repository"])
+        output.setColumnDatatypes(["str"])
+        output.addRecord([repositoryName])
+        output.writeToFile()
+        return responses.ResponseFactory().createSuccessResponse(attachments=output)
+
+    def executeAnalysis(self, request):
+        executedTasks.append("analysis")
+        return responses.ResponseFactory().createSuccessResponse(message="Analyzed")
+    mocker.patch.object(dummy.DummyOnlineRoutine, "execute", executeWritesOutput)
+    mocker.patch.object(dummy.DummyAnalysis, "execute", executeAnalysis)
+
+    def runManager(resume):
+        del executedTasks[:]
+        manager = management.ReposcannerManager(
+            notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path),
+            resume=resume)
+        manager.initializeRoutinesAndAnalyses(
+            {"routines": ["DummyOnlineRoutine"], "analyses": ["DummyAnalysis"]})
+        manager.prepareTasks(repositoryDictionary, credentialsDictionary)
+        manager.prepareTaskJournal()
+        manager.executeWithNoGUI()
+        return manager
+
+    # The analysis completed, but repoB failed, so its output is produced again and the
+    # analysis has to run again with it.
+    runManager(resume=False)
+    assert(executedTasks == ["repoA", "repoB", "analysis"])
+    failingRepositories.clear()
+    runManager(resume=True)
+    assert(executedTasks == ["repoB", "analysis"])
+
+    # Once all of its inputs are restored, so is the analysis.
+    runManager(resume=True)
+    assert(executedTasks == [])
+
+
+def test_ReposcannerManager_canReadOnlineConcurrencyPerHostFromConfig(tmp_path):
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path),
+        workers=3)
+    assert(manager.getOnlineConcurrencyPerHost() == 3)
+    manager.initializeRoutinesAndAnalyses({
+        "onlineConcurrencyPerHost": 8, "routines": ["ContributorAccountListRoutine"]})
+    assert(manager.getOnlineConcurrencyPerHost() == 8)
+    with pytest.raises(ValueError):
+        manager.setOnlineConcurrencyPerHost(0)
+
+
+def test_ReposcannerManager_givesOnlineRoutinesTheResponseCacheFromConfig(tmp_path):
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path))
+    manager.initializeRoutinesAndAnalyses({
+        "httpCacheDirectory": str(tmp_path / "http"), "httpCacheSize": 16,
+        "routines": ["ContributorAccountListRoutine", "OnlineCommitAuthorshipRoutine"]})
+    assert(manager.getResponseCache().getMaximumSize() == 16 * 1024 * 1024)
+    for routine in manager.getAllAgents():
+        assert(routine.getResponseCache() == manager.getResponseCache())
+
+
+def test_ReposcannerManager_runsRoutinesAfterTheRoutinesTheyReadFrom(tmp_path):
+    repositoryDictionary = {
+        "PROJID": {
+            "name": "SciKit",
+            "urls": ["https://github.com/scikit/repoA", "https://github.com/scikit/repoB"]}}
+    credentialsDictionary = {
+        "GitHub": {"url": "https://github.com/", "token": "ab5571mc1"}}
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path))
+    manager.initializeRoutinesAndAnalyses({"routines": [
+        {"OnlineCommitAuthorshipRoutine": {"useOfflineCommitLog": True}},
+        "CommitInfoMiningRoutine"]})
+    manager.prepareTasks(repositoryDictionary, credentialsDictionary)
+
+    def describe(task):
+        return (task.getRequestClassName(),
+                task.getRequest().getRepositoryLocation().getRepositoryName())
+    assert([describe(task) for task in manager.getTasks()] == [
+        ("CommitInfoMiningRoutineRequest", "repoA"),
+        ("OnlineCommitAuthorshipRoutineRequest", "repoA"),
+        ("CommitInfoMiningRoutineRequest", "repoB"),
+        ("OnlineCommitAuthorshipRoutineRequest", "repoB")])
+
+    # Each online task is handed the commit log of its own repository.
+    for name in ["repoA", "repoB"]:
+        commitLog = data.AnnotatedCSVData(str(tmp_path / "{name}.csv".format(name=name)))
+        commitLog.setCreator("CommitInfoMiningRoutine")
+        commitLog.setURL("https://github.com/scikit/{name}".format(name=name))
+        manager.getDataEntityStore().insert(commitLog)
+    onlineTask = manager.getTasks()[3]
+    onlineTask.fetchDataFromStore(onlineTask.selectAgent(manager.getAllAgents()),
+                                  manager.getDataEntityStore())
+    assert([entity.getURL() for entity in onlineTask.getRequest().getData()]
+           == ["https://github.com/scikit/repoB"])
+
+
+def test_ReposcannerManager_canTurnOffAPISessionReuse(tmp_path):
+    manager = management.ReposcannerManager(
+        notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path))
+    manager.initializeRoutinesAndAnalyses({
+        "reuseAPISessions": False, "routines": ["ContributorAccountListRoutine"]})
+    assert(not manager.getClientPool().isEnabled())
+    for routine in manager.getRoutines():
+        assert(routine.getClientPool() is manager.getClientPool())
+    manager.initializeRoutinesAndAnalyses({"reuseAPISessions": True, "routines": []})
+    assert(manager.getClientPool().isEnabled())
+    otherManager = management.ReposcannerManager(
+        notebook=None, outputDirectory=str(tmp_path), workspaceDirectory=str(tmp_path))
+    assert(otherManager.getClientPool() is not manager.getClientPool())